@@ -0,0 +1,21 @@
+import importlib.util
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parent.parent
+
+
+def load_script(filename, module_name):
+    """按路径导入仓库根目录下的脚本（文件名为中文，不能直接 import）"""
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.spec_from_file_location(module_name, ROOT / filename)
+    module = importlib.util.module_from_spec(spec)
+    # 先注册再执行，进程池任务按模块名 pickle 函数时才能找到
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
@@ -0,0 +1,22 @@
+"""
+测试用的 MediaPipe 替身：只在真实的 mediapipe 未安装时加入 sys.path。
+FaceDetection 对任何图片都返回同一个位于画面中央的人脸框，检测结果固定，便于断言。
+"""
+from types import SimpleNamespace
+
+FACE_BOX = SimpleNamespace(xmin=0.3, ymin=0.3, width=0.4, height=0.4)
+
+
+class FaceDetection:
+    def __init__(self, model_selection=0, min_detection_confidence=0.5):
+        self.closed = False
+
+    def process(self, image):
+        detection = SimpleNamespace(location_data=SimpleNamespace(relative_bounding_box=FACE_BOX))
+        return SimpleNamespace(detections=[detection])
+
+    def close(self):
+        self.closed = True
+
+
+solutions = SimpleNamespace(face_detection=SimpleNamespace(FaceDetection=FaceDetection))
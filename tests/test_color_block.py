@@ -0,0 +1,253 @@
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+color = load_script("图片色块处理.py", "color_tool")
+
+
+def noisy_image(rng, height=60, width=80):
+    """几块底色加随机噪声，颜色数量多、且有大量接近目标色的像素"""
+    base = rng.integers(0, 256, size=(4, 3))
+    image = base[rng.integers(0, 4, size=(height, width))]
+    image = image + rng.integers(-40, 41, size=(height, width, 3))
+    return np.clip(image, 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize("advanced", [True, False])
+@pytest.mark.parametrize("tolerance", [0, 5, 15, 40, 100])
+def test_color_index_matches_full_image_mask(tolerance, advanced):
+    rng = np.random.default_rng(tolerance)
+    rgb = noisy_image(rng)
+    # 目标取图中的像素和随机颜色，覆盖命中与未命中
+    targets = [tuple(rgb[10, 20]), tuple(rgb[50, 70]), tuple(int(v) for v in rng.integers(0, 256, 3))]
+
+    index = color.ColorIndex(rgb)
+    matched = index.match(targets, tolerance, advanced)
+    expected = color.color_match_mask(rgb, targets, tolerance, advanced)
+
+    np.testing.assert_array_equal(index.pixel_mask(matched), expected)
+    assert index.matched_pixels(matched) == np.count_nonzero(expected)
+
+
+def reference_match(colors, target, tolerance, advanced):
+    """原来的浮点实现：欧氏距离 <= 容差 或 加权差异 <= 容差/2；简单模式为逐通道差 <= 容差"""
+    diff = np.abs(colors[..., :3].astype(np.float64) - np.asarray(target[:3], dtype=np.float64))
+    if not advanced:
+        return np.all(diff <= tolerance, axis=-1)
+    euclidean = np.sqrt(np.sum(diff ** 2, axis=-1))
+    weighted = np.sum(diff * np.array([0.299, 0.587, 0.114]), axis=-1)
+    return (euclidean <= tolerance) | (weighted <= tolerance * 0.5)
+
+
+@pytest.mark.parametrize("use_cv2", [True, False])
+@pytest.mark.parametrize("advanced", [True, False])
+def test_color_match_mask_matches_float_reference(monkeypatch, use_cv2, advanced):
+    if use_cv2 and not color.CV2_AVAILABLE:
+        pytest.skip("需要 OpenCV")
+    monkeypatch.setattr(color, "CV2_AVAILABLE", use_cv2)
+    rng = np.random.default_rng(44)
+    rgba = np.concatenate([noisy_image(rng), np.full((60, 80, 1), 255, np.uint8)], axis=2)
+    targets = [(0, 0, 0), (255, 255, 255), tuple(rgba[5, 5, :3])]
+
+    for tolerance in (0, 1, 7, 15, 33, 80):
+        expected = np.zeros(rgba.shape[:2], dtype=bool)
+        for target in targets:
+            expected |= reference_match(rgba, target, tolerance, advanced)
+        np.testing.assert_array_equal(color.color_match_mask(rgba, targets, tolerance, advanced), expected)
+
+
+def test_edit_history_undo_redo_restores_every_state():
+    rng = np.random.default_rng(45)
+    alpha = np.full((40, 50), 255, np.uint8)
+    history = color.EditHistory()
+    states = [alpha.copy()]
+    for step in range(6):
+        changed = rng.random(alpha.shape) < 0.3
+        # 交替使用单一值和逐像素值，两种存储方式都要覆盖
+        new_alpha = 0 if step % 2 else rng.integers(0, 256, np.count_nonzero(changed)).astype(np.uint8)
+        history.record(alpha, changed, new_alpha)
+        states.append(alpha.copy())
+
+    for expected in reversed(states[:-1]):
+        assert history.undo(alpha) is not None
+        np.testing.assert_array_equal(alpha, expected)
+    assert not history.can_undo() and history.undo(alpha) is None
+
+    for expected in states[1:]:
+        assert history.redo(alpha) is not None
+        np.testing.assert_array_equal(alpha, expected)
+    assert not history.can_redo()
+
+    # 新的编辑会清空重做栈
+    history.undo(alpha)
+    history.record(alpha, np.ones_like(alpha, dtype=bool), 7)
+    assert not history.can_redo()
+
+
+def test_edit_history_evicts_oldest_edits_over_budget():
+    rng = np.random.default_rng(46)
+    alpha = np.full((64, 64), 255, np.uint8)
+    history = color.EditHistory(memory_budget=1)
+    states = [alpha.copy()]
+    for _ in range(5):
+        changed = rng.random(alpha.shape) < 0.5
+        history.record(alpha, changed, rng.integers(0, 256, np.count_nonzero(changed)).astype(np.uint8))
+        states.append(alpha.copy())
+
+    # 超出预算时只保留最近一次编辑
+    assert len(history.undo_stack) == 1
+    history.undo(alpha)
+    np.testing.assert_array_equal(alpha, states[-2])
+    assert not history.can_undo()
+
+    budget = sum(edit.nbytes for edit in history.redo_stack) * 3
+    history = color.EditHistory(memory_budget=budget)
+    for _ in range(10):
+        changed = rng.random(alpha.shape) < 0.5
+        history.record(alpha, changed, rng.integers(0, 256, np.count_nonzero(changed)).astype(np.uint8))
+        assert history.nbytes <= budget
+        assert history.nbytes == sum(edit.nbytes for edit in history.undo_stack)
+    assert 1 < len(history.undo_stack) < 10
+
+
+def write_batch_inputs(input_dir):
+    """白底图和绿底图各一张，放在子目录中检查目录结构"""
+    (input_dir / "sub").mkdir(parents=True)
+    white = np.full((20, 30, 3), 255, np.uint8)
+    green = np.zeros((20, 30, 3), np.uint8)
+    green[..., 1] = 255
+    white[5:15, 10:20] = green[5:15, 10:20] = (200, 30, 30)
+    color.Image.fromarray(white).save(input_dir / "white.png")
+    color.Image.fromarray(green).save(input_dir / "sub" / "green.bmp")
+
+
+def output_alpha(output_dir, rel_path):
+    return np.array(color.Image.open(output_dir / rel_path))[..., 3]
+
+
+def test_run_batch_skips_only_unchanged_files(tmp_path, capsys):
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    write_batch_inputs(input_dir)
+    white, green = [(255, 255, 255)], [(0, 255, 0)]
+
+    def run(targets, **kwargs):
+        stats = color.run_batch(str(input_dir), str(output_dir), targets, tolerance=10, workers=1, **kwargs)
+        assert stats["failed"] == []
+        return stats
+
+    stats = run(white)
+    assert (stats["processed"], stats["skipped"]) == (2, 0)
+    assert np.count_nonzero(output_alpha(output_dir, "white.png") == 0) == 20 * 30 - 100
+    assert np.all(output_alpha(output_dir, "sub/green.png") == 255)
+
+    stats = run(white)
+    assert (stats["processed"], stats["skipped"]) == (0, 2)
+
+    # 参数变化后全部重新处理
+    stats = run(green)
+    assert (stats["processed"], stats["skipped"]) == (2, 0)
+    assert np.all(output_alpha(output_dir, "white.png") == 255)
+    assert np.count_nonzero(output_alpha(output_dir, "sub/green.png") == 0) == 20 * 30 - 100
+
+    # 回到之前用过的参数，输出已被覆盖，不能跳过
+    stats = run(white)
+    assert (stats["processed"], stats["skipped"]) == (2, 0)
+    assert np.count_nonzero(output_alpha(output_dir, "white.png") == 0) == 20 * 30 - 100
+    assert np.all(output_alpha(output_dir, "sub/green.png") == 255)
+
+    # 源文件内容变化只重新处理该文件
+    color.Image.fromarray(np.full((20, 30, 3), 255, np.uint8)).save(input_dir / "white.png")
+    stats = run(white)
+    assert (stats["processed"], stats["skipped"]) == (1, 1)
+    assert np.all(output_alpha(output_dir, "white.png") == 0)
+
+    # 输出被删除或强制处理时不跳过
+    (output_dir / "sub" / "green.png").unlink()
+    stats = run(white)
+    assert (stats["processed"], stats["skipped"]) == (1, 1)
+    stats = run(white, force=True)
+    assert (stats["processed"], stats["skipped"]) == (2, 0)
+
+    lines = (output_dir / color.BATCH_MANIFEST_FILE).read_text(encoding="utf-8").splitlines()
+    assert sorted(line.split("\t")[0] for line in lines) == ["sub/green.bmp", "white.png"]
+    capsys.readouterr()
+
+
+def reference_fill(mask, seeds):
+    """逐像素广度优先的四连通填充"""
+    height, width = mask.shape
+    filled = np.zeros_like(mask)
+    queue = [(x, y) for x, y in seeds if 0 <= x < width and 0 <= y < height and mask[y, x]]
+    for x, y in queue:
+        filled[y, x] = True
+    while queue:
+        x, y = queue.pop()
+        for nx, ny in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+            if 0 <= nx < width and 0 <= ny < height and mask[ny, nx] and not filled[ny, nx]:
+                filled[ny, nx] = True
+                queue.append((nx, ny))
+    return filled
+
+
+@pytest.mark.parametrize("use_cv2", [True, False])
+def test_contiguous_mask_matches_reference_fill(monkeypatch, use_cv2):
+    if use_cv2 and not color.CV2_AVAILABLE:
+        pytest.skip("需要 OpenCV")
+    monkeypatch.setattr(color, "CV2_AVAILABLE", use_cv2)
+    rng = np.random.default_rng(47)
+    for trial in range(60):
+        height, width = rng.integers(1, 40, size=2)
+        mask = rng.random((height, width)) < rng.uniform(0.3, 0.8)
+        # 包括越界和落在掩码外的种子
+        seeds = [(int(rng.integers(-2, width + 2)), int(rng.integers(-2, height + 2))) for _ in range(3)]
+        expected = reference_fill(mask, seeds)
+        np.testing.assert_array_equal(color.contiguous_mask(mask, seeds), expected)
+
+
+def test_scanline_fill_handles_full_and_diagonal_masks():
+    full = np.ones((7, 5), dtype=bool)
+    np.testing.assert_array_equal(color._scanline_fill(full, [(4, 6)]), full)
+
+    # 只在对角相邻的像素不属于同一区域
+    diagonal = np.eye(6, dtype=bool)
+    expected = np.zeros_like(diagonal)
+    expected[2, 2] = True
+    np.testing.assert_array_equal(color._scanline_fill(diagonal, [(2, 2)]), expected)
+
+
+def test_tile_pyramid_invalidate_matches_rebuild():
+    rng = np.random.default_rng(48)
+    rgba = rng.integers(0, 256, size=(97, 61, 4)).astype(np.uint8)
+    pyramid = color.TilePyramid(rgba, min_size=4)
+    pyramid.TILE_SIZE = 16  # 小瓦片，让奇数边长和多级都能覆盖到
+    assert len(pyramid.levels) > 3
+
+    def tile(level, tx, ty):
+        size = pyramid.TILE_SIZE
+        return pyramid.levels[level][ty * size:(ty + 1) * size, tx * size:(tx + 1) * size].copy()
+
+    # 缓存里放入各瓦片当前内容的副本代替 QPixmap
+    for level in range(len(pyramid.levels)):
+        columns, rows = pyramid.tile_count(level)
+        for ty in range(rows):
+            for tx in range(columns):
+                pyramid.cache[(level, tx, ty)] = tile(level, tx, ty)
+
+    for _ in range(3):
+        changed = np.zeros(rgba.shape[:2], dtype=bool)
+        y, x = rng.integers(0, 97), rng.integers(0, 61)
+        changed[y:y + 9, x:x + 5] = True
+        changed[-1, -1] = True  # 奇数边上的最后一个像素
+        rgba[changed, 3] = rng.integers(0, 256, np.count_nonzero(changed))
+        pyramid.invalidate(changed)
+
+        rebuilt = color.TilePyramid(rgba.copy(), min_size=4)
+        assert len(rebuilt.levels) == len(pyramid.levels)
+        for level, expected in zip(pyramid.levels, rebuilt.levels):
+            np.testing.assert_array_equal(level, expected)
+        # 留在缓存中的瓦片内容都没有过期
+        for (level, tx, ty), cached in pyramid.cache.items():
+            np.testing.assert_array_equal(cached, tile(level, tx, ty))
+    # 只丢弃被触及的瓦片，未改动的瓦片仍在缓存中
+    assert any(key[0] == 0 for key in pyramid.cache)
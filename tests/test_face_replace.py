@@ -0,0 +1,238 @@
+import pathlib
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+try:
+    import mediapipe  # noqa: F401
+except ImportError:
+    # 没有 MediaPipe 的环境使用 tests/stubs 中的替身（放在 sys.path 上，批量处理的子进程也能导入）
+    sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent / "stubs"))
+
+from conftest import load_script
+
+face = load_script("人脸位置替换.py", "face_replace")
+
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+@pytest.mark.parametrize("shape", [(1, 1), (3, 3), (4, 7), (7, 4), (12, 12)])
+def test_linear_assignment_fallback_matches_scipy(monkeypatch, shape):
+    scipy_optimize = pytest.importorskip("scipy.optimize")
+    rng = np.random.default_rng(shape[0] * 31 + shape[1])
+    for _ in range(20):
+        cost = rng.random(shape)
+        expected_rows, expected_cols = scipy_optimize.linear_sum_assignment(cost)
+        monkeypatch.setattr(face, "SCIPY_AVAILABLE", False)
+        rows, cols = face.linear_assignment(cost)
+        assert len(rows) == min(shape)
+        assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+        assert cost[rows, cols].sum() == pytest.approx(cost[expected_rows, expected_cols].sum())
+
+
+def test_linear_assignment_empty():
+    rows, cols = face.linear_assignment(np.zeros((0, 3)))
+    assert len(rows) == 0 and len(cols) == 0
+
+
+def test_iou_matrix_matches_pairwise_iou():
+    rng = np.random.default_rng(0)
+    boxes_a = rng.integers(0, 50, (6, 4)) + [0, 0, 1, 1]
+    boxes_b = rng.integers(0, 50, (5, 4)) + [0, 0, 1, 1]
+    expected = np.array([[box_iou(a, b) for b in boxes_b] for a in boxes_a])
+    np.testing.assert_allclose(face.iou_matrix(boxes_a, boxes_b), expected, rtol=1e-5, atol=1e-6)
+
+
+def write_pool_images(folder, count, size=(100, 100)):
+    folder.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(count)
+    for i in range(count):
+        image = rng.integers(0, 256, (size[1], size[0], 3)).astype(np.uint8)
+        face.write_image(str(folder / f"img_{i}.png"), image)
+
+
+def test_replacement_pool_evicts_least_recently_used(tmp_path, monkeypatch):
+    write_pool_images(tmp_path / "pool", 4)
+    tile_bytes = 64 * 64 * 3  # 50x50 的人脸框向上取整到 64 边长
+    pool = face.ReplacementImagePool(max_cache_bytes=2 * tile_bytes)
+    assert pool.scan(str(tmp_path / "pool")) == 4
+
+    decoded = []
+    original_decode = pool._decode
+
+    def counting_decode(entry, need):
+        decoded.append(entry["path"])
+        return original_decode(entry, need)
+
+    monkeypatch.setattr(pool, "_decode", counting_decode)
+
+    first = pool.get(0, 50, 50)
+    assert first.shape == (64, 64, 3)
+    pool.get(1, 50, 50)
+    assert pool.get(0, 40, 60) is first  # 命中缓存并移到最近使用
+    pool.get(2, 50, 50)  # 超出上限，淘汰最久未用的 1
+    assert list(pool._cache) == [0, 2]
+    assert pool.cache_bytes == 2 * tile_bytes
+    assert len(decoded) == 3
+
+    pool.get(1, 50, 50)
+    assert len(decoded) == 4 and list(pool._cache) == [2, 1]
+
+    # 需要更大的图时重新解码（不超过原图）；超过缓存上限的结果直接返回，不进入缓存
+    assert pool.get(2, 90, 90).shape == (100, 100, 3)
+    assert len(decoded) == 5 and list(pool._cache) == [1]
+    assert pool.cache_bytes == tile_bytes
+
+    # 切换文件夹清空缓存
+    write_pool_images(tmp_path / "other", 2)
+    assert pool.scan(str(tmp_path / "other")) == 2
+    assert pool.cache_bytes == 0 and not pool._cache
+
+
+class GatedCamera:
+    """由测试逐帧放行的假摄像头，帧内容为帧编号"""
+    def __init__(self, *args):
+        self.gate = threading.Semaphore(0)
+        self.count = 0
+        self.finished = False
+        self.released = threading.Event()
+
+    def isOpened(self):
+        return True
+
+    def set(self, *args):
+        return True
+
+    def read(self):
+        self.gate.acquire()
+        if self.finished:
+            return False, None
+        self.count += 1
+        return True, np.full((4, 4, 3), self.count, np.uint8)
+
+    def release(self):
+        self.released.set()
+
+
+def test_latest_frame_capture_keeps_only_newest_frame(monkeypatch):
+    camera = GatedCamera()
+    monkeypatch.setattr(face.cv2, "VideoCapture", lambda *args: camera)
+    capture = face.LatestFrameCapture()
+    capture.start()
+
+    for _ in range(3):
+        camera.gate.release()
+    seq, frame, _ = capture.read(2, timeout=5)  # 等到第3帧
+    assert seq == 3 and frame[0, 0, 0] == 3
+    assert capture.dropped_frames == 2  # 第1、2帧未被读取就被覆盖
+    assert capture.read(3, timeout=0.05) is None
+
+    camera.gate.release()
+    seq, frame, _ = capture.read(3, timeout=5)
+    assert seq == 4 and frame[0, 0, 0] == 4
+    assert capture.dropped_frames == 2
+
+    # 摄像头读取失败后采集线程退出并自己释放设备
+    camera.finished = True
+    camera.gate.release()
+    assert capture.read(4, timeout=5) is None
+    assert camera.released.wait(5)
+    assert not capture.running
+    capture.stop()
+
+
+class ListCapture:
+    """按顺序给出预先准备好的帧，取完后视为采集结束"""
+    def __init__(self, count):
+        self.frames = [np.full((40, 40, 3), 100 + i, np.uint8) for i in range(count)]
+        self.running = True
+
+    def read(self, last_seq, timeout=0.5):
+        if last_seq >= len(self.frames):
+            self.running = False
+            return None
+        return last_seq + 1, self.frames[last_seq], float(last_seq)
+
+
+def run_worker(worker, on_frame):
+    worker.frame_ready.connect(on_frame)
+    worker.run()  # 直接在当前线程运行，信号同步送达
+
+
+def test_processing_worker_drops_results_until_shown():
+    worker = face.FrameProcessingWorker(ListCapture(5), face.ReplacementImagePool(), "pixelate", 8)
+    received = []
+    run_worker(worker, lambda original, processed, timestamp, faces, seq: received.append(seq))
+    # 界面一直没有确认显示，只有第一帧被发出
+    assert received == [1]
+    assert worker.skipped_results == 4
+
+    worker = face.FrameProcessingWorker(ListCapture(5), face.ReplacementImagePool(), "pixelate", 8)
+    received = []
+
+    def show(original, processed, timestamp, faces, seq):
+        received.append(seq)
+        if seq == 2:
+            worker.set_effect_settings("pixelate", 16)
+        worker.mark_shown(seq)
+
+    run_worker(worker, show)
+    assert received == [1, 2, 3, 4, 5]
+    assert worker.skipped_results == 0
+    assert worker._settings == ("pixelate", 16)
+
+
+def write_batch_inputs(input_dir, names):
+    rng = np.random.default_rng(len(names))
+    for name in names:
+        path = input_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        face.write_image(str(path), rng.integers(0, 256, (48, 64, 3)).astype(np.uint8))
+
+
+def test_run_batch_resumes_and_skips_finished_files(tmp_path, monkeypatch, capsys):
+    # spawn/forkserver 的子进程按模块名导入任务函数，需要一个能直接 import 的同名文件
+    module_dir = tmp_path / "modules"
+    module_dir.mkdir()
+    (module_dir / "face_replace.py").symlink_to(face.__file__)
+    monkeypatch.syspath_prepend(str(module_dir))
+
+    input_dir, output_dir = tmp_path / "in", tmp_path / "out"
+    write_batch_inputs(input_dir, ["a.png", "b.jpg", "sub/c.png"])
+    (input_dir / "broken.png").write_bytes(b"not an image")
+
+    def run(**kwargs):
+        return face.run_batch(str(input_dir), str(output_dir), workers=1, chunk_size=2, **kwargs)
+
+    stats = run()
+    assert (stats["processed"], stats["skipped"]) == (3, 0)
+    assert stats["failed"] == ["broken.png"]
+    assert (output_dir / "sub" / "c.png").exists()
+    progress = (output_dir / face.BATCH_PROGRESS_FILE).read_text(encoding="utf-8").split()
+    assert sorted(progress) == ["a.png", "b.jpg", "sub/c.png"]
+
+    # 已完成的文件跳过，失败的文件下次重试
+    write_batch_inputs(input_dir, ["sub/d.png"])
+    stats = run()
+    assert (stats["processed"], stats["skipped"]) == (1, 3)
+    assert stats["failed"] == ["broken.png"]
+
+    # 替换模式同样写出所有图片
+    pool_dir = tmp_path / "pool"
+    write_pool_images(pool_dir, 2)
+    stats = face.run_batch(str(input_dir), str(tmp_path / "replaced"), mode="replace",
+                           replacement_folder=str(pool_dir), workers=1)
+    assert stats["processed"] == 4
+    with pytest.raises(ValueError):
+        face.run_batch(str(input_dir), str(tmp_path / "x"), mode="replace")
+    capsys.readouterr()
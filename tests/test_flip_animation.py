@@ -0,0 +1,199 @@
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+flip = load_script("图像局部翻转小项目.py", "flip_animation")
+
+
+def fake_ffmpeg(tmp_path, exit_code=0):
+    """读完 stdin 的假 ffmpeg：每读一块就往 stderr 写一大段日志，最后按 exit_code 退出"""
+    script = tmp_path / "ffmpeg"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import sys\n"
+        "while sys.stdin.buffer.read(65536):\n"
+        "    sys.stderr.write('frame log ' * 400 + '\\n')\n"
+        "sys.stderr.write('encoder finished\\n')\n"
+        f"sys.exit({exit_code})\n")
+    script.chmod(0o755)
+    return str(script)
+
+
+def write_through_sink(sink, frames=200, size=(64, 48)):
+    sink.open(size, 20)
+    frame = np.zeros((size[1], size[0], 3), np.uint8)
+    for _ in range(frames):
+        sink.write(frame)
+    sink.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="假 ffmpeg 依赖 shebang 脚本")
+def test_ffmpeg_sink_does_not_block_on_chatty_stderr(tmp_path):
+    sink = flip.FFmpegPipeSink(str(tmp_path / "out.mp4"), ffmpeg=fake_ffmpeg(tmp_path))
+    errors = []
+
+    def run():
+        try:
+            write_through_sink(sink)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(20)
+    assert not thread.is_alive(), "ffmpeg stderr 管道写满后写帧被阻塞"
+    assert errors == []
+
+
+@pytest.mark.skipif(os.name == "nt", reason="假 ffmpeg 依赖 shebang 脚本")
+def test_ffmpeg_sink_reports_stderr_on_failure(tmp_path):
+    sink = flip.FFmpegPipeSink(str(tmp_path / "out.mp4"), ffmpeg=fake_ffmpeg(tmp_path, exit_code=3))
+    with pytest.raises(RuntimeError, match="返回码 3") as excinfo:
+        write_through_sink(sink, frames=2)
+    assert "encoder finished" in str(excinfo.value)
+    sink.close()  # 再次关闭不应出错
+
+
+SIZE = (96, 64)
+GRID = (4, 4)
+BLEND_FRAMES = 3
+FRAME_RATE = 5
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    """随机的原始图、最终图和三张图像池图片"""
+    rng = np.random.default_rng(38)
+    paths = {}
+    for name in ("original", "final"):
+        paths[name] = str(tmp_path / f"{name}.png")
+        flip.cv2.imwrite(paths[name], rng.integers(0, 256, (SIZE[1], SIZE[0], 3)).astype(np.uint8))
+    pool = tmp_path / "pool"
+    pool.mkdir()
+    for i in range(3):
+        flip.cv2.imwrite(str(pool / f"pool_{i}.png"), rng.integers(0, 256, (50, 70, 3)).astype(np.uint8))
+    paths["pool"] = str(pool)
+    return paths
+
+
+def read_video(path):
+    cap = flip.cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def expected_frame_count(mode):
+    phases = 2 if mode == "scripted_invert" else 1
+    return GRID[0] * GRID[1] * phases * BLEND_FRAMES + FRAME_RATE
+
+
+def render(inputs, mode, **kwargs):
+    options = dict(final_path=inputs["final"], pool_folder=inputs["pool"], frame_rate=FRAME_RATE,
+                   grid_size=GRID, blend_frames=BLEND_FRAMES, target_resolution=SIZE, seed=7)
+    options.update(kwargs)
+    flip.create_animation(mode, inputs["original"], **options)
+
+
+def test_parallel_lossless_render_matches_serial(inputs, tmp_path, monkeypatch):
+    # spawn 的子进程按模块名导入任务函数，需要一个能直接 import 的同名文件
+    module_dir = tmp_path / "modules"
+    module_dir.mkdir()
+    (module_dir / "flip_animation.py").symlink_to(flip.__file__)
+    monkeypatch.syspath_prepend(str(module_dir))
+
+    serial, parallel = str(tmp_path / "serial.avi"), str(tmp_path / "parallel.avi")
+    render(inputs, "scripted_invert", output_video=serial, codec="FFV1")
+    render(inputs, "scripted_invert", output_video=parallel, codec="FFV1", workers=3)
+
+    serial_frames, parallel_frames = read_video(serial), read_video(parallel)
+    assert len(serial_frames) == expected_frame_count("scripted_invert")
+    assert len(parallel_frames) == len(serial_frames)
+    for a, b in zip(serial_frames, parallel_frames):
+        np.testing.assert_array_equal(a, b)
+    assert not any(name.startswith("parallel.part") for name in os.listdir(tmp_path))
+
+
+@pytest.mark.parametrize("mode", flip.ANIMATION_MODES)
+def test_wave_mode_ends_on_serial_canvas(inputs, mode):
+    original, final_image, pool_images, plan = flip.prepare_animation(
+        mode, inputs["original"], inputs["final"], inputs["pool"], GRID, None, SIZE, seed=3)
+
+    def last_canvas(**kwargs):
+        canvas = original.copy()
+        count = 0
+        for _ in flip.iter_frames(mode, canvas, plan, final_image, pool_images, BLEND_FRAMES, **kwargs):
+            count += 1
+        return canvas, count
+
+    serial, serial_count = last_canvas()
+    assert serial_count == expected_frame_count(mode) - FRAME_RATE
+    for kwargs in ({"concurrent_tiles": 4}, {"wave_frames": 40}, {"concurrent_tiles": 100}):
+        canvas, count = last_canvas(**kwargs)
+        np.testing.assert_array_equal(canvas, serial)
+        assert count < serial_count
+    # 固定时长的波浪帧数与网格大小无关
+    assert last_canvas(wave_frames=40)[1] == 40
+
+
+def test_null_and_image_sequence_sinks_receive_every_frame(inputs, tmp_path):
+    timings = flip.RenderTimings()
+    render(inputs, "local_invert", sink=flip.NullSink(), timings=timings)
+    assert timings.frames == expected_frame_count("local_invert")
+
+    for ext in (".png", ".jpg"):
+        directory = tmp_path / ext.strip(".")
+        render(inputs, "local_invert", sink=flip.ImageSequenceSink(str(directory), ext, max_pending=2))
+        names = sorted(os.listdir(directory))
+        assert len(names) == expected_frame_count("local_invert")
+        assert names[0] == f"frame_000000{ext}"
+        assert flip.cv2.imread(str(directory / names[-1])).shape == (SIZE[1], SIZE[0], 3)
+
+    # 图片序列按写入顺序编号，且写入的是当时画布的副本
+    directory = tmp_path / "exact"
+    sink = flip.ImageSequenceSink(str(directory), ".png", threads=2)
+    sink.open(SIZE, FRAME_RATE)
+    canvas = np.zeros((SIZE[1], SIZE[0], 3), np.uint8)
+    for value in range(10):
+        canvas[...] = value * 20
+        sink.write(canvas)
+    sink.close()
+    for value in range(10):
+        assert np.all(flip.cv2.imread(str(directory / f"frame_{value:06d}.png")) == value * 20)
+
+
+def test_load_pool_tiles_reuses_disk_cache(inputs, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    tiles = flip.load_pool_tiles(inputs["pool"], (24, 16), cache_dir=cache_dir)
+    assert len(tiles) == 3 and tiles[0].shape == (16, 24, 3)
+    assert len(os.listdir(cache_dir)) == 1
+
+    decoded = []
+    original_decode = flip._decode_pool_tile
+
+    def counting_decode(path, tile_size):
+        decoded.append(path)
+        return original_decode(path, tile_size)
+
+    monkeypatch.setattr(flip, "_decode_pool_tile", counting_decode)
+    cached = flip.load_pool_tiles(inputs["pool"], (24, 16), cache_dir=cache_dir)
+    assert decoded == []
+    for a, b in zip(tiles, cached):
+        np.testing.assert_array_equal(a, b)
+
+    # 图块尺寸或文件夹内容变化时重新解码
+    flip.load_pool_tiles(inputs["pool"], (12, 8), cache_dir=cache_dir)
+    assert len(decoded) == 3
+    flip.cv2.imwrite(os.path.join(inputs["pool"], "pool_3.png"), np.zeros((10, 10, 3), np.uint8))
+    assert len(flip.load_pool_tiles(inputs["pool"], (24, 16), cache_dir=cache_dir)) == 4
+    assert len(decoded) == 7
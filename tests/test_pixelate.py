@@ -0,0 +1,191 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import load_script
+
+pixelate = load_script("图像像素化.py", "pixelate")
+
+
+def write_test_video(path, frames=40, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), 10, size)
+    assert writer.isOpened()
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 5 % 256, np.uint8))
+    writer.release()
+
+
+def test_pixelate_video_file_processes_every_frame(tmp_path):
+    src = tmp_path / "in.avi"
+    write_test_video(src)
+    count = pixelate.pixelate_video_file(str(src), str(tmp_path / "out.avi"), 8, codec="MJPG", queue_size=4)
+    assert count == 40
+
+
+def test_pixelate_video_file_reraises_encoder_error_without_hanging(tmp_path, monkeypatch):
+    src = tmp_path / "in.avi"
+    write_test_video(src, frames=20)
+    real_writer = cv2.VideoWriter
+    real_capture = cv2.VideoCapture
+
+    class SlowCapture:
+        # 解码比像素化慢：编码线程出错时主循环正等在空的解码队列上
+        def __init__(self, *args):
+            self.cap = real_capture(*args)
+
+        def __getattr__(self, name):
+            return getattr(self.cap, name)
+
+        def read(self):
+            time.sleep(0.05)
+            return self.cap.read()
+
+    class FailingWriter:
+        def __init__(self, *args):
+            self.writer = real_writer(*args)
+
+        def isOpened(self):
+            return True
+
+        def write(self, frame):
+            raise OSError("disk full")
+
+        def release(self):
+            self.writer.release()
+
+    monkeypatch.setattr(pixelate.cv2, "VideoWriter", FailingWriter)
+    monkeypatch.setattr(pixelate.cv2, "VideoCapture", SlowCapture)
+    result = {}
+
+    def run():
+        try:
+            pixelate.pixelate_video_file(str(src), str(tmp_path / "out.avi"), 8, codec="MJPG", queue_size=2)
+        except OSError as e:
+            result["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=20)
+    assert not thread.is_alive(), "pixelate_video_file hung after the encoder failed"
+    assert str(result.get("error")) == "disk full"
+
+
+def serial_floyd_steinberg(image, palette):
+    """逐像素的参考实现"""
+    h, w = image.shape[:2]
+    work = image.astype(np.float64)
+    palette_f = palette.astype(np.float64)
+    out = np.zeros_like(image)
+    for y in range(h):
+        for x in range(w):
+            index = int(((palette_f - work[y, x]) ** 2).sum(axis=1).argmin())
+            out[y, x] = palette[index]
+            error = work[y, x] - palette_f[index]
+            if x + 1 < w:
+                work[y, x + 1] += error * 7 / 16
+            if y + 1 < h:
+                if x > 0:
+                    work[y + 1, x - 1] += error * 3 / 16
+                work[y + 1, x] += error * 5 / 16
+                if x + 1 < w:
+                    work[y + 1, x + 1] += error * 1 / 16
+    return out
+
+
+@pytest.mark.parametrize("shape", [(1, 9), (9, 1), (13, 17)])
+def test_error_diffusion_dither_matches_serial_reference(shape):
+    rng = np.random.default_rng(shape[0] * 100 + shape[1])
+    image = rng.integers(0, 256, shape + (3,), dtype=np.uint8)
+    palette = rng.integers(0, 256, (6, 3), dtype=np.uint8)
+    result = pixelate.error_diffusion_dither(image, palette)
+    expected = serial_floyd_steinberg(image, palette)
+    # 波前与逐像素的累加顺序不同，浮点舍入可能让极少数接近等距的像素选到另一种颜色
+    assert (result == expected).all(axis=2).mean() >= 0.98
+
+
+def test_error_diffusion_dither_preserves_average_color():
+    image = np.full((32, 32, 3), 128, np.uint8)
+    palette = np.array([[0, 0, 0], [255, 255, 255]], np.uint8)
+    result = pixelate.error_diffusion_dither(image, palette)
+    assert set(map(tuple, result.reshape(-1, 3))) <= {(0, 0, 0), (255, 255, 255)}
+    assert abs(result.mean() - 128) < 4
+
+
+def test_stylizer_reconfigure_while_stylizing():
+    stylizer = pixelate.Stylizer(style="bayer", n_colors=8, palette_refresh=1)
+    grid = np.random.default_rng(0).integers(0, 256, (24, 32, 3), dtype=np.uint8)
+    stop = threading.Event()
+
+    def reconfigure():
+        styles = ["bayer", "diffusion", "quantize"]
+        i = 0
+        while not stop.is_set():
+            stylizer.configure(style=styles[i % 3], n_colors=4 + i % 5)
+            stylizer.reset_palette()
+            i += 1
+
+    thread = threading.Thread(target=reconfigure)
+    thread.start()
+    try:
+        for _ in range(200):
+            assert stylizer.stylize_grid(grid).shape == grid.shape
+    finally:
+        stop.set()
+        thread.join()
+
+
+def write_top_down_bmp(path, image):
+    """24位BMP，高度写为负数表示自上而下存储（cv2 只写自下而上的）"""
+    height, width = image.shape[:2]
+    stride = (width * 3 + 3) // 4 * 4
+    rows = np.zeros((height, stride), np.uint8)
+    rows[:, :width * 3] = image.reshape(height, -1)
+    with open(path, "wb") as f:
+        f.write(b"BM" + (54 + rows.size).to_bytes(4, "little") + bytes(4) + (54).to_bytes(4, "little"))
+        f.write((40).to_bytes(4, "little") + width.to_bytes(4, "little", signed=True)
+                + (-height).to_bytes(4, "little", signed=True) + (1).to_bytes(2, "little")
+                + (24).to_bytes(2, "little") + bytes(24))
+        f.write(rows.tobytes())
+
+
+def write_ppm(path, image):
+    height, width = image.shape[:2]
+    with open(path, "wb") as f:
+        f.write(f"P6\n# comment\n{width} {height}\n255\n".encode("ascii"))
+        f.write(np.ascontiguousarray(image[..., ::-1]).tobytes())
+
+
+@pytest.mark.parametrize("fmt", ["bottom_up.bmp", "top_down.bmp", "image.ppm", "image.npy"])
+def test_pixelate_tiled_matches_whole_image(tmp_path, fmt):
+    rng = np.random.default_rng(35)
+    image = rng.integers(0, 256, size=(37, 10, 3)).astype(np.uint8)  # 宽10时BMP每行有2字节填充
+    src = tmp_path / fmt
+    if fmt == "bottom_up.bmp":
+        cv2.imwrite(str(src), image)
+    elif fmt == "top_down.bmp":
+        write_top_down_bmp(src, image)
+        np.testing.assert_array_equal(cv2.imread(str(src)), image)
+    elif fmt.endswith(".ppm"):
+        write_ppm(src, image)
+    else:
+        np.save(src, image)
+
+    reader = pixelate.StripReader(str(src))
+    assert reader.memory_mapped and (reader.width, reader.height) == (10, 37)
+    np.testing.assert_array_equal(reader.read(4, 9), image[4:9])
+    reader.close()
+
+    dst = tmp_path / "out.npy"
+    width, height, streamed = pixelate.pixelate_tiled(str(src), str(dst), 4, tile_rows=8)
+    assert (width, height, streamed) == (10, 37, True)
+    np.testing.assert_array_equal(np.load(dst), pixelate.pixelate_aligned(image, 4))
+
+    # 区域模式只改动区域内的像素
+    regions = [(3, 5, 4, 20)]
+    pixelate.pixelate_tiled(str(src), str(dst), 4, regions=regions, tile_rows=8)
+    expected = pixelate.pixelate_regions(image.copy(), 0, regions, 4)
+    np.testing.assert_array_equal(np.load(dst), expected)
+    assert not np.array_equal(expected, image)
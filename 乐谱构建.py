@@ -14,6 +14,7 @@ import threading
 import sys
 import subprocess  # For opening folder
 import json
+import time
 from datetime import datetime
 import cv2
 import numpy as np
@@ -519,11 +520,51 @@ class LogTextHandler(logging.Handler):
 
 
 # --- 2.简谱OCR识别模块 (IMPROVED) ---
+# EasyOCR模型加载占OCR耗时的大头，所有识别共享同一个Reader（按语言缓存），首次使用时才创建
+OCR_LANGUAGES = ('ch_sim', 'en')
+_shared_readers = {}
+_reader_create_lock = threading.Lock()  # 保证同一组语言只加载一次模型
+_readtext_lock = threading.Lock()  # Reader推理不保证线程安全，串行执行
+
+
+def get_shared_reader(languages=OCR_LANGUAGES):
+    """
+    获取共享的EasyOCR Reader，不存在时创建。
+    返回 (reader, 本次调用等待模型加载的秒数)，模型已就绪时为0。
+    """
+    key = tuple(languages)
+    reader = _shared_readers.get(key)
+    if reader is not None:
+        return reader, 0.0
+    start = time.perf_counter()
+    with _reader_create_lock:
+        reader = _shared_readers.get(key)
+        if reader is not None:  # 等锁期间其他线程（如预热）已加载完成
+            return reader, time.perf_counter() - start
+        reader = easyocr.Reader(list(key), gpu=False, verbose=False)
+        load_seconds = time.perf_counter() - start
+        _shared_readers[key] = reader
+        logger.info(f"EasyOCR模型加载完成 (冷启动)，耗时 {load_seconds:.2f}s")
+        return reader, load_seconds
+
+
+def warm_up_reader(languages=OCR_LANGUAGES):
+    """后台预热：加载模型并在空白小图上跑一次推理，之后的OCR直接复用"""
+    try:
+        start = time.perf_counter()
+        reader, _ = get_shared_reader(languages)
+        with _readtext_lock:
+            reader.readtext(np.full((32, 32, 3), 255, dtype=np.uint8), detail=0)
+        logger.info(f"EasyOCR预热完成，耗时 {time.perf_counter() - start:.2f}s")
+    except Exception as e:
+        # 预热失败不影响启动，真正识别时会重试并提示
+        logger.error(f"EasyOCR预热失败: {e}", exc_info=True)
+
+
 class SheetOCR:
-    def __init__(self, languages=['ch_sim', 'en']):
+    def __init__(self, languages=OCR_LANGUAGES):
         try:
-            self.reader = easyocr.Reader(languages, gpu=False)
-            logger.info("EasyOCR初始化成功")
+            self.reader, self.load_seconds = get_shared_reader(languages)
         except Exception as e:
             messagebox.showerror("EasyOCR初始化错误", f"EasyOCR初始化失败: {e}\n请确保正确安装了EasyOCR及其依赖项(如PyTorch)。")
             logger.error(f"EasyOCR初始化错误: {e}", exc_info=True)
@@ -539,13 +580,18 @@ class SheetOCR:
             
             # 使用更宽松的OCR参数
             # allowlist 允许更多可能的字符，后续再清理
-            result = self.reader.readtext(
-                image_path, 
-                detail=0, 
-                paragraph=False, # 识别单个字符或短语
-                allowlist='0123456789.-|OIli+', # 允许数字、点、横杠、竖线、易混淆字符及高音符号
-                batch_size=8,
-            )
+            with _readtext_lock:
+                start = time.perf_counter()
+                result = self.reader.readtext(
+                    image_path, 
+                    detail=0, 
+                    paragraph=False, # 识别单个字符或短语
+                    allowlist='0123456789.-|OIli+', # 允许数字、点、横杠、竖线、易混淆字符及高音符号
+                    batch_size=8,
+                )
+                elapsed = time.perf_counter() - start
+            state = f"冷启动，另等待模型加载 {self.load_seconds:.2f}s" if self.load_seconds else "模型已预热"
+            logger.info(f"OCR识别耗时 {elapsed:.2f}s ({state})")
             logger.info(f"原始OCR识别结果: {result}")
         except Exception as e:
             logger.error(f"EasyOCR readtext错误: {e}", exc_info=True)
@@ -706,17 +752,8 @@ class ChiptuneGenerator:
 
 # --- Main Execution ---
 if __name__ == "__main__":
-    try:
-        # 预检查EasyOCR
-        _ = easyocr.Reader(['ch_sim', 'en'], gpu=False, verbose=False)
-        del _
-        logger.info("EasyOCR预检查成功")
-    except Exception as e:
-        root_check = tk.Tk()
-        root_check.withdraw()
-        messagebox.showerror("启动错误", f"无法初始化EasyOCR: {e}\n\n请确保正确安装了EasyOCR及其依赖项(如CPU版PyTorch)。\n应用程序将关闭。")
-        logger.critical(f"EasyOCR初始化失败: {e}", exc_info=True)
-        sys.exit(1)
+    # 后台预热EasyOCR，界面立即可用；首次点击OCR时若仍在加载会等待同一个模型
+    threading.Thread(target=warm_up_reader, daemon=True).start()
 
     root = tk.Tk()
     app = AppGUI(root)
@@ -2,13 +2,742 @@ import cv2
 import mediapipe as mp
 import os
 import random
+import time
+import itertools
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 import numpy as np
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QPushButton, QFileDialog, QSlider, QRadioButton,
                              QFrame, QButtonGroup, QLineEdit, QComboBox, QMessageBox)
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt, QTimer, QThread, Signal
 from PySide6.QtGui import QImage, QPixmap, QPalette, QColor
 
+# 尝试导入scipy的最优分配，如果失败则使用内置的匈牙利算法
+try:
+    from scipy.optimize import linear_sum_assignment
+    SCIPY_AVAILABLE = True
+except ImportError:
+    SCIPY_AVAILABLE = False
+
+
+# ==================== 人脸跟踪 ====================
+
+def iou_matrix(boxes_a, boxes_b):
+    """向量化计算两组 (x, y, w, h) 边界框之间的IoU矩阵，形状为 (len(a), len(b))"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    
+    # 计算交集区域
+    xx1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    yy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    xx2 = np.minimum((a[:, 0] + a[:, 2])[:, None], (b[:, 0] + b[:, 2])[None, :])
+    yy2 = np.minimum((a[:, 1] + a[:, 3])[:, None], (b[:, 1] + b[:, 3])[None, :])
+    intersection = np.clip(xx2 - xx1, 0, None) * np.clip(yy2 - yy1, 0, None)
+    
+    # 计算并集面积
+    union = (a[:, 2] * a[:, 3])[:, None] + (b[:, 2] * b[:, 3])[None, :] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1e-6), 0.0)
+
+
+def linear_assignment(cost):
+    """求解代价矩阵的最优分配（匈牙利算法），返回 (行索引数组, 列索引数组)"""
+    cost = np.asarray(cost, dtype=np.float64)
+    if cost.size == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+    if SCIPY_AVAILABLE:
+        return linear_sum_assignment(cost)
+    
+    # 保证行数不大于列数
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    
+    # 带势函数的O(n^2 m)匈牙利算法，索引从1开始，0为虚拟列
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    
+    rows = p[1:] - 1
+    cols = np.arange(m)
+    assigned = rows >= 0
+    rows, cols = rows[assigned], cols[assigned]
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+class FaceTracker:
+    """基于IoU最优分配的人脸跟踪器，保留短暂丢失的轨迹并定期清理ID到替换图片的映射"""
+    def __init__(self, iou_threshold=0.3, max_lost_frames=15, map_timeout=5.0):
+        self.iou_threshold = iou_threshold
+        self.max_lost_frames = max_lost_frames  # 丢失轨迹保留的帧数，用于重新识别
+        self.map_timeout = map_timeout          # ID映射的过期时间（秒）
+        self.reset()
+    
+    def reset(self):
+        """清空所有轨迹和映射"""
+        self.tracks = {}          # track_id -> {"box": (x, y, w, h), "lost": 丢失帧数}
+        self.image_map = {}       # track_id -> [替换图片索引, 最后使用时间]
+        self._id_counter = itertools.count(1)
+    
+    def update(self, boxes, now=None):
+        """用当前帧的检测框更新轨迹，返回 [(track_id, box), ...]，顺序与输入一致"""
+        now = time.monotonic() if now is None else now
+        track_ids = list(self.tracks.keys())
+        assigned = [None] * len(boxes)
+        
+        if track_ids and boxes:
+            track_boxes = [self.tracks[tid]["box"] for tid in track_ids]
+            ious = iou_matrix(track_boxes, boxes)
+            rows, cols = linear_assignment(1.0 - ious)
+            for r, c in zip(rows, cols):
+                if ious[r, c] >= self.iou_threshold:
+                    assigned[c] = track_ids[r]
+        
+        # 未匹配的轨迹累计丢失帧数，超时后删除
+        matched_ids = set(tid for tid in assigned if tid is not None)
+        for tid in track_ids:
+            if tid not in matched_ids:
+                self.tracks[tid]["lost"] += 1
+                if self.tracks[tid]["lost"] > self.max_lost_frames:
+                    del self.tracks[tid]
+        
+        # 更新匹配轨迹，为未匹配的检测创建新ID
+        result = []
+        for box, tid in zip(boxes, assigned):
+            if tid is None:
+                tid = next(self._id_counter)
+            self.tracks[tid] = {"box": tuple(box), "lost": 0}
+            if tid in self.image_map:
+                self.image_map[tid][1] = now
+            result.append((tid, tuple(box)))
+        
+        self._expire_image_map(now)
+        return result
+    
+    def image_index(self, track_id, pool_size, now=None):
+        """获取轨迹对应的替换图片索引，首次访问时随机分配"""
+        now = time.monotonic() if now is None else now
+        entry = self.image_map.get(track_id)
+        if entry is None:
+            entry = [random.randrange(pool_size), now]
+            self.image_map[track_id] = entry
+        else:
+            entry[1] = now
+        return entry[0] % pool_size
+    
+    def _expire_image_map(self, now):
+        """删除轨迹已消失且超过过期时间的映射"""
+        expired = [tid for tid, (_, last_seen) in self.image_map.items()
+                   if tid not in self.tracks and now - last_seen > self.map_timeout]
+        for tid in expired:
+            del self.image_map[tid]
+
+
+# ==================== 人脸处理函数 ====================
+
+VALID_IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def read_image(path, flags=cv2.IMREAD_COLOR):
+    """读取图片（支持中文路径），失败时返回None"""
+    data = np.fromfile(path, dtype=np.uint8)
+    return cv2.imdecode(data, flags)
+
+
+def write_image(path, image):
+    """写出图片（支持中文路径），返回是否成功"""
+    ok, buffer = cv2.imencode(os.path.splitext(path)[1], image)
+    if ok:
+        buffer.tofile(path)
+    return ok
+
+
+def detect_faces(face_detection, frame, expand_ratio=0.4):
+    """检测人脸并返回扩大后的边界框列表 [(x, y, w, h), ...]"""
+    frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = face_detection.process(frame_rgb)
+    
+    boxes = []
+    if results.detections:
+        h, w = frame.shape[:2]
+        for detection in results.detections:
+            bbox = detection.location_data.relative_bounding_box
+            
+            x = int(bbox.xmin * w)
+            y = int(bbox.ymin * h)
+            width = int(bbox.width * w)
+            height = int(bbox.height * h)
+            
+            # 扩大检测框
+            new_x = max(int(x - width * expand_ratio * 0.5), 0)
+            new_y = max(int(y - height * expand_ratio), 0)
+            new_w = min(int(width * (1 + expand_ratio)), w - new_x)
+            new_h = min(int(height * (1 + expand_ratio)), h - new_y)
+            
+            if new_w <= 0 or new_h <= 0:
+                continue
+            
+            boxes.append((new_x, new_y, new_w, new_h))
+    return boxes
+
+
+def adaptive_block_size(w, h, pixel_size, min_blocks=4, max_blocks=32):
+    """根据人脸大小调整马赛克块大小：小脸至少保留min_blocks块，大脸最多max_blocks块"""
+    short_side = min(w, h)
+    block = min(max(pixel_size, short_side / max_blocks), short_side / min_blocks)
+    return max(1.0, block)
+
+
+def pixelate_region_inplace(image, x, y, w, h, pixel_size):
+    """直接在ROI视图上进行像素化，不复制整帧"""
+    roi = image[y:y+h, x:x+w]
+    h, w = roi.shape[:2]
+    if w == 0 or h == 0:
+        return image
+    block = adaptive_block_size(w, h, pixel_size)
+    small_w = max(1, int(round(w / block)))
+    small_h = max(1, int(round(h / block)))
+    temp = cv2.resize(roi, (small_w, small_h), interpolation=cv2.INTER_LINEAR)
+    cv2.resize(temp, (w, h), dst=roi, interpolation=cv2.INTER_NEAREST)
+    return image
+
+
+def pixelate_faces(image, boxes, pixel_size):
+    """一次处理一帧中的所有人脸区域（原地修改）"""
+    for x, y, w, h in boxes:
+        pixelate_region_inplace(image, x, y, w, h, pixel_size)
+    return image
+
+
+def pixelate_region(image, x, y, w, h, pixel_size):
+    """对指定区域进行像素化处理，返回新图像"""
+    return pixelate_region_inplace(image.copy(), x, y, w, h, pixel_size)
+
+
+def create_rounded_mask(width, height, radius):
+    """创建圆角蒙版"""
+    mask = np.zeros((height, width), dtype=np.uint8)
+    cv2.rectangle(mask, (radius, 0), (width-radius, height), 255, -1)
+    cv2.rectangle(mask, (0, radius), (width, height-radius), 255, -1)
+    cv2.circle(mask, (radius, radius), radius, 255, -1)
+    cv2.circle(mask, (width-radius, radius), radius, 255, -1)
+    cv2.circle(mask, (radius, height-radius), radius, 255, -1)
+    cv2.circle(mask, (width-radius, height-radius), radius, 255, -1)
+    return mask
+
+
+def match_color_with_background(replacement_img, background_img, x, y, w, h):
+    """调整替换图片的颜色以匹配背景"""
+    background_region = background_img[max(0, y-10):min(background_img.shape[0], y+h+10),
+                                    max(0, x-10):min(background_img.shape[1], x+w+10)]
+    background_mean = np.mean(background_region, axis=(0, 1))
+    replacement_mean = np.mean(replacement_img, axis=(0, 1))
+    color_diff = background_mean - replacement_mean
+    adjusted_img = replacement_img.astype(np.float32)
+    adjusted_img += color_diff * 0.3
+    return np.clip(adjusted_img, 0, 255).astype(np.uint8)
+
+
+def blend_replacement(image, replacement_image, x, y, w, h):
+    """将替换图片以圆角蒙版混合到指定区域（原地修改）"""
+    # 调整替换图片大小
+    replacement_resized = cv2.resize(replacement_image, (w, h))
+    
+    # 创建圆角蒙版
+    corner_radius = int(min(w, h) * 0.2)
+    mask = create_rounded_mask(w, h, corner_radius)
+    mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
+    
+    # 调整颜色
+    replacement_resized = match_color_with_background(replacement_resized, image, x, y, w, h)
+    
+    # 混合图像
+    roi = image[y:y + h, x:x + w]
+    image[y:y + h, x:x + w] = cv2.convertScaleAbs(
+        replacement_resized * mask_3channel + roi * (1 - mask_3channel)
+    )
+    return image
+
+
+def apply_face_effects(processed, current_faces, tracker, replacement_pool, mode, pixel_size):
+    """跟踪检测到的人脸并在processed上原地应用替换或像素化效果"""
+    tracked_faces = tracker.update(current_faces)
+    
+    if mode == "pixelate":
+        pixelate_faces(processed, [box for _, box in tracked_faces], pixel_size)
+        return processed
+    
+    # 图片池可能在界面线程被切换，本帧只读取一次数量
+    pool_size = len(replacement_pool)
+    if pool_size:
+        for face_id, (new_x, new_y, new_w, new_h) in tracked_faces:
+            replacement_idx = tracker.image_index(face_id, pool_size)
+            replacement_image = replacement_pool.get(replacement_idx, new_w, new_h)
+            if replacement_image is not None:
+                blend_replacement(processed, replacement_image, new_x, new_y, new_w, new_h)
+    return processed
+
+
+# ==================== 替换图片池 ====================
+
+class ReplacementImagePool:
+    """
+    替换图片池：切换文件夹时只扫描文件元数据，
+    使用时按人脸框所需的最大尺寸解码，并保存在按字节数限制的LRU缓存中。
+    """
+    # JPEG等格式可在解码时直接缩小，避免先解码完整分辨率
+    REDUCED_FLAGS = ((8, cv2.IMREAD_REDUCED_COLOR_8),
+                     (4, cv2.IMREAD_REDUCED_COLOR_4),
+                     (2, cv2.IMREAD_REDUCED_COLOR_2))
+    
+    def __init__(self, max_cache_bytes=256 * 1024 * 1024, min_side=64, max_side=1024):
+        self.max_cache_bytes = max_cache_bytes
+        self.min_side = min_side
+        self.max_side = max_side
+        self.folder = None
+        self._lock = threading.Lock()
+        self._entries = []             # [{"path", "size", "shape"}]，shape在首次完整解码后记录
+        self._cache = OrderedDict()    # 索引 -> 缩放后的图片
+        self._cache_bytes = 0
+        self._generation = 0           # 每次切换文件夹递增，丢弃过期的解码结果
+    
+    def scan(self, folder):
+        """扫描文件夹中的图片元数据（不解码），返回图片数量"""
+        entries = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.lower().endswith(VALID_IMAGE_EXTENSIONS):
+                    entries.append({"path": entry.path, "size": entry.stat().st_size, "shape": None})
+        entries.sort(key=lambda e: e["path"])
+        
+        with self._lock:
+            self.folder = folder
+            self._entries = entries
+            self._cache.clear()
+            self._cache_bytes = 0
+            self._generation += 1
+        return len(entries)
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def random_index(self):
+        return random.randrange(len(self._entries))
+    
+    @property
+    def cache_bytes(self):
+        return self._cache_bytes
+    
+    def get(self, index, width, height):
+        """获取足以覆盖 width x height 人脸框的替换图片，解码失败时返回None"""
+        need = self._bucket(max(width, height))
+        with self._lock:
+            if not self._entries:
+                return None
+            index %= len(self._entries)
+            entry = self._entries[index]
+            generation = self._generation
+            cached = self._cache.get(index)
+            if cached is not None:
+                is_full = entry["shape"] is not None and cached.shape[:2] == entry["shape"][:2]
+                if max(cached.shape[:2]) >= need or is_full:
+                    self._cache.move_to_end(index)
+                    return cached
+        
+        # 在锁外解码，避免阻塞其他线程切换文件夹
+        image = self._decode(entry, need)
+        if image is None:
+            return None
+        
+        with self._lock:
+            if generation == self._generation:
+                self._store(index, image)
+        return image
+    
+    def _bucket(self, size):
+        """将所需边长向上取整到2的幂，避免人脸尺寸小幅变化时反复解码"""
+        side = self.min_side
+        while side < size and side < self.max_side:
+            side *= 2
+        return min(side, self.max_side)
+    
+    def _decode(self, entry, need):
+        """以不小于need的长边解码图片，并缩放到need"""
+        flags = cv2.IMREAD_COLOR
+        if entry["shape"] is not None:
+            long_side = max(entry["shape"][:2])
+            for factor, reduced_flags in self.REDUCED_FLAGS:
+                if long_side // factor >= need:
+                    flags = reduced_flags
+                    break
+        
+        try:
+            image = read_image(entry["path"], flags)
+        except (OSError, cv2.error):
+            image = None
+        if image is None:
+            return None
+        if flags == cv2.IMREAD_COLOR:
+            entry["shape"] = image.shape
+        
+        long_side = max(image.shape[:2])
+        if long_side > need:
+            scale = need / long_side
+            image = cv2.resize(image, (max(1, int(image.shape[1] * scale)), max(1, int(image.shape[0] * scale))),
+                               interpolation=cv2.INTER_AREA)
+        return image
+    
+    def _store(self, index, image):
+        """放入缓存并按LRU顺序淘汰，直到总字节数不超过上限"""
+        old = self._cache.pop(index, None)
+        if old is not None:
+            self._cache_bytes -= old.nbytes
+        if image.nbytes > self.max_cache_bytes:
+            return
+        while self._cache and self._cache_bytes + image.nbytes > self.max_cache_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= evicted.nbytes
+        self._cache[index] = image
+        self._cache_bytes += image.nbytes
+
+
+# ==================== 实时摄像头流水线 ====================
+
+class LatestFrameCapture:
+    """后台采集线程：持续读取摄像头，只保留最新一帧，避免驱动缓冲导致延迟累积"""
+    def __init__(self, source=0, api_preference=cv2.CAP_ANY):
+        self.source = source
+        self.api_preference = api_preference
+        self.dropped_frames = 0  # 未被处理就被新帧覆盖的帧数
+        self._cap = None
+        self._thread = None
+        self._cond = threading.Condition()
+        self._frame = None
+        self._timestamp = 0.0
+        self._seq = 0
+        self._consumed_seq = 0
+        self._running = False
+    
+    @property
+    def running(self):
+        return self._running
+    
+    def start(self):
+        """打开摄像头并启动采集线程，失败时抛出RuntimeError"""
+        self._cap = cv2.VideoCapture(self.source, self.api_preference)
+        if not self._cap.isOpened():
+            self._cap.release()
+            self._cap = None
+            raise RuntimeError("无法打开摄像头")
+        # 尽量减小驱动缓冲（部分后端不支持，忽略返回值）
+        self._cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """
+        通知采集线程退出。摄像头由采集线程退出时自己释放：
+        等待超时时线程可能仍在 cap.read() 中，此时释放会破坏正在使用的设备。
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+    
+    def read(self, last_seq, timeout=0.5):
+        """等待比last_seq更新的帧，返回 (seq, frame, 采集时间戳)；超时或采集结束时返回None"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq > last_seq or not self._running, timeout)
+            if self._seq <= last_seq:
+                return None
+            self._consumed_seq = self._seq
+            return self._seq, self._frame, self._timestamp
+    
+    def _run(self):
+        cap = self._cap
+        try:
+            while self._running:
+                ret, frame = cap.read()
+                timestamp = time.monotonic()
+                with self._cond:
+                    if not ret:
+                        self._running = False
+                        self._cond.notify_all()
+                        break
+                    if self._seq > self._consumed_seq:
+                        self.dropped_frames += 1
+                    self._frame = frame
+                    self._timestamp = timestamp
+                    self._seq += 1
+                    self._cond.notify_all()
+        finally:
+            cap.release()
+
+
+class FrameProcessingWorker(QThread):
+    """
+    处理线程：从采集线程取最新帧，在界面线程之外完成检测与合成。
+    使用自己的人脸跟踪器；模式和像素大小由界面通过 set_effect_settings 整体替换，
+    每帧开始时在锁内取一次快照，不直接读取主窗口的状态。
+    """
+    frame_ready = Signal(object, object, float, int, int)  # 原始帧, 处理后帧, 采集时间戳, 人脸数, 帧序号
+    error = Signal(str)
+    
+    def __init__(self, capture, replacement_pool, mode, pixel_size):
+        super().__init__()
+        self.capture = capture
+        self.replacement_pool = replacement_pool  # 内部加锁，可跨线程使用
+        self.face_tracker = FaceTracker()
+        self.skipped_results = 0  # 界面尚未显示上一帧时丢弃的处理结果
+        self._running = True
+        self._settings_lock = threading.Lock()
+        self._settings = (mode, pixel_size)
+        # 与采集线程的 _seq/_consumed_seq 相同的做法：发出的序号领先已显示的序号时，界面还没显示完
+        self._sent_seq = 0
+        self._shown_seq = 0
+    
+    def stop(self):
+        self._running = False
+    
+    def set_effect_settings(self, mode, pixel_size):
+        with self._settings_lock:
+            self._settings = (mode, pixel_size)
+    
+    def mark_shown(self, seq):
+        """界面显示完序号为 seq 的结果后调用"""
+        self._shown_seq = seq
+    
+    def run(self):
+        # MediaPipe实例不能跨线程共享，处理线程使用独立实例
+        face_detection = mp.solutions.face_detection.FaceDetection(
+            model_selection=1,
+            min_detection_confidence=0.5
+        )
+        seq = 0
+        try:
+            while self._running:
+                item = self.capture.read(seq)
+                if item is None:
+                    if not self.capture.running:
+                        if self._running:
+                            self.error.emit("摄像头读取失败")
+                        break
+                    continue
+                
+                seq, frame, timestamp = item
+                with self._settings_lock:
+                    mode, pixel_size = self._settings
+                processed = frame.copy()
+                current_faces = detect_faces(face_detection, frame)
+                apply_face_effects(processed, current_faces, self.face_tracker,
+                                   self.replacement_pool, mode, pixel_size)
+                
+                # 界面还在显示上一帧时直接丢弃，不排队
+                if self._sent_seq > self._shown_seq:
+                    self.skipped_results += 1
+                    continue
+                self._sent_seq = seq
+                self.frame_ready.emit(frame, processed, timestamp, len(current_faces), seq)
+        finally:
+            face_detection.close()
+
+
+# ==================== 批量处理 ====================
+
+BATCH_PROGRESS_FILE = ".batch_progress.txt"  # 记录已完成文件的相对路径，用于断点续传
+BATCH_STAGES = ("decode", "detect", "process", "encode")
+
+# 每个工作进程独立持有的MediaPipe实例和替换图片池
+_batch_face_detection = None
+_batch_replacement_pool = None
+
+
+def _init_batch_worker(replacement_folder):
+    """工作进程初始化：每个进程创建一个MediaPipe实例和替换图片池"""
+    global _batch_face_detection, _batch_replacement_pool
+    _batch_face_detection = mp.solutions.face_detection.FaceDetection(
+        model_selection=1,
+        min_detection_confidence=0.5
+    )
+    _batch_replacement_pool = ReplacementImagePool()
+    if replacement_folder:
+        _batch_replacement_pool.scan(replacement_folder)
+
+
+def _process_batch_chunk(tasks, mode, pixel_size, decode_threads):
+    """工作进程：用线程池并行解码一组图片，再逐张检测、处理并写出"""
+    timings = dict.fromkeys(BATCH_STAGES, 0.0)
+    done, failed = [], []
+    
+    def decode(task):
+        start = time.perf_counter()
+        try:
+            image = read_image(task[0])
+        except (OSError, cv2.error):
+            image = None
+        return image, time.perf_counter() - start
+    
+    with ThreadPoolExecutor(max_workers=decode_threads) as pool:
+        for (src_path, dst_path, rel_path), (image, decode_time) in zip(tasks, pool.map(decode, tasks)):
+            timings["decode"] += decode_time
+            if image is None:
+                failed.append(rel_path)
+                continue
+            
+            start = time.perf_counter()
+            face_boxes = detect_faces(_batch_face_detection, image)
+            detect_end = time.perf_counter()
+            
+            if mode == "pixelate":
+                pixelate_faces(image, face_boxes, pixel_size)
+            elif len(_batch_replacement_pool):
+                for x, y, w, h in face_boxes:
+                    replacement_image = _batch_replacement_pool.get(_batch_replacement_pool.random_index(), w, h)
+                    if replacement_image is not None:
+                        blend_replacement(image, replacement_image, x, y, w, h)
+            process_end = time.perf_counter()
+            
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            if write_image(dst_path, image):
+                done.append(rel_path)
+            else:
+                failed.append(rel_path)
+            encode_end = time.perf_counter()
+            
+            timings["detect"] += detect_end - start
+            timings["process"] += process_end - detect_end
+            timings["encode"] += encode_end - process_end
+    
+    return done, failed, timings
+
+
+def run_batch(input_dir, output_dir, mode="pixelate", replacement_folder=None, pixel_size=16,
+              workers=None, decode_threads=4, chunk_size=16):
+    """
+    批量处理目录树中的所有图片，输出保持相同的目录结构。
+    已完成的文件记录在输出目录的进度文件中，重新运行时会自动跳过。
+    返回包含吞吐量和各阶段耗时的统计字典。
+    """
+    if mode not in ("replace", "pixelate"):
+        raise ValueError(f"无效的处理模式: {mode}")
+    if mode == "replace" and not replacement_folder:
+        raise ValueError("替换模式需要指定替换图片文件夹")
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"输入文件夹不存在: {input_dir}")
+    
+    os.makedirs(output_dir, exist_ok=True)
+    progress_path = os.path.join(output_dir, BATCH_PROGRESS_FILE)
+    finished = set()
+    if os.path.exists(progress_path):
+        with open(progress_path, "r", encoding="utf-8") as f:
+            finished = set(line.rstrip("\n") for line in f if line.strip())
+    
+    # 遍历目录树，跳过已完成的文件和位于输入目录中的输出目录
+    output_abs = os.path.abspath(output_dir)
+    tasks = []
+    skipped = 0
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_abs)
+        for filename in sorted(files):
+            if not filename.lower().endswith(VALID_IMAGE_EXTENSIONS):
+                continue
+            src_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(src_path, input_dir).replace(os.sep, "/")
+            if rel_path in finished:
+                skipped += 1
+                continue
+            tasks.append((src_path, os.path.join(output_dir, rel_path), rel_path))
+    
+    print(f"共 {len(tasks) + skipped} 张图片，跳过已完成 {skipped} 张，待处理 {len(tasks)} 张")
+    
+    timings = dict.fromkeys(BATCH_STAGES, 0.0)
+    processed = 0
+    failed = []
+    start = time.perf_counter()
+    
+    if tasks:
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_batch_worker,
+                                 initargs=(replacement_folder if mode == "replace" else None,)) as executor, \
+                open(progress_path, "a", encoding="utf-8") as progress_file:
+            futures = [executor.submit(_process_batch_chunk, chunk, mode, pixel_size, decode_threads)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                chunk_done, chunk_failed, chunk_timings = future.result()
+                for rel_path in chunk_done:
+                    progress_file.write(rel_path + "\n")
+                progress_file.flush()
+                
+                processed += len(chunk_done)
+                failed.extend(chunk_failed)
+                for stage in BATCH_STAGES:
+                    timings[stage] += chunk_timings[stage]
+                
+                elapsed = time.perf_counter() - start
+                print(f"进度: {processed + len(failed)}/{len(tasks)} | {processed / elapsed:.1f} 张/秒")
+    
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed": elapsed,
+        "images_per_sec": processed / elapsed if elapsed > 0 else 0.0,
+        "timings": timings,
+    }
+
+
+def print_batch_report(stats):
+    """打印批量处理的吞吐量和各阶段耗时"""
+    print(f"完成: {stats['processed']} 张 | 跳过: {stats['skipped']} 张 | 失败: {len(stats['failed'])} 张")
+    print(f"总耗时: {stats['elapsed']:.2f} 秒 | 吞吐量: {stats['images_per_sec']:.1f} 张/秒")
+    total = sum(stats["timings"].values())
+    for stage in BATCH_STAGES:
+        stage_time = stats["timings"][stage]
+        share = stage_time / total * 100 if total > 0 else 0.0
+        per_image = stage_time / stats["processed"] * 1000 if stats["processed"] else 0.0
+        print(f"  {stage:<8} 累计 {stage_time:8.2f} 秒 ({share:5.1f}%) | 平均 {per_image:.1f} 毫秒/张")
+    for rel_path in stats["failed"]:
+        print(f"  处理失败: {rel_path}")
+
+
 class FaceProcessingApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -34,11 +763,13 @@ class FaceProcessingApp(QMainWindow):
         
         # 初始化变量
         self.cap = None
+        self.camera_capture = None
+        self.camera_worker = None
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_frame)
         self.current_frame = None
         self.processed_frame = None
-        self.replacement_images = []
+        self.replacement_pool = ReplacementImagePool()
         self.pixel_size = 16
         self.mode = "replace"  # 'replace' or 'pixelate'
         self.fps = 0
@@ -46,9 +777,8 @@ class FaceProcessingApp(QMainWindow):
         self.last_time = cv2.getTickCount()
         self.face_count = 0
         
-        # 初始化跟踪变量
-        self.tracked_faces = []
-        self.face_to_image_map = {}
+        # 初始化跟踪器
+        self.face_tracker = FaceTracker()
         
         # 添加新的变量
         self.source_type = "camera"  # 'camera', 'image', 'video'
@@ -333,6 +1063,12 @@ class FaceProcessingApp(QMainWindow):
     def change_mode(self, mode):
         self.mode = mode
         self.folder_path_input.setEnabled(mode == "replace")
+        self.push_effect_settings()
+    
+    def push_effect_settings(self):
+        """把当前模式和像素大小交给摄像头处理线程"""
+        if self.camera_worker is not None:
+            self.camera_worker.set_effect_settings(self.mode, self.pixel_size)
     
     def select_folder(self):
         folder_path = QFileDialog.getExistingDirectory(self, "选择替换图片文件夹")
@@ -341,20 +1077,11 @@ class FaceProcessingApp(QMainWindow):
             self.load_replacement_images(folder_path)
     
     def load_replacement_images(self, folder_path):
-        self.replacement_images = []
-        valid_extensions = ['.jpg', '.jpeg', '.png', '.bmp']
-        
         try:
-            for filename in os.listdir(folder_path):
-                ext = os.path.splitext(filename.lower())[1]
-                if ext in valid_extensions:
-                    img_path = os.path.join(folder_path, filename)
-                    img = cv2.imread(img_path)
-                    if img is not None:
-                        self.replacement_images.append(img)
-            
-            if not self.replacement_images:
+            # 只扫描文件元数据，图片在使用时按需解码
+            if self.replacement_pool.scan(folder_path) == 0:
                 raise ValueError("没有找到有效的图片")
+            self.status_label.setText(f"找到 {len(self.replacement_pool)} 张替换图片")
                 
         except Exception as e:
             self.status_label.setText(f"错误: {str(e)}")
@@ -362,6 +1089,7 @@ class FaceProcessingApp(QMainWindow):
     def update_pixel_size(self, value):
         self.pixel_size = value
         self.pixel_value_label.setText(str(value))
+        self.push_effect_settings()
     
     def change_source(self, source_text):
         if source_text == "摄像头":
@@ -435,62 +1163,20 @@ class FaceProcessingApp(QMainWindow):
             return
             
         # 处理图片
-        frame_rgb = cv2.cvtColor(self.current_frame, cv2.COLOR_BGR2RGB)
-        results = self.face_detection.process(frame_rgb)
-        
         processed = self.current_frame.copy()
-        self.face_count = 0
-        
-        if results.detections:
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                h, w = processed.shape[:2]
-                
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
-                width = int(bbox.width * w)
-                height = int(bbox.height * h)
-                
-                # 扩大检测框
-                expand_ratio = 0.4
-                new_x = max(int(x - width * expand_ratio * 0.5), 0)
-                new_y = max(int(y - height * expand_ratio), 0)
-                new_w = min(int(width * (1 + expand_ratio)), w - new_x)
-                new_h = min(int(height * (1 + expand_ratio)), h - new_y)
-                
-                if new_w <= 0 or new_h <= 0:
-                    continue
-                
-                self.face_count += 1
-                
-                if self.mode == "replace" and self.replacement_images:
-                    # 随机选择替换图片
-                    replacement_image = random.choice(self.replacement_images)
-                    
-                    # 调整替换图片大小
-                    replacement_resized = cv2.resize(replacement_image, (new_w, new_h))
-                    
-                    # 创建圆角蒙版
-                    corner_radius = int(min(new_w, new_h) * 0.2)
-                    mask = self.create_rounded_mask(new_w, new_h, corner_radius)
-                    mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
-                    
-                    # 调整颜色
-                    replacement_resized = self.match_color_with_background(
-                        replacement_resized, processed, new_x, new_y, new_w, new_h
-                    )
-                    
-                    # 混合图像
-                    roi = processed[new_y:new_y + new_h, new_x:new_x + new_w]
-                    blended = cv2.convertScaleAbs(
-                        replacement_resized * mask_3channel + roi * (1 - mask_3channel)
-                    )
-                    processed[new_y:new_y + new_h, new_x:new_x + new_w] = blended
-                    
-                elif self.mode == "pixelate":
-                    processed = self.pixelate_region(
-                        processed, new_x, new_y, new_w, new_h, self.pixel_size
-                    )
+        face_boxes = detect_faces(self.face_detection, self.current_frame)
+        self.face_count = len(face_boxes)
+        
+        if self.mode == "pixelate":
+            pixelate_faces(processed, face_boxes, self.pixel_size)
+        elif len(self.replacement_pool):
+            for new_x, new_y, new_w, new_h in face_boxes:
+                # 随机选择替换图片
+                replacement_image = self.replacement_pool.get(
+                    self.replacement_pool.random_index(), new_w, new_h
+                )
+                if replacement_image is not None:
+                    blend_replacement(processed, replacement_image, new_x, new_y, new_w, new_h)
         
         self.processed_frame = processed
         self.display_image(self.processed_display, processed)
@@ -512,6 +1198,15 @@ class FaceProcessingApp(QMainWindow):
         if self.timer.isActive():
             self.timer.stop()
         
+        if self.camera_worker is not None:
+            self.camera_worker.stop()
+            self.camera_worker.wait()
+            self.camera_worker = None
+        
+        if self.camera_capture is not None:
+            self.camera_capture.stop()
+            self.camera_capture = None
+        
         if self.cap is not None:
             self.cap.release()
             self.cap = None
@@ -520,6 +1215,8 @@ class FaceProcessingApp(QMainWindow):
             self.video_writer.release()
             self.video_writer = None
         
+        self.face_tracker.reset()
+        
         if self.source_type == "camera":
             self.start_button.setText("启动摄像头")
         elif self.source_type == "video":
@@ -587,51 +1284,18 @@ class FaceProcessingApp(QMainWindow):
                 break
                 
             # 处理帧
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_detection.process(frame_rgb)
-            
-            processed = frame.copy()
-            if results.detections:
-                for detection in results.detections:
-                    bbox = detection.location_data.relative_bounding_box
-                    h, w = frame.shape[:2]
-                    
-                    x = int(bbox.xmin * w)
-                    y = int(bbox.ymin * h)
-                    width = int(bbox.width * w)
-                    height = int(bbox.height * h)
-                    
-                    expand_ratio = 0.4
-                    new_x = max(int(x - width * expand_ratio * 0.5), 0)
-                    new_y = max(int(y - height * expand_ratio), 0)
-                    new_w = min(int(width * (1 + expand_ratio)), w - new_x)
-                    new_h = min(int(height * (1 + expand_ratio)), h - new_y)
-                    
-                    if new_w <= 0 or new_h <= 0:
-                        continue
-                    
-                    if self.mode == "replace" and self.replacement_images:
-                        replacement_image = random.choice(self.replacement_images)
-                        replacement_resized = cv2.resize(replacement_image, (new_w, new_h))
-                        
-                        corner_radius = int(min(new_w, new_h) * 0.2)
-                        mask = self.create_rounded_mask(new_w, new_h, corner_radius)
-                        mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
-                        
-                        replacement_resized = self.match_color_with_background(
-                            replacement_resized, processed, new_x, new_y, new_w, new_h
-                        )
-                        
-                        roi = processed[new_y:new_y + new_h, new_x:new_x + new_w]
-                        blended = cv2.convertScaleAbs(
-                            replacement_resized * mask_3channel + roi * (1 - mask_3channel)
-                        )
-                        processed[new_y:new_y + new_h, new_x:new_x + new_w] = blended
-                        
-                    elif self.mode == "pixelate":
-                        processed = self.pixelate_region(
-                            processed, new_x, new_y, new_w, new_h, self.pixel_size
-                        )
+            # 处理结果直接写入解码帧，无需额外复制
+            processed = frame
+            face_boxes = detect_faces(self.face_detection, frame)
+            if self.mode == "pixelate":
+                pixelate_faces(processed, face_boxes, self.pixel_size)
+            elif len(self.replacement_pool):
+                for new_x, new_y, new_w, new_h in face_boxes:
+                    replacement_image = self.replacement_pool.get(
+                        self.replacement_pool.random_index(), new_w, new_h
+                    )
+                    if replacement_image is not None:
+                        blend_replacement(processed, replacement_image, new_x, new_y, new_w, new_h)
             
             self.video_writer.write(processed)
             frame_count += 1
@@ -653,125 +1317,26 @@ class FaceProcessingApp(QMainWindow):
             
         ret, frame = self.cap.read()
         if not ret:
-            if self.source_type == "video":
-                self.stop_processing()
-                return
-            else:
-                self.toggle_camera()
-                return
+            self.stop_processing()
+            return
         
-        # 更新进度（仅视频模式）
-        if self.source_type == "video":
-            self.current_frame_pos += 1
-            progress = (self.current_frame_pos / self.total_frames) * 100
-            self.progress_label.setText(f"进度: {progress:.1f}% ({self.current_frame_pos}/{self.total_frames})")
+        # 更新进度
+        self.current_frame_pos += 1
+        progress = (self.current_frame_pos / self.total_frames) * 100
+        self.progress_label.setText(f"进度: {progress:.1f}% ({self.current_frame_pos}/{self.total_frames})")
         
-        # 计算FPS
-        self.frame_count += 1
-        if self.frame_count >= 30:
-            current_time = cv2.getTickCount()
-            time_diff = (current_time - self.last_time) / cv2.getTickFrequency()
-            self.fps = self.frame_count / time_diff
-            self.frame_count = 0
-            self.last_time = current_time
+        self.update_fps()
         
         # 处理帧
         self.current_frame = frame
-        frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        results = self.face_detection.process(frame_rgb)
-        
         processed = frame.copy()
-        current_faces = []
-        self.face_count = 0
-        
-        if results.detections:
-            for detection in results.detections:
-                bbox = detection.location_data.relative_bounding_box
-                h, w = frame.shape[:2]
-                
-                x = int(bbox.xmin * w)
-                y = int(bbox.ymin * h)
-                width = int(bbox.width * w)
-                height = int(bbox.height * h)
-                
-                expand_ratio = 0.4
-                new_x = max(int(x - width * expand_ratio * 0.5), 0)
-                new_y = max(int(y - height * expand_ratio), 0)
-                new_w = min(int(width * (1 + expand_ratio)), w - new_x)
-                new_h = min(int(height * (1 + expand_ratio)), h - new_y)
-                
-                if new_w <= 0 or new_h <= 0:
-                    continue
-                    
-                current_faces.append((new_x, new_y, new_w, new_h))
-                self.face_count += 1
-        
-        # 处理检测到的人脸
-        matched_faces = []
-        unmatched_current_faces = list(range(len(current_faces)))
-        new_tracked_faces = []
-        
-        for i, (face_id, old_face_box) in enumerate(self.tracked_faces):
-            best_match = -1
-            best_iou = 0.3
-            
-            for j in unmatched_current_faces:
-                iou = self.calculate_iou(old_face_box, current_faces[j])
-                if iou > best_iou:
-                    best_iou = iou
-                    best_match = j
-            
-            if best_match >= 0:
-                matched_faces.append((face_id, best_match))
-                unmatched_current_faces.remove(best_match)
-                new_tracked_faces.append((face_id, current_faces[best_match]))
-        
-        for j in unmatched_current_faces:
-            new_face_id = len(self.face_to_image_map) + 1
-            if new_face_id not in self.face_to_image_map and self.replacement_images:
-                self.face_to_image_map[new_face_id] = random.randint(0, len(self.replacement_images) - 1)
-            new_tracked_faces.append((new_face_id, current_faces[j]))
-        
-        self.tracked_faces = new_tracked_faces
-        
-        # 应用处理效果
-        for face_id, (new_x, new_y, new_w, new_h) in self.tracked_faces:
-            if self.mode == "replace" and self.replacement_images:
-                if face_id not in self.face_to_image_map:
-                    self.face_to_image_map[face_id] = random.randint(0, len(self.replacement_images) - 1)
-                
-                replacement_idx = self.face_to_image_map[face_id]
-                replacement_image = self.replacement_images[replacement_idx % len(self.replacement_images)]
-                
-                replacement_resized = cv2.resize(replacement_image, (new_w, new_h))
-                
-                corner_radius = int(min(new_w, new_h) * 0.2)
-                mask = self.create_rounded_mask(new_w, new_h, corner_radius)
-                mask_3channel = cv2.cvtColor(mask, cv2.COLOR_GRAY2BGR) / 255.0
-                
-                replacement_resized = self.match_color_with_background(
-                    replacement_resized, processed, new_x, new_y, new_w, new_h
-                )
-                
-                roi = processed[new_y:new_y + new_h, new_x:new_x + new_w]
-                blended = cv2.convertScaleAbs(
-                    replacement_resized * mask_3channel + roi * (1 - mask_3channel)
-                )
-                processed[new_y:new_y + new_h, new_x:new_x + new_w] = blended
-                
-            elif self.mode == "pixelate":
-                processed = self.pixelate_region(
-                    processed, new_x, new_y, new_w, new_h, self.pixel_size
-                )
+        current_faces = detect_faces(self.face_detection, frame)
+        self.face_count = len(current_faces)
+        self.apply_face_effects(processed, current_faces)
         
         # 更新状态信息
-        status_text = f"FPS: {self.fps:.1f} | 检测到的人脸数: {self.face_count} | "
-        status_text += f"模式: {'人脸替换' if self.mode == 'replace' else '人脸像素化'} | "
-        status_text += f"像素大小: {self.pixel_size}"
-        
-        if self.source_type == "video":
-            status_text += f" | 帧: {self.current_frame_pos}/{self.total_frames}"
-        
+        status_text = self.build_status_text()
+        status_text += f" | 帧: {self.current_frame_pos}/{self.total_frames}"
         self.status_label.setText(status_text)
         
         # 显示图像
@@ -779,6 +1344,51 @@ class FaceProcessingApp(QMainWindow):
         self.display_image(self.processed_display, processed)
         self.processed_frame = processed
     
+    def on_camera_frame(self, frame, processed, capture_time, face_count, seq):
+        """接收处理线程的结果并显示，统计从采集到显示的端到端延迟"""
+        if self.camera_worker is None:
+            return
+        
+        self.update_fps()
+        self.face_count = face_count
+        self.current_frame = frame
+        self.processed_frame = processed
+        
+        self.display_image(self.original_display, frame)
+        self.display_image(self.processed_display, processed)
+        latency_ms = (time.monotonic() - capture_time) * 1000
+        
+        status_text = self.build_status_text()
+        status_text += f" | 延迟: {latency_ms:.0f} ms"
+        status_text += f" | 丢帧: {self.camera_capture.dropped_frames + self.camera_worker.skipped_results}"
+        self.status_label.setText(status_text)
+        
+        self.camera_worker.mark_shown(seq)
+    
+    def on_camera_error(self, message):
+        self.stop_processing()
+        self.status_label.setText(f"错误: {message}")
+    
+    def apply_face_effects(self, processed, current_faces):
+        """界面线程（视频文件处理）使用窗口自己的跟踪器和当前设置"""
+        return apply_face_effects(processed, current_faces, self.face_tracker,
+                                  self.replacement_pool, self.mode, self.pixel_size)
+    
+    def update_fps(self):
+        self.frame_count += 1
+        if self.frame_count >= 30:
+            current_time = cv2.getTickCount()
+            time_diff = (current_time - self.last_time) / cv2.getTickFrequency()
+            self.fps = self.frame_count / time_diff
+            self.frame_count = 0
+            self.last_time = current_time
+    
+    def build_status_text(self):
+        status_text = f"FPS: {self.fps:.1f} | 检测到的人脸数: {self.face_count} | "
+        status_text += f"模式: {'人脸替换' if self.mode == 'replace' else '人脸像素化'} | "
+        status_text += f"像素大小: {self.pixel_size}"
+        return status_text
+    
     def display_image(self, label, image):
         if image is None:
             return
@@ -793,81 +1403,58 @@ class FaceProcessingApp(QMainWindow):
         label.setPixmap(scaled_pixmap)
 
     def toggle_camera(self):
-        if self.cap is None or not self.cap.isOpened():
+        if self.camera_worker is None:
             try:
-                self.cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)  # 使用DirectShow后端
-                if not self.cap.isOpened():
-                    raise Exception("无法打开摄像头")
-                    
-                self.start_button.setText("停止摄像头")
-                self.timer.start(33)  # ~30fps
+                # 使用默认后端，由OpenCV根据平台自动选择
+                self.camera_capture = LatestFrameCapture(0)
+                self.camera_capture.start()
+                
+                self.camera_worker = FrameProcessingWorker(self.camera_capture, self.replacement_pool,
+                                                           self.mode, self.pixel_size)
+                self.camera_worker.frame_ready.connect(self.on_camera_frame)
+                self.camera_worker.error.connect(self.on_camera_error)
+                self.face_tracker.reset()
                 self.frame_count = 0
                 self.last_time = cv2.getTickCount()
+                self.camera_worker.start()
+                
+                self.start_button.setText("停止摄像头")
                 self.status_label.setText("摄像头已启动")
             except Exception as e:
                 QMessageBox.warning(self, "错误", f"摄像头启动失败: {str(e)}")
-                self.cap = None
+                self.camera_capture = None
         else:
             self.stop_processing()
             self.start_button.setText("启动摄像头")
             self.status_label.setText("摄像头已停止")
-
-    def calculate_iou(self, box1, box2):
-        """计算两个边界框的IoU（交并比）"""
-        x1, y1, w1, h1 = box1
-        x2, y2, w2, h2 = box2
-        
-        # 计算交集区域
-        xx1 = max(x1, x2)
-        yy1 = max(y1, y2)
-        xx2 = min(x1 + w1, x2 + w2)
-        yy2 = min(y1 + h1, y2 + h2)
-        
-        # 计算交集面积
-        intersection_area = max(0, xx2 - xx1) * max(0, yy2 - yy1)
-        
-        # 计算并集面积
-        box1_area = w1 * h1
-        box2_area = w2 * h2
-        union_area = box1_area + box2_area - intersection_area
-        
-        if union_area == 0:
-            return 0
-        
-        return intersection_area / union_area
-    
-    def pixelate_region(self, image, x, y, w, h, pixel_size):
-        """对指定区域进行像素化处理"""
-        region = image[y:y+h, x:x+w]
-        temp = cv2.resize(region, (w // pixel_size, h // pixel_size), interpolation=cv2.INTER_LINEAR)
-        pixelated = cv2.resize(temp, (w, h), interpolation=cv2.INTER_NEAREST)
-        result = image.copy()
-        result[y:y+h, x:x+w] = pixelated
-        return result
     
-    def create_rounded_mask(self, width, height, radius):
-        """创建圆角蒙版"""
-        mask = np.zeros((height, width), dtype=np.uint8)
-        cv2.rectangle(mask, (radius, 0), (width-radius, height), 255, -1)
-        cv2.rectangle(mask, (0, radius), (width, height-radius), 255, -1)
-        cv2.circle(mask, (radius, radius), radius, 255, -1)
-        cv2.circle(mask, (width-radius, radius), radius, 255, -1)
-        cv2.circle(mask, (radius, height-radius), radius, 255, -1)
-        cv2.circle(mask, (width-radius, height-radius), radius, 255, -1)
-        return mask
-    
-    def match_color_with_background(self, replacement_img, background_img, x, y, w, h):
-        """调整替换图片的颜色以匹配背景"""
-        background_region = background_img[max(0, y-10):min(background_img.shape[0], y+h+10),
-                                        max(0, x-10):min(background_img.shape[1], x+w+10)]
-        background_mean = np.mean(background_region, axis=(0, 1))
-        replacement_mean = np.mean(replacement_img, axis=(0, 1))
-        color_diff = background_mean - replacement_mean
-        adjusted_img = replacement_img.astype(np.float32)
-        adjusted_img += color_diff * 0.3
-        return np.clip(adjusted_img, 0, 255).astype(np.uint8)
+    def closeEvent(self, event):
+        self.stop_processing()
+        super().closeEvent(event)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="人脸处理工具")
+    parser.add_argument("--batch", nargs=2, metavar=("INPUT_DIR", "OUTPUT_DIR"),
+                        help="批量处理目录树中的所有图片（不启动界面）")
+    parser.add_argument("--mode", choices=["replace", "pixelate"], default="pixelate",
+                        help="处理模式：人脸替换或人脸像素化")
+    parser.add_argument("--replace-folder", help="替换图片文件夹（替换模式必需）")
+    parser.add_argument("--pixel-size", type=int, default=16, help="像素块大小")
+    parser.add_argument("--workers", type=int, default=None, help="检测进程数，默认为CPU核数")
+    parser.add_argument("--decode-threads", type=int, default=4, help="每个进程的解码线程数")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.batch:
+        input_dir, output_dir = args.batch
+        stats = run_batch(input_dir, output_dir, mode=args.mode,
+                          replacement_folder=args.replace_folder,
+                          pixel_size=args.pixel_size, workers=args.workers,
+                          decode_threads=args.decode_threads)
+        print_batch_report(stats)
+        return
+    
     app = QApplication([])
     window = FaceProcessingApp()
     window.show()
@@ -1,13 +1,798 @@
 import cv2
 import os
 import sys
+import time
+import queue
+import threading
+import argparse
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import numpy as np
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QPushButton, QFileDialog, QSlider, QStackedWidget, 
-                             QFrame, QSplitter)
-from PySide6.QtCore import Qt, QTimer, Signal, Slot, QSize
+                             QFrame, QSplitter, QComboBox, QSpinBox, QRubberBand)
+from PySide6.QtCore import Qt, QTimer, Signal, Slot, QSize, QThread, QRect
 from PySide6.QtGui import QImage, QPixmap, QIcon, QColor, QPalette, QFont, QFontDatabase
 
+# ==================== 像素化引擎 ====================
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp')
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.mov')
+
+
+def pixel_grid_size(width, height, pixel_size):
+    """计算像素化后的网格尺寸（块数）"""
+    return max(1, width // pixel_size), max(1, height // pixel_size)
+
+
+def pixelate_to_grid(frame, grid_w, grid_h):
+    """将图像缩小到 grid_w x grid_h 个块，再放大回原尺寸"""
+    h, w = frame.shape[:2]
+    temp = cv2.resize(frame, (grid_w, grid_h), interpolation=cv2.INTER_LINEAR)
+    return cv2.resize(temp, (w, h), interpolation=cv2.INTER_NEAREST)
+
+
+def pixelate_frame(frame, pixel_size):
+    """对图像进行像素化处理"""
+    if frame is None:
+        return None
+    
+    h, w = frame.shape[:2]
+    return pixelate_to_grid(frame, *pixel_grid_size(w, h, pixel_size))
+
+
+# ==================== 调色板与抖动风格化 ====================
+
+STYLES = {
+    "mosaic": "马赛克",
+    "palette": "调色板量化",
+    "bayer": "Bayer有序抖动",
+    "diffusion": "误差扩散抖动",
+}
+PALETTE_METHODS = ("kmeans", "median_cut")
+
+# 4x4 Bayer阈值矩阵，归一化到 [-0.5, 0.5)
+BAYER_4X4 = (np.array([[0, 8, 2, 10],
+                       [12, 4, 14, 6],
+                       [3, 11, 1, 9],
+                       [15, 7, 13, 5]], dtype=np.float32) + 0.5) / 16.0 - 0.5
+
+
+def kmeans_palette(pixels, n_colors):
+    """用k-means从 (N, 3) 像素中提取调色板"""
+    data = pixels.astype(np.float32)
+    k = min(n_colors, len(data))
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 10, 1.0)
+    _, _, centers = cv2.kmeans(data, k, None, criteria, 1, cv2.KMEANS_PP_CENTERS)
+    return np.clip(np.round(centers), 0, 255).astype(np.uint8)
+
+
+def median_cut_palette(pixels, n_colors):
+    """用中位切分从 (N, 3) 像素中提取调色板"""
+    boxes = [pixels]
+    while len(boxes) < n_colors:
+        # 选择颜色范围最大的盒子，沿范围最大的通道在中位数处切分
+        ranges = [np.ptp(box, axis=0).max() if len(box) > 1 else -1 for box in boxes]
+        index = int(np.argmax(ranges))
+        if ranges[index] <= 0:
+            break
+        box = boxes[index]
+        channel = int(np.ptp(box, axis=0).argmax())
+        box = box[box[:, channel].argsort(kind="stable")]
+        middle = len(box) // 2
+        boxes[index:index + 1] = [box[:middle], box[middle:]]
+    return np.array([np.round(box.mean(axis=0)) for box in boxes], dtype=np.uint8)
+
+
+def extract_palette(image, n_colors, method="kmeans", max_samples=4096):
+    """从图像中提取 n_colors 个颜色的调色板，像素过多时固定随机抽样"""
+    pixels = image.reshape(-1, 3)
+    if len(pixels) > max_samples:
+        rng = np.random.default_rng(0)
+        pixels = pixels[rng.choice(len(pixels), max_samples, replace=False)]
+    if method == "median_cut":
+        return median_cut_palette(pixels, n_colors)
+    return kmeans_palette(pixels, n_colors)
+
+
+def nearest_palette_indices(pixels, palette):
+    """返回 (N, 3) 像素在调色板中最近颜色的索引"""
+    palette_f = palette.astype(np.float32)
+    pixels_f = pixels.astype(np.float32)
+    # |p - c|^2 = |p|^2 - 2 p·c + |c|^2，|p|^2 对argmin无影响
+    distances = (palette_f ** 2).sum(axis=1)[None, :] - 2.0 * pixels_f @ palette_f.T
+    return distances.argmin(axis=1)
+
+
+def quantize_to_palette(image, palette):
+    """将图像的每个像素映射到调色板中最近的颜色"""
+    indices = nearest_palette_indices(image.reshape(-1, 3), palette)
+    return palette[indices].reshape(image.shape)
+
+
+def palette_spread(palette):
+    """调色板中相邻颜色的典型间距，用作有序抖动的幅度"""
+    if len(palette) < 2:
+        return 32.0
+    palette_f = palette.astype(np.float32)
+    distances = np.sqrt(((palette_f[:, None, :] - palette_f[None, :, :]) ** 2).sum(axis=2))
+    np.fill_diagonal(distances, np.inf)
+    return float(np.median(distances.min(axis=1)))
+
+
+def bayer_dither(image, palette):
+    """Bayer有序抖动：按位置加上阈值偏移后量化到调色板"""
+    h, w = image.shape[:2]
+    threshold = np.tile(BAYER_4X4, ((h + 3) // 4, (w + 3) // 4))[:h, :w, None]
+    shifted = np.clip(image.astype(np.float32) + threshold * palette_spread(palette), 0, 255)
+    return quantize_to_palette(shifted, palette)
+
+
+def error_diffusion_dither(image, palette):
+    """
+    Floyd-Steinberg误差扩散抖动。
+    像素 (y, x) 只依赖 2y+x 更小的像素，因此沿 t = 2y+x 的波前整批向量化处理。
+    """
+    h, w = image.shape[:2]
+    work = image.astype(np.float32)
+    palette_f = palette.astype(np.float32)
+    indices = np.zeros((h, w), dtype=np.intp)
+    
+    for t in range(2 * (h - 1) + w):
+        ys = np.arange(max(0, (t - w + 2) // 2), min(h - 1, t // 2) + 1)
+        xs = t - 2 * ys
+        chosen = nearest_palette_indices(work[ys, xs], palette)
+        indices[ys, xs] = chosen
+        error = work[ys, xs] - palette_f[chosen]
+        
+        right = xs + 1 < w
+        work[ys[right], xs[right] + 1] += error[right] * (7 / 16)
+        below = ys + 1 < h
+        down_left = below & (xs > 0)
+        work[ys[down_left] + 1, xs[down_left] - 1] += error[down_left] * (3 / 16)
+        work[ys[below] + 1, xs[below]] += error[below] * (5 / 16)
+        down_right = below & right
+        work[ys[down_right] + 1, xs[down_right] + 1] += error[down_right] * (1 / 16)
+    
+    return palette[indices]
+
+
+class Stylizer:
+    """
+    像素风格化器：所有风格都在缩小后的网格上计算，开销与块数成正比而不是像素数。
+    调色板在视频帧之间缓存，每隔 palette_refresh 帧重新提取一次。
+    界面线程修改参数与视频线程处理帧可能同时发生，参数和调色板的读写都在锁内进行。
+    """
+    def __init__(self, style="mosaic", n_colors=16, palette_method="kmeans", palette_refresh=60):
+        self.style = style
+        self.n_colors = n_colors
+        self.palette_method = palette_method
+        self.palette_refresh = palette_refresh
+        self.palette = None
+        self._frames_since_palette = 0
+        self._lock = threading.Lock()
+    
+    def configure(self, style=None, n_colors=None, palette_method=None):
+        """修改风格参数，颜色数或提取方法变化时清空调色板缓存"""
+        with self._lock:
+            if style is not None:
+                self.style = style
+            if n_colors is not None and n_colors != self.n_colors:
+                self.n_colors = n_colors
+                self._clear_palette()
+            if palette_method is not None and palette_method != self.palette_method:
+                self.palette_method = palette_method
+                self._clear_palette()
+    
+    def reset_palette(self):
+        with self._lock:
+            self._clear_palette()
+    
+    def _clear_palette(self):
+        self.palette = None
+        self._frames_since_palette = 0
+    
+    def stylize_grid(self, grid):
+        """对网格分辨率的图像应用当前风格"""
+        # 在锁内取出本帧使用的风格和调色板，抖动计算只用局部变量，不受并发修改影响
+        with self._lock:
+            style = self.style
+            if style == "mosaic":
+                return grid
+            if self.palette is None or (self.palette_refresh and self._frames_since_palette >= self.palette_refresh):
+                self.palette = extract_palette(grid, self.n_colors, self.palette_method)
+                self._frames_since_palette = 0
+            self._frames_since_palette += 1
+            palette = self.palette
+        
+        if style == "bayer":
+            return bayer_dither(grid, palette)
+        if style == "diffusion":
+            return error_diffusion_dither(grid, palette)
+        return quantize_to_palette(grid, palette)
+    
+    def apply_to_grid(self, frame, grid_w, grid_h):
+        """缩小到 grid_w x grid_h，风格化后再放大回原尺寸"""
+        h, w = frame.shape[:2]
+        grid = cv2.resize(frame, (grid_w, grid_h), interpolation=cv2.INTER_LINEAR)
+        return cv2.resize(self.stylize_grid(grid), (w, h), interpolation=cv2.INTER_NEAREST)
+    
+    def apply(self, frame, pixel_size):
+        if frame is None:
+            return None
+        h, w = frame.shape[:2]
+        return self.apply_to_grid(frame, *pixel_grid_size(w, h, pixel_size))
+
+
+def read_image(path):
+    """读取图片（支持中文路径），失败时返回None"""
+    return cv2.imdecode(np.fromfile(path, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def write_image(path, image):
+    """写出图片（支持中文路径），返回是否成功"""
+    ok, buffer = cv2.imencode(os.path.splitext(path)[1], image)
+    if ok:
+        buffer.tofile(path)
+    return ok
+
+
+# ==================== 分块处理与区域像素化 ====================
+
+def pixelate_aligned(tile, pixel_size):
+    """以tile左上角为网格原点，用每个块的精确均值像素化（边缘不完整的块同样取均值）"""
+    h, w = tile.shape[:2]
+    row_starts = np.arange(0, h, pixel_size)
+    col_starts = np.arange(0, w, pixel_size)
+    sums = np.add.reduceat(np.add.reduceat(tile, row_starts, axis=0, dtype=np.uint32),
+                           col_starts, axis=1)
+    counts = (np.diff(np.append(row_starts, h))[:, None] * np.diff(np.append(col_starts, w))[None, :])
+    means = (sums / counts[:, :, None] + 0.5).astype(tile.dtype)
+    return np.repeat(np.repeat(means, pixel_size, axis=0)[:h], pixel_size, axis=1)[:, :w]
+
+
+def pixelate_regions(tile, tile_y, regions, pixel_size):
+    """
+    原地像素化tile中与regions相交的部分。tile_y为tile在整图中的起始行（必须是块大小的整数倍），
+    块边界对齐到整图网格，因此相邻tile之间没有接缝。regions为整图坐标的 (x, y, w, h) 列表。
+    """
+    h, w = tile.shape[:2]
+    for rx, ry, rw, rh in regions:
+        # 区域与tile的交集（整图坐标）
+        x0, x1 = max(0, rx), min(w, rx + rw)
+        y0, y1 = max(tile_y, ry), min(tile_y + h, ry + rh)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        # 扩展到块边界后计算，只写回区域内的像素
+        ax0 = x0 // pixel_size * pixel_size
+        ax1 = min(w, -(-x1 // pixel_size) * pixel_size)
+        ay0 = y0 // pixel_size * pixel_size
+        ay1 = min(tile_y + h, -(-y1 // pixel_size) * pixel_size)
+        block = pixelate_aligned(tile[ay0 - tile_y:ay1 - tile_y, ax0:ax1], pixel_size)
+        tile[y0 - tile_y:y1 - tile_y, x0:x1] = block[y0 - ay0:y1 - ay0, x0 - ax0:x1 - ax0]
+    return tile
+
+
+def composite_regions(base, styled, regions, scale=1.0):
+    """将styled中regions（按scale缩放后）内的像素复制到base的副本上"""
+    result = base.copy()
+    h, w = base.shape[:2]
+    for rx, ry, rw, rh in regions:
+        x0, y0 = max(0, int(rx * scale)), max(0, int(ry * scale))
+        x1, y1 = min(w, int(round((rx + rw) * scale))), min(h, int(round((ry + rh) * scale)))
+        if x0 < x1 and y0 < y1:
+            result[y0:y1, x0:x1] = styled[y0:y1, x0:x1]
+    return result
+
+
+def _read_ppm_header(f):
+    """解析二进制PPM(P6)文件头，返回 (宽, 高, 数据偏移)"""
+    tokens = []
+    while len(tokens) < 4:
+        line = f.readline()
+        if not line:
+            raise ValueError("PPM文件头不完整")
+        tokens.extend(line.split(b"#")[0].split())
+    if tokens[0] != b"P6" or int(tokens[3]) != 255:
+        raise ValueError("仅支持8位二进制PPM(P6)")
+    return int(tokens[1]), int(tokens[2]), f.tell()
+
+
+class StripReader:
+    """
+    按行条带读取图像。未压缩的BMP、二进制PPM和.npy通过内存映射只读取需要的行，
+    其他格式（JPEG/PNG等）无法按行解码，退化为整图解码。
+    """
+    def __init__(self, path):
+        self.path = path
+        self.memory_mapped = True
+        self._bmp = False
+        self._bottom_up = False
+        self._rgb = False
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npy":
+            self._data = np.load(path, mmap_mode="r")
+            self.height, self.width = self._data.shape[:2]
+        elif ext == ".bmp" and self._open_bmp():
+            pass
+        elif ext in (".ppm", ".pnm"):
+            with open(path, "rb") as f:
+                self.width, self.height, offset = _read_ppm_header(f)
+            self._data = np.memmap(path, dtype=np.uint8, mode="r", offset=offset,
+                                   shape=(self.height, self.width, 3))
+            self._rgb = True
+        else:
+            self.memory_mapped = False
+            self._data = read_image(path)
+            if self._data is None:
+                raise ValueError(f"无法读取图片: {path}")
+            self.height, self.width = self._data.shape[:2]
+    
+    def _open_bmp(self):
+        """只有24位未压缩BMP可以内存映射"""
+        with open(self.path, "rb") as f:
+            header = f.read(34)
+        offset = int.from_bytes(header[10:14], "little")
+        width = int.from_bytes(header[18:22], "little", signed=True)
+        height = int.from_bytes(header[22:26], "little", signed=True)
+        bit_count = int.from_bytes(header[28:30], "little")
+        compression = int.from_bytes(header[30:34], "little")
+        if bit_count != 24 or compression != 0:
+            return False
+        self.width, self.height = width, abs(height)
+        self._bmp = True
+        self._bottom_up = height > 0  # 高度为负表示自上而下存储
+        stride = (width * 3 + 3) // 4 * 4
+        self._data = np.memmap(self.path, dtype=np.uint8, mode="r", offset=offset,
+                               shape=(self.height, stride))
+        return True
+    
+    def read(self, y0, y1):
+        """读取第 y0 到 y1 行，返回BGR的 (y1-y0, 宽, 3) 数组副本"""
+        if self._bottom_up:
+            rows = self._data[self.height - y1:self.height - y0][::-1, :self.width * 3]
+            return np.array(rows).reshape(y1 - y0, self.width, 3)
+        if self._bmp:
+            # 自上而下的BMP：行顺序不变，但仍要去掉每行末尾的4字节对齐填充
+            return np.array(self._data[y0:y1, :self.width * 3]).reshape(y1 - y0, self.width, 3)
+        strip = np.array(self._data[y0:y1])
+        if self._rgb:
+            strip = np.ascontiguousarray(strip[..., ::-1])
+        return strip
+    
+    def close(self):
+        self._data = None
+
+
+class StripWriter:
+    """
+    按行条带写出图像。BMP、PPM和.npy输出通过内存映射直接写入文件，
+    其他格式需要在内存中拼接整图后统一编码。
+    """
+    def __init__(self, path, width, height):
+        self.path = path
+        self.width = width
+        self.height = height
+        self.memory_mapped = True
+        self._bottom_up = False
+        self._rgb = False
+        ext = os.path.splitext(path)[1].lower()
+        if ext == ".npy":
+            self._data = np.lib.format.open_memmap(path, mode="w+", dtype=np.uint8, shape=(height, width, 3))
+        elif ext == ".bmp":
+            stride = (width * 3 + 3) // 4 * 4
+            offset = 54
+            with open(path, "wb") as f:
+                f.write(b"BM" + (offset + stride * height).to_bytes(4, "little") + bytes(4)
+                        + offset.to_bytes(4, "little"))
+                f.write((40).to_bytes(4, "little") + width.to_bytes(4, "little", signed=True)
+                        + height.to_bytes(4, "little", signed=True) + (1).to_bytes(2, "little")
+                        + (24).to_bytes(2, "little") + bytes(24))
+            self._data = np.memmap(path, dtype=np.uint8, mode="r+", offset=offset, shape=(height, stride))
+            self._bottom_up = True
+        elif ext in (".ppm", ".pnm"):
+            header = f"P6\n{width} {height}\n255\n".encode("ascii")
+            with open(path, "wb") as f:
+                f.write(header)
+            self._data = np.memmap(path, dtype=np.uint8, mode="r+", offset=len(header),
+                                   shape=(height, width, 3))
+            self._rgb = True
+        else:
+            self.memory_mapped = False
+            self._data = np.empty((height, width, 3), dtype=np.uint8)
+    
+    def write(self, y0, strip):
+        y1 = y0 + strip.shape[0]
+        if self._bottom_up:
+            self._data[self.height - y1:self.height - y0, :self.width * 3] = strip[::-1].reshape(y1 - y0, -1)
+        elif self._rgb:
+            self._data[y0:y1] = strip[..., ::-1]
+        else:
+            self._data[y0:y1] = strip
+    
+    def close(self):
+        if self.memory_mapped:
+            self._data.flush()
+        elif not write_image(self.path, self._data):
+            raise ValueError(f"无法写出图片: {self.path}")
+        self._data = None
+
+
+def parse_regions(text):
+    """解析 "x,y,w,h;x,y,w,h" 格式的区域列表"""
+    regions = []
+    for item in text.split(";"):
+        if item.strip():
+            x, y, w, h = (int(v) for v in item.split(","))
+            regions.append((x, y, w, h))
+    return regions
+
+
+def pixelate_tiled(src_path, dst_path, pixel_size, regions=None, tile_rows=1024):
+    """
+    分块像素化超大图像，regions为None时处理整图。
+    条带高度对齐到块大小，每次只有一个条带在内存中（内存映射格式下峰值内存由条带大小决定）。
+    返回 (宽, 高, 是否全程内存映射)。
+    """
+    reader = StripReader(src_path)
+    writer = StripWriter(dst_path, reader.width, reader.height)
+    if regions is None:
+        regions = [(0, 0, reader.width, reader.height)]
+    strip_rows = max(pixel_size, tile_rows // pixel_size * pixel_size)
+    try:
+        for y0 in range(0, reader.height, strip_rows):
+            y1 = min(reader.height, y0 + strip_rows)
+            tile = reader.read(y0, y1)
+            writer.write(y0, pixelate_regions(tile, y0, regions, pixel_size))
+    finally:
+        writer.close()
+        reader.close()
+    return reader.width, reader.height, reader.memory_mapped and writer.memory_mapped
+
+
+def run_tiled(input_path, output_path, pixel_size=16, regions=None, tile_rows=1024):
+    """执行分块处理并打印吞吐量和峰值内存"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    width, height, streamed = pixelate_tiled(input_path, output_path, pixel_size, regions, tile_rows)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    
+    megapixels = width * height / 1e6
+    print(f"{width}x{height} ({megapixels:.1f} MP) | 耗时: {elapsed:.2f} 秒 | {megapixels / elapsed:.1f} MP/秒")
+    print(f"峰值内存: {peak / 1024 / 1024:.1f} MB | 内存映射: {'是' if streamed else '否（格式不支持按行读写）'}")
+
+
+# ==================== 命令行批量处理 ====================
+
+_QUEUE_END = object()  # 队列结束标记
+
+
+def pixelate_image_file(src_path, dst_path, pixel_size, stylizer=None):
+    """像素化单张图片，返回处理的帧数"""
+    stylizer = stylizer or Stylizer()
+    image = read_image(src_path)
+    if image is None:
+        raise ValueError(f"无法读取图片: {src_path}")
+    if not write_image(dst_path, stylizer.apply(image, pixel_size)):
+        raise ValueError(f"无法写出图片: {dst_path}")
+    return 1
+
+
+def pixelate_video_file(src_path, dst_path, pixel_size, codec="mp4v", queue_size=32, stylizer=None):
+    """
+    像素化视频文件，返回处理的帧数。
+    解码、像素化、编码分别在三个线程中进行，帧通过有界队列传递，内存占用与视频长度无关。
+    """
+    stylizer = stylizer or Stylizer()
+    cap = cv2.VideoCapture(src_path)
+    if not cap.isOpened():
+        raise ValueError(f"无法打开视频: {src_path}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    writer = cv2.VideoWriter(dst_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+    if not writer.isOpened():
+        cap.release()
+        raise ValueError(f"无法创建视频写入器（编码: {codec}）: {dst_path}")
+    
+    decoded = queue.Queue(maxsize=queue_size)
+    pixelated = queue.Queue(maxsize=queue_size)
+    stop_event = threading.Event()
+    
+    frame_count = 0
+    errors = []
+    
+    def put(q, item):
+        # 任一线程出错停止时不再阻塞
+        while not stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def get(q):
+        # 停止后结束标记可能永远不会到达，超时检查停止标志，停止时视为结束
+        while not stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _QUEUE_END
+    
+    def read_frames():
+        try:
+            while not stop_event.is_set():
+                ret, frame = cap.read()
+                if not ret or not put(decoded, frame):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+        finally:
+            put(decoded, _QUEUE_END)
+    
+    def write_frames():
+        nonlocal frame_count
+        try:
+            while True:
+                frame = get(pixelated)
+                if frame is _QUEUE_END:
+                    break
+                writer.write(frame)
+                frame_count += 1
+        except Exception as e:
+            errors.append(e)
+            stop_event.set()
+    
+    reader = threading.Thread(target=read_frames, daemon=True)
+    encoder = threading.Thread(target=write_frames, daemon=True)
+    reader.start()
+    encoder.start()
+    try:
+        while True:
+            frame = get(decoded)
+            if frame is _QUEUE_END:
+                break
+            if not put(pixelated, stylizer.apply(frame, pixel_size)):
+                break
+    finally:
+        put(pixelated, _QUEUE_END)
+        encoder.join()
+        stop_event.set()
+        reader.join()
+        cap.release()
+        writer.release()
+    
+    if errors:
+        raise errors[0]
+    return frame_count
+
+
+def _pixelate_media_file(src_path, dst_path, pixel_size, codec, queue_size, style_options):
+    """工作进程：处理单个图片或视频文件，返回 (帧数, 耗时)"""
+    start = time.perf_counter()
+    dst_dir = os.path.dirname(dst_path)
+    if dst_dir:
+        os.makedirs(dst_dir, exist_ok=True)
+    stylizer = Stylizer(**style_options)
+    if src_path.lower().endswith(VIDEO_EXTENSIONS):
+        frames = pixelate_video_file(src_path, dst_path, pixel_size, codec, queue_size, stylizer)
+    else:
+        frames = pixelate_image_file(src_path, dst_path, pixel_size, stylizer)
+    return frames, time.perf_counter() - start
+
+
+def collect_media_tasks(input_path, output_path):
+    """收集待处理的 (源路径, 输出路径) 列表，输入为目录时保持目录结构"""
+    if os.path.isfile(input_path):
+        return [(input_path, output_path)]
+    if not os.path.isdir(input_path):
+        raise FileNotFoundError(f"输入路径不存在: {input_path}")
+    
+    tasks = []
+    for root, dirs, files in os.walk(input_path):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(IMAGE_EXTENSIONS + VIDEO_EXTENSIONS):
+                src_path = os.path.join(root, filename)
+                tasks.append((src_path, os.path.join(output_path, os.path.relpath(src_path, input_path))))
+    return tasks
+
+
+def run_batch(input_path, output_path, pixel_size=16, workers=None, codec="mp4v", queue_size=32,
+              style="mosaic", n_colors=16, palette_method="kmeans"):
+    """用进程池批量像素化图片和视频文件，打印吞吐量（帧/秒），返回总帧数"""
+    if style not in STYLES:
+        raise ValueError(f"无效的风格: {style}. 可选风格: {list(STYLES)}")
+    style_options = {"style": style, "n_colors": n_colors, "palette_method": palette_method}
+    tasks = collect_media_tasks(input_path, output_path)
+    print(f"共 {len(tasks)} 个文件待处理")
+    
+    total_frames = 0
+    failed = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(_pixelate_media_file, src, dst, pixel_size, codec, queue_size, style_options): src
+            for src, dst in tasks
+        }
+        for index, future in enumerate(as_completed(futures), 1):
+            src_path = futures[future]
+            try:
+                frames, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"[{index}/{len(tasks)}] 处理失败: {src_path} ({e})")
+                continue
+            total_frames += frames
+            file_fps = frames / seconds if seconds > 0 else 0.0
+            print(f"[{index}/{len(tasks)}] {src_path} | {frames} 帧 | {file_fps:.1f} 帧/秒")
+    
+    elapsed = time.perf_counter() - start
+    throughput = total_frames / elapsed if elapsed > 0 else 0.0
+    print(f"完成: {len(tasks) - failed} 个文件 | 失败: {failed} 个 | 共 {total_frames} 帧")
+    print(f"总耗时: {elapsed:.2f} 秒 | 吞吐量: {throughput:.1f} 帧/秒")
+    return total_frames
+
+
+# ==================== 视频/摄像头工作线程 ====================
+
+def fit_to_size(image, width, height):
+    """按比例缩放图像以适应显示区域"""
+    h, w = image.shape[:2]
+    scale = min(width / w, height / h)
+    new_w, new_h = max(1, int(w * scale)), max(1, int(h * scale))
+    if (new_w, new_h) == (w, h):
+        return image
+    interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+    return cv2.resize(image, (new_w, new_h), interpolation=interpolation)
+
+
+class VideoWorker(QThread):
+    """
+    视频/摄像头工作线程：按源的真实帧率读取并像素化，处理落后时丢帧追赶，
+    只向界面发送缩放到显示尺寸的图像。
+    """
+    frame_ready = Signal(object, object)  # 显示尺寸的原始图像, 显示尺寸的像素化图像
+    playback_finished = Signal()          # 视频播放结束或摄像头读取失败
+    
+    def __init__(self, cap, pixel_size, stylizer, live=False):
+        super().__init__()
+        self.cap = cap
+        self.pixel_size = pixel_size
+        self.stylizer = stylizer
+        self.live = live              # 摄像头等实时源由设备控制节奏，不需要额外等待
+        self.dropped_frames = 0
+        self.fps = 0.0
+        self._running = True
+        self._awaiting_display = False
+        self._lock = threading.Lock()
+        self._display_sizes = ((400, 300), (400, 300))
+        self._current = (None, None)  # 最近一帧的完整分辨率 (原始, 像素化)，用于保存
+    
+    def stop(self):
+        self._running = False
+    
+    def set_display_sizes(self, original_size, pixelated_size):
+        self._display_sizes = ((original_size.width(), original_size.height()),
+                               (pixelated_size.width(), pixelated_size.height()))
+    
+    def frame_consumed(self):
+        """界面显示完一帧后调用，允许发送下一帧"""
+        self._awaiting_display = False
+    
+    def current_frames(self):
+        with self._lock:
+            return self._current
+    
+    def run(self):
+        interval = 0.0
+        if not self.live:
+            source_fps = self.cap.get(cv2.CAP_PROP_FPS)
+            if not 0 < source_fps <= 240:
+                source_fps = 30.0
+            interval = 1.0 / source_fps
+        
+        start = time.monotonic()
+        frame_index = 0
+        shown = 0
+        fps_start = start
+        try:
+            while self._running:
+                # 落后于播放时间时用grab跳过解码，直接丢帧追赶
+                if interval:
+                    late = int((time.monotonic() - start) / interval) - frame_index
+                    for _ in range(late):
+                        if not self.cap.grab():
+                            break
+                        frame_index += 1
+                        self.dropped_frames += 1
+                
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                frame_index += 1
+                
+                pixelated = self.stylizer.apply(frame, self.pixel_size)
+                with self._lock:
+                    self._current = (frame, pixelated)
+                
+                # 界面还在显示上一帧时丢弃，不排队
+                if self._awaiting_display:
+                    self.dropped_frames += 1
+                else:
+                    (orig_w, orig_h), (pix_w, pix_h) = self._display_sizes
+                    self._awaiting_display = True
+                    self.frame_ready.emit(fit_to_size(frame, orig_w, orig_h),
+                                          fit_to_size(pixelated, pix_w, pix_h))
+                    shown += 1
+                
+                now = time.monotonic()
+                if now - fps_start >= 1.0:
+                    self.fps = shown / (now - fps_start)
+                    shown = 0
+                    fps_start = now
+                
+                if interval:
+                    delay = start + frame_index * interval - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        finally:
+            self.cap.release()
+            if self._running:
+                self.playback_finished.emit()
+
+
+class RegionSelectLabel(QLabel):
+    """可用鼠标框选区域的图像显示标签，框选结果以图像坐标 (x, y, w, h) 发出"""
+    region_drawn = Signal(tuple)
+    
+    def __init__(self):
+        super().__init__()
+        self.image_size = None  # 所显示图像的原始 (宽, 高)
+        self._origin = None
+        self._rubber_band = QRubberBand(QRubberBand.Rectangle, self)
+    
+    def pixmap_rect(self):
+        """居中显示的pixmap在标签中的位置"""
+        pixmap = self.pixmap()
+        if pixmap is None or pixmap.isNull():
+            return None
+        return QRect((self.width() - pixmap.width()) // 2, (self.height() - pixmap.height()) // 2,
+                     pixmap.width(), pixmap.height())
+    
+    def mousePressEvent(self, event):
+        rect = self.pixmap_rect()
+        if self.image_size is not None and rect is not None and rect.contains(event.position().toPoint()):
+            self._origin = event.position().toPoint()
+            self._rubber_band.setGeometry(QRect(self._origin, QSize()))
+            self._rubber_band.show()
+        super().mousePressEvent(event)
+    
+    def mouseMoveEvent(self, event):
+        if self._origin is not None:
+            self._rubber_band.setGeometry(QRect(self._origin, event.position().toPoint()).normalized())
+        super().mouseMoveEvent(event)
+    
+    def mouseReleaseEvent(self, event):
+        if self._origin is not None:
+            self._origin = None
+            self._rubber_band.hide()
+            rect = self.pixmap_rect()
+            selected = self._rubber_band.geometry().intersected(rect)
+            if selected.width() > 1 and selected.height() > 1:
+                scale = self.image_size[0] / rect.width()
+                self.region_drawn.emit((int((selected.x() - rect.x()) * scale),
+                                        int((selected.y() - rect.y()) * scale),
+                                        int(selected.width() * scale),
+                                        int(selected.height() * scale)))
+        super().mouseReleaseEvent(event)
+
+
 class PixelateApp(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -32,18 +817,30 @@ class PixelateApp(QMainWindow):
         palette.setColor(QPalette.Window, QColor(self.COLORS["background"]))
         self.setPalette(palette)
         
+        # 风格化器（各页面共用）及各页面的风格控件
+        self.stylizer = Stylizer()
+        self.style_controls = {}
+        
         # 初始化UI
         self.setup_ui()
         
         # 初始化变量
         self.pixel_size = 16
-        self.cap = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
+        self.video_worker = None
         self.current_frame = None
         self.pixelated_frame = None
         self.image_path = None
         
+        # 图片预览：拖动滑块时只处理显示分辨率的代理图，保存时才计算完整分辨率
+        self.preview_proxy = None
+        self.preview_proxy_size = None
+        self.original_preview = None
+        self.image_regions = []  # 只像素化的区域（图像坐标），为空时处理整图
+        self.preview_timer = QTimer(self)
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(15)
+        self.preview_timer.timeout.connect(self.refresh_image_preview)
+        
     def setup_ui(self):
         # 创建主窗口部件
         central_widget = QWidget()
@@ -184,7 +981,8 @@ class PixelateApp(QMainWindow):
         original_title.setAlignment(Qt.AlignCenter)
         original_title.setStyleSheet(f"color: {self.COLORS['text_dark']}; font-weight: bold;")
         
-        original_display = QLabel()
+        # 图片页面支持框选只像素化的区域
+        original_display = RegionSelectLabel() if mode == "图片" else QLabel()
         original_display.setAlignment(Qt.AlignCenter)
         original_display.setMinimumSize(400, 300)
         original_display.setStyleSheet("background-color: black;")
@@ -270,6 +1068,37 @@ class PixelateApp(QMainWindow):
         pixel_control_layout.addWidget(pixel_slider)
         pixel_control_layout.addWidget(pixel_value)
         
+        # 风格与调色板颜色数
+        style_label = QLabel("风格:")
+        style_label.setStyleSheet(f"color: {self.COLORS['text_dark']};")
+        style_combo = QComboBox()
+        for style_key, style_name in STYLES.items():
+            style_combo.addItem(style_name, style_key)
+        style_combo.setStyleSheet(f"""
+            QComboBox {{
+                border: 1px solid {self.COLORS["light_gray"]};
+                border-radius: 4px;
+                padding: 4px;
+                min-width: 110px;
+            }}
+        """)
+        
+        colors_label = QLabel("颜色数:")
+        colors_label.setStyleSheet(f"color: {self.COLORS['text_dark']};")
+        colors_spin = QSpinBox()
+        colors_spin.setRange(2, 64)
+        colors_spin.setValue(16)
+        colors_spin.setEnabled(False)
+        
+        pixel_control_layout.addWidget(style_label)
+        pixel_control_layout.addWidget(style_combo)
+        pixel_control_layout.addWidget(colors_label)
+        pixel_control_layout.addWidget(colors_spin)
+        
+        self.style_controls[mode] = (style_combo, colors_spin)
+        style_combo.currentIndexChanged.connect(lambda _, m=mode: self.update_style(m))
+        colors_spin.valueChanged.connect(lambda _, m=mode: self.update_style(m))
+        
         # 按钮区域
         button_layout = QHBoxLayout()
         
@@ -330,10 +1159,22 @@ class PixelateApp(QMainWindow):
         """)
         back_button.clicked.connect(self.back_to_menu)
         
+        # 帧率与丢帧信息
+        info_label = QLabel()
+        info_label.setStyleSheet(f"color: {self.COLORS['text_medium']};")
+        
         button_layout.addWidget(open_button)
         button_layout.addWidget(save_button)
+        if mode == "图片":
+            # 清除框选区域按钮
+            clear_regions_button = QPushButton("清除区域")
+            clear_regions_button.setStyleSheet(back_button.styleSheet())
+            clear_regions_button.clicked.connect(self.clear_image_regions)
+            button_layout.addWidget(clear_regions_button)
+            info_label.setText("在原图上拖动鼠标可框选只像素化的区域")
         button_layout.addWidget(back_button)
         button_layout.addStretch()
+        button_layout.addWidget(info_label)
         
         # 添加到控制面板
         control_layout.addLayout(pixel_control_layout)
@@ -353,6 +1194,7 @@ class PixelateApp(QMainWindow):
             self.image_save_button = save_button
             
             # 连接信号
+            self.image_original_display.region_drawn.connect(self.add_image_region)
             self.image_pixel_slider.valueChanged.connect(self.update_image_pixel_size)
             self.image_open_button.clicked.connect(self.open_image)
             self.image_save_button.clicked.connect(self.save_image)
@@ -364,6 +1206,7 @@ class PixelateApp(QMainWindow):
             self.video_pixel_value = pixel_value
             self.video_open_button = open_button
             self.video_save_button = save_button
+            self.video_info_label = info_label
             
             # 连接信号
             self.video_pixel_slider.valueChanged.connect(self.update_video_pixel_size)
@@ -377,6 +1220,7 @@ class PixelateApp(QMainWindow):
             self.webcam_pixel_value = pixel_value
             self.webcam_open_button = open_button
             self.webcam_save_button = save_button
+            self.webcam_info_label = info_label
             
             # 连接信号
             self.webcam_pixel_slider.valueChanged.connect(self.update_webcam_pixel_size)
@@ -387,31 +1231,33 @@ class PixelateApp(QMainWindow):
     
     def back_to_menu(self):
         # 停止任何正在进行的处理
-        if self.cap is not None:
-            self.timer.stop()
-            self.cap.release()
-            self.cap = None
+        if self.video_worker is not None:
+            self.stop_video_worker()
+            self.webcam_open_button.setText("启动摄像头")
         
         # 返回主菜单
         self.stacked_widget.setCurrentIndex(0)
     
     def open_image_page(self):
         self.stacked_widget.setCurrentIndex(1)
+        self.update_style("图片")
     
     def open_video_page(self):
         self.stacked_widget.setCurrentIndex(2)
+        self.update_style("视频")
     
     def open_webcam_page(self):
         self.stacked_widget.setCurrentIndex(3)
+        self.update_style("摄像头")
     
-    def pixelate_frame(self, frame, pixel_size):
-        """对图像进行像素化处理"""
-        if frame is None:
-            return None
+    def update_style(self, mode):
+        """将页面上的风格设置应用到风格化器"""
+        style_combo, colors_spin = self.style_controls[mode]
+        self.stylizer.configure(style=style_combo.currentData(), n_colors=colors_spin.value())
+        colors_spin.setEnabled(self.stylizer.style != "mosaic")
         
-        h, w = frame.shape[:2]
-        temp = cv2.resize(frame, (w // pixel_size, h // pixel_size), interpolation=cv2.INTER_LINEAR)
-        return cv2.resize(temp, (w, h), interpolation=cv2.INTER_NEAREST)
+        if mode == "图片" and self.current_frame is not None and not self.preview_timer.isActive():
+            self.preview_timer.start()
     
     def convert_cv_to_pixmap(self, cv_img):
         """将OpenCV图像转换为QPixmap"""
@@ -442,19 +1288,76 @@ class PixelateApp(QMainWindow):
         if file_path:
             self.image_path = file_path
             self.current_frame = cv2.imread(file_path)
+            self.pixelated_frame = None
+            self.preview_proxy = None
+            self.image_regions = []
+            self.stylizer.reset_palette()
             self.update_image_pixel_size(self.image_pixel_slider.value())
     
     def update_image_pixel_size(self, value):
         self.pixel_size = value
         self.image_pixel_value.setText(str(value))
         
-        if self.current_frame is not None:
-            self.pixelated_frame = self.pixelate_frame(self.current_frame, self.pixel_size)
-            self.display_image(self.image_original_display, self.current_frame)
-            self.display_image(self.image_pixelated_display, self.pixelated_frame)
+        # 合并连续的滑块事件，拖动时最多每15毫秒刷新一次预览
+        if self.current_frame is not None and not self.preview_timer.isActive():
+            self.preview_timer.start()
+    
+    def build_image_preview(self):
+        """生成显示分辨率的代理图，并缓存原图的显示pixmap"""
+        h, w = self.current_frame.shape[:2]
+        size = self.image_pixelated_display.size()
+        self.preview_proxy_size = (size.width(), size.height())
+        self.preview_proxy = fit_to_size(self.current_frame, size.width(), size.height())
+        
+        original_size = self.image_original_display.size()
+        self.original_preview = fit_to_size(self.current_frame, original_size.width(), original_size.height())
+        self.image_original_display.image_size = (w, h)
+        self.show_original_preview()
+    
+    def show_original_preview(self):
+        """显示原图代理，并标出框选的区域"""
+        preview = self.original_preview
+        if self.image_regions:
+            preview = preview.copy()
+            scale = preview.shape[1] / self.current_frame.shape[1]
+            for x, y, w, h in self.image_regions:
+                cv2.rectangle(preview, (int(x * scale), int(y * scale)),
+                              (int((x + w) * scale), int((y + h) * scale)), (163, 204, 78), 2)
+        self.image_original_display.setPixmap(self.convert_cv_to_pixmap(preview))
+    
+    def add_image_region(self, region):
+        self.image_regions.append(region)
+        self.show_original_preview()
+        self.refresh_image_preview()
+    
+    def clear_image_regions(self):
+        if not self.image_regions:
+            return
+        self.image_regions = []
+        if self.original_preview is not None:
+            self.show_original_preview()
+            self.refresh_image_preview()
+    
+    def refresh_image_preview(self):
+        if self.current_frame is None:
+            return
+        
+        # 显示区域尺寸变化时才重建代理图
+        size = self.image_pixelated_display.size()
+        if self.preview_proxy is None or self.preview_proxy_size != (size.width(), size.height()):
+            self.build_image_preview()
+        
+        # 按完整分辨率的网格尺寸像素化代理图，预览与导出结果的块数一致
+        h, w = self.current_frame.shape[:2]
+        grid_w, grid_h = pixel_grid_size(w, h, self.pixel_size)
+        preview = self.stylizer.apply_to_grid(self.preview_proxy, grid_w, grid_h)
+        if self.image_regions:
+            scale = self.preview_proxy.shape[1] / w
+            preview = composite_regions(self.preview_proxy, preview, self.image_regions, scale)
+        self.image_pixelated_display.setPixmap(self.convert_cv_to_pixmap(preview))
     
     def save_image(self):
-        if self.pixelated_frame is None:
+        if self.current_frame is None:
             return
         
         file_path, _ = QFileDialog.getSaveFileName(
@@ -462,6 +1365,11 @@ class PixelateApp(QMainWindow):
         )
         
         if file_path:
+            # 只在保存时计算完整分辨率的结果
+            self.pixelated_frame = self.stylizer.apply(self.current_frame, self.pixel_size)
+            if self.image_regions:
+                self.pixelated_frame = composite_regions(self.current_frame, self.pixelated_frame,
+                                                         self.image_regions)
             cv2.imwrite(file_path, self.pixelated_frame)
     
     # 视频处理功能
@@ -472,20 +1380,21 @@ class PixelateApp(QMainWindow):
         
         if file_path:
             # 停止之前的视频
-            if self.cap is not None:
-                self.timer.stop()
-                self.cap.release()
+            self.stop_video_worker()
             
             # 打开新视频
-            self.cap = cv2.VideoCapture(file_path)
-            if self.cap.isOpened():
-                self.timer.start(33)  # ~30fps
+            cap = cv2.VideoCapture(file_path)
+            if cap.isOpened():
+                self.start_video_worker(cap, live=False)
     
     def update_video_pixel_size(self, value):
         self.pixel_size = value
         self.video_pixel_value.setText(str(value))
+        if self.video_worker is not None:
+            self.video_worker.pixel_size = value
     
     def save_video_frame(self):
+        self.sync_worker_frames()
         if self.pixelated_frame is None:
             return
         
@@ -498,25 +1407,27 @@ class PixelateApp(QMainWindow):
     
     # 摄像头功能
     def toggle_webcam(self):
-        if self.cap is None or not self.cap.isOpened():
-            self.cap = cv2.VideoCapture(0)
-            if self.cap.isOpened():
+        if self.video_worker is None:
+            cap = cv2.VideoCapture(0)
+            if cap.isOpened():
                 self.webcam_open_button.setText("停止摄像头")
-                self.timer.start(33)  # ~30fps
+                self.start_video_worker(cap, live=True)
         else:
-            self.timer.stop()
-            self.cap.release()
-            self.cap = None
+            self.stop_video_worker()
             self.webcam_open_button.setText("启动摄像头")
             # 清空显示
             self.webcam_original_display.clear()
             self.webcam_pixelated_display.clear()
+            self.webcam_info_label.clear()
     
     def update_webcam_pixel_size(self, value):
         self.pixel_size = value
         self.webcam_pixel_value.setText(str(value))
+        if self.video_worker is not None:
+            self.video_worker.pixel_size = value
     
     def save_webcam_frame(self):
+        self.sync_worker_frames()
         if self.pixelated_frame is None:
             return
         
@@ -527,32 +1438,106 @@ class PixelateApp(QMainWindow):
         if file_path:
             cv2.imwrite(file_path, self.pixelated_frame)
     
-    # 通用视频/摄像头帧更新
-    def update_frame(self):
-        if self.cap is None or not self.cap.isOpened():
+    # 通用视频/摄像头工作线程管理
+    def start_video_worker(self, cap, live):
+        self.stylizer.reset_palette()
+        self.video_worker = VideoWorker(cap, self.pixel_size, self.stylizer, live=live)
+        self.video_worker.frame_ready.connect(self.on_worker_frame)
+        self.video_worker.playback_finished.connect(self.on_playback_finished)
+        displays = self.current_displays()
+        if displays is not None:
+            self.video_worker.set_display_sizes(displays[0].size(), displays[1].size())
+        self.video_worker.start()
+    
+    def stop_video_worker(self):
+        if self.video_worker is None:
             return
-        
-        ret, frame = self.cap.read()
-        if not ret:
-            # 视频结束
-            self.timer.stop()
-            if self.stacked_widget.currentIndex() == 3:  # 如果是摄像头页面
-                self.toggle_webcam()
+        self.video_worker.stop()
+        self.video_worker.wait()
+        self.sync_worker_frames()
+        self.video_worker = None
+    
+    def sync_worker_frames(self):
+        """从工作线程取回最近一帧的完整分辨率图像，用于保存"""
+        if self.video_worker is None:
             return
-        
-        self.current_frame = frame
-        self.pixelated_frame = self.pixelate_frame(frame, self.pixel_size)
-        
-        # 根据当前页面更新显示
+        frame, pixelated = self.video_worker.current_frames()
+        if frame is not None:
+            self.current_frame = frame
+            self.pixelated_frame = pixelated
+    
+    def current_displays(self):
+        """返回当前页面的 (原始显示, 像素化显示, 信息标签)"""
         current_index = self.stacked_widget.currentIndex()
         if current_index == 2:  # 视频页面
-            self.display_image(self.video_original_display, frame)
-            self.display_image(self.video_pixelated_display, self.pixelated_frame)
+            return self.video_original_display, self.video_pixelated_display, self.video_info_label
         elif current_index == 3:  # 摄像头页面
-            self.display_image(self.webcam_original_display, frame)
-            self.display_image(self.webcam_pixelated_display, self.pixelated_frame)
+            return self.webcam_original_display, self.webcam_pixelated_display, self.webcam_info_label
+        return None
+    
+    def on_worker_frame(self, original, pixelated):
+        worker = self.video_worker
+        if worker is None:
+            return
+        
+        displays = self.current_displays()
+        if displays is not None:
+            original_display, pixelated_display, info_label = displays
+            # 工作线程已缩放到显示尺寸，这里只做格式转换
+            original_display.setPixmap(self.convert_cv_to_pixmap(original))
+            pixelated_display.setPixmap(self.convert_cv_to_pixmap(pixelated))
+            info_label.setText(f"帧率: {worker.fps:.1f} | 丢帧: {worker.dropped_frames}")
+            worker.set_display_sizes(original_display.size(), pixelated_display.size())
+        
+        worker.frame_consumed()
+    
+    def on_playback_finished(self):
+        is_webcam = self.video_worker is not None and self.video_worker.live
+        self.stop_video_worker()
+        if is_webcam:
+            self.webcam_open_button.setText("启动摄像头")
+    
+    def closeEvent(self, event):
+        self.stop_video_worker()
+        super().closeEvent(event)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="清新像素化工具")
+    parser.add_argument("--input", help="批量处理的图片/视频文件或文件夹（指定后不启动界面）")
+    parser.add_argument("--output", help="输出文件或文件夹")
+    parser.add_argument("--pixel-size", type=int, default=16, help="像素块大小")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为CPU核数")
+    parser.add_argument("--codec", default="mp4v", help="视频编码的FourCC，如 mp4v、avc1、MJPG")
+    parser.add_argument("--queue-size", type=int, default=32, help="视频帧队列长度")
+    parser.add_argument("--style", choices=list(STYLES), default="mosaic", help="像素风格")
+    parser.add_argument("--colors", type=int, default=16, help="调色板颜色数（调色板与抖动风格）")
+    parser.add_argument("--palette-method", choices=PALETTE_METHODS, default="kmeans", help="调色板提取方法")
+    parser.add_argument("--tiled", action="store_true", help="分块处理超大图片（仅马赛克风格）")
+    parser.add_argument("--tile-rows", type=int, default=1024, help="分块处理的条带高度（行）")
+    parser.add_argument("--regions", help='只像素化指定区域，格式 "x,y,w,h;x,y,w,h"（分块模式）')
+    args = parser.parse_args()
+    if args.regions and not args.tiled:
+        parser.error("--regions 只能与 --tiled 一起使用")
+    if args.tiled and args.style != "mosaic":
+        parser.error("--tiled 只支持马赛克风格（--style mosaic）")
+    return args
 
 def main():
+    args = parse_args()
+    if args.input:
+        if not args.output:
+            print("批量处理需要指定 --output")
+            sys.exit(1)
+        if args.tiled:
+            regions = parse_regions(args.regions) if args.regions else None
+            run_tiled(args.input, args.output, pixel_size=args.pixel_size, regions=regions,
+                      tile_rows=args.tile_rows)
+            return
+        run_batch(args.input, args.output, pixel_size=args.pixel_size, workers=args.workers,
+                  codec=args.codec, queue_size=args.queue_size, style=args.style,
+                  n_colors=args.colors, palette_method=args.palette_method)
+        return
+    
     app = QApplication(sys.argv)
     
     # 设置应用样式
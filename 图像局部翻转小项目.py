@@ -9,7 +9,19 @@ import sys
 import os
 import threading
 import traceback
+import contextlib
 import random
+import time
+import shutil
+import subprocess
+import multiprocessing
+import hashlib
+import argparse
+import tempfile
+import json
+import platform
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 
 # 图像处理库
@@ -26,34 +38,364 @@ from PySide6.QtCore import Qt, Signal, QObject, QThread
 from PySide6.QtGui import QPixmap, QImage
 
 
+# ==================== 输出后端 ====================
+# 统一接口: open(size, frame_rate) / write(frame) / close()
+# write 收到的是正在渲染的画布本身（不复制），返回后画布会被下一帧覆盖；
+# 需要异步处理帧的后端必须在 write 返回前自行复制。
+
+class VideoWriterSink:
+    """cv2.VideoWriter 输出（默认后端）"""
+    def __init__(self, path, codec='mp4v'):
+        self.path = path
+        self.codec = codec
+        self.writer = None
+
+    def open(self, size, frame_rate):
+        fourcc = cv2.VideoWriter_fourcc(*self.codec)
+        self.writer = cv2.VideoWriter(self.path, fourcc, frame_rate, size)
+        if not self.writer.isOpened():
+            raise RuntimeError(f"无法创建视频文件: {self.path}")
+
+    def write(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.release()
+            self.writer = None
+
+
+class FFmpegPipeSink:
+    """通过管道把原始BGR帧送入 ffmpeg 子进程编码，可配置编码器、CRF 和 preset"""
+    def __init__(self, path, codec='libx264', crf=23, preset='medium', pix_fmt='yuv420p',
+                 ffmpeg=None, extra_args=()):
+        self.path = path
+        self.codec = codec
+        self.crf = crf
+        self.preset = preset
+        self.pix_fmt = pix_fmt
+        self.ffmpeg = ffmpeg
+        self.extra_args = list(extra_args)
+        self.process = None
+        self.stderr = None
+
+    def open(self, size, frame_rate):
+        ffmpeg = self.ffmpeg or shutil.which('ffmpeg')
+        if not ffmpeg:
+            raise RuntimeError("未找到 ffmpeg，无法使用管道编码输出")
+        w, h = size
+        cmd = [ffmpeg, '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{w}x{h}', '-r', str(frame_rate),
+               '-i', '-', '-c:v', self.codec]
+        if self.preset:
+            cmd += ['-preset', self.preset]
+        if self.crf is not None:
+            cmd += ['-crf', str(self.crf)]
+        if self.pix_fmt:
+            cmd += ['-pix_fmt', self.pix_fmt]
+        cmd += self.extra_args + [self.path]
+        # stderr 写入临时文件而不是管道：写帧时没人读管道，ffmpeg 输出多了会把双方都阻塞住
+        self.stderr = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self.stderr)
+
+    def write(self, frame):
+        try:
+            # 连续数组直接按缓冲区写入管道，不做复制
+            self.process.stdin.write(np.ascontiguousarray(frame).data)
+        except BrokenPipeError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.process is None:
+            return
+        process, self.process = self.process, None
+        stderr_file, self.stderr = self.stderr, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode = process.wait()
+        with stderr_file:
+            stderr_file.seek(0)
+            stderr = stderr_file.read().decode('utf-8', 'replace').strip()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg 编码失败 (返回码 {returncode}): {stderr}")
+
+
+class ImageSequenceSink:
+    """PNG/JPEG 图片序列输出，编码和写盘在线程池中进行"""
+    def __init__(self, directory, ext='.png', prefix='frame_', threads=None,
+                 jpeg_quality=95, png_compression=1, max_pending=None):
+        self.directory = directory
+        self.ext = ext if ext.startswith('.') else '.' + ext
+        self.prefix = prefix
+        self.threads = threads or min(8, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.threads * 2
+        if self.ext.lower() in ('.jpg', '.jpeg'):
+            self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+        elif self.ext.lower() == '.png':
+            self.params = [cv2.IMWRITE_PNG_COMPRESSION, png_compression]
+        else:
+            self.params = []
+        self.executor = None
+        self.index = 0
+
+    def open(self, size, frame_rate):
+        os.makedirs(self.directory, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=self.threads)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._futures = []
+        self.index = 0
+
+    def _save(self, path, frame):
+        try:
+            ok, buffer = cv2.imencode(self.ext, frame, self.params)
+            if not ok:
+                raise RuntimeError(f"图片编码失败: {path}")
+            buffer.tofile(path)
+        finally:
+            self._slots.release()
+
+    def write(self, frame):
+        self._slots.acquire()  # 待写帧数受限，避免内存无限增长
+        path = os.path.join(self.directory, f"{self.prefix}{self.index:06d}{self.ext}")
+        self.index += 1
+        # 异步编码期间画布会继续变化，这是该后端唯一的一次复制
+        self._futures.append(self.executor.submit(self._save, path, frame.copy()))
+        if len(self._futures) > self.max_pending * 4:
+            self._check_done()
+
+    def _check_done(self):
+        pending = []
+        for future in self._futures:
+            if future.done():
+                future.result()
+            else:
+                pending.append(future)
+        self._futures = pending
+
+    def close(self):
+        if self.executor is None:
+            return
+        self.executor.shutdown(wait=True)
+        self.executor = None
+        futures, self._futures = self._futures, []
+        for future in futures:
+            future.result()
+
+
+class NullSink:
+    """丢弃所有帧，用于测量渲染本身的开销"""
+    def open(self, size, frame_rate):
+        pass
+
+    def write(self, frame):
+        pass
+
+    def close(self):
+        pass
+
+
+def benchmark_sinks(sinks, size=(1920, 1080), frames=120, frame_rate=30):
+    """
+    测量各输出后端的吞吐量。sinks 为 {名称: 后端实例}；
+    只统计 write/close 的耗时，测试帧在计时之外生成。返回 {名称: {frames, seconds, fps}}。
+    """
+    w, h = size
+    base = np.zeros((h, w, 3), np.uint8)
+    base[..., 0] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+    base[..., 1] = np.linspace(0, 255, h, dtype=np.uint8)[:, None]
+    base[..., 2] = np.random.default_rng(0).integers(0, 64, (h, w), dtype=np.uint8)
+    frame = np.empty_like(base)
+
+    results = {}
+    for name, sink in sinks.items():
+        elapsed = 0.0
+        try:
+            sink.open(size, frame_rate)
+            for i in range(frames):
+                np.copyto(frame, np.roll(base, i * 8, axis=1))
+                start = time.perf_counter()
+                sink.write(frame)
+                elapsed += time.perf_counter() - start
+            start = time.perf_counter()
+            sink.close()
+            elapsed += time.perf_counter() - start
+        except Exception as e:
+            # 后端可能根本没打开或正是在 close() 中失败，再次关闭的异常不能中断其余测试
+            with contextlib.suppress(Exception):
+                sink.close()
+            results[name] = {'frames': frames, 'error': str(e)}
+            continue
+        results[name] = {'frames': frames, 'seconds': elapsed, 'fps': frames / elapsed if elapsed else float('inf')}
+    return results
+
+
+def run_sink_benchmark(size=(1920, 1080), frames=120, output_dir=None):
+    """对所有可用后端运行吞吐量测试并打印结果"""
+    output_dir = output_dir or tempfile.mkdtemp(prefix='sink_bench_')
+    sinks = {
+        'null': NullSink(),
+        'videowriter-mp4v': VideoWriterSink(os.path.join(output_dir, 'bench_mp4v.mp4')),
+        'png-sequence': ImageSequenceSink(os.path.join(output_dir, 'png'), '.png'),
+        'jpeg-sequence': ImageSequenceSink(os.path.join(output_dir, 'jpg'), '.jpg'),
+    }
+    if shutil.which('ffmpeg'):
+        sinks['ffmpeg-libx264-veryfast'] = FFmpegPipeSink(os.path.join(output_dir, 'bench_x264.mp4'),
+                                                         preset='veryfast')
+    else:
+        print("⚠️ 未找到 ffmpeg，跳过管道编码后端")
+
+    results = benchmark_sinks(sinks, size, frames)
+    print(f"输出后端吞吐量 ({size[0]}x{size[1]}, {frames} 帧, 输出目录: {output_dir})")
+    for name, result in sorted(results.items(), key=lambda item: -item[1].get('fps', 0)):
+        if 'error' in result:
+            print(f"  {name:<26} 失败: {result['error']}")
+        else:
+            print(f"  {name:<26} {result['fps']:8.1f} 帧/秒  ({result['seconds']:.2f} 秒)")
+    return results
+
+
 # ==================== 核心动画功能 ====================
 
-def alpha_blend(src, dst, alpha):
-    """Alpha blending 两张图"""
-    return cv2.addWeighted(src, 1 - alpha, dst, alpha, 0)
+def iter_blend_frames(src, dst, blend_frames, max_batch_bytes=64 * 1024 * 1024):
+    """
+    批量计算 src→dst 的全部过渡帧（alpha = 1/n ... n/n），
+    每批返回形状为 (批大小, h, w, 3) 的uint8数组，单批的中间结果不超过 max_batch_bytes。
+    """
+    src_f = src.astype(np.float32)
+    diff = dst.astype(np.float32) - src_f
+    alphas = np.arange(1, blend_frames + 1, dtype=np.float32) / blend_frames
+    batch = max(1, max_batch_bytes // max(1, src_f.nbytes))
+    for start in range(0, blend_frames, batch):
+        alpha = alphas[start:start + batch, None, None, None]
+        yield np.rint(src_f + diff * alpha).astype(np.uint8)
 
 
-def create_animation(
-    animation_mode: str,
-    original_path: str,
-    final_path: str = None,
-    pool_folder: str = None,
-    output_video: str = "animation_output.mp4",
-    frame_rate: int = 20,
-    grid_size: tuple = (4, 4),
-    total_steps: int = None,
-    blend_frames: int = 10,
-    target_resolution: tuple = None,
-    progress_callback=None,
-    frame_callback=None
-):
+class RenderTimings:
+    """渲染耗时统计（秒）：blend 混合计算，copy 写回画布，encode 交给输出后端"""
+    def __init__(self):
+        self.blend = 0.0
+        self.copy = 0.0
+        self.encode = 0.0
+        self.frames = 0
+
+    def as_dict(self):
+        return {'frames': self.frames, 'blend_s': self.blend, 'copy_s': self.copy, 'encode_s': self.encode}
+
+
+class FrameOutput:
+    """将画布直接交给输出后端（不复制），并按限定频率发送预览帧"""
+    def __init__(self, sink, frame_callback=None, preview_fps=10, timings=None):
+        self.sink = sink
+        self.frame_callback = frame_callback
+        self.preview_interval = 1.0 / preview_fps if preview_fps else 0.0
+        self.timings = timings
+        self.frames_written = 0
+        self._last_preview = None
+
+    def write(self, canvas):
+        start = time.perf_counter()
+        self.sink.write(canvas)
+        if self.timings is not None:
+            self.timings.encode += time.perf_counter() - start
+            self.timings.frames += 1
+        self.frames_written += 1
+        if self.frame_callback:
+            now = time.monotonic()
+            if self._last_preview is None or now - self._last_preview >= self.preview_interval:
+                self._last_preview = now
+                # 回调收到的是画布本身，需要保留时必须自行复制
+                self.frame_callback(canvas)
+
+
+def iter_transition(canvas, rect, target, blend_frames, timings=None):
+    """将画布上 rect 区域逐帧过渡到 target，每帧产出画布本身（不复制）"""
+    x, y, width, height = rect
+    region = canvas[y:y+height, x:x+width]
+    source = region.copy()
+    batches = iter_blend_frames(source, target, blend_frames)
+    while True:
+        start = time.perf_counter()
+        frames = next(batches, None)
+        if timings is not None:
+            timings.blend += time.perf_counter() - start
+        if frames is None:
+            break
+        for frame in frames:
+            start = time.perf_counter()
+            region[...] = frame
+            if timings is not None:
+                timings.copy += time.perf_counter() - start
+            yield canvas
+
+
+ANIMATION_MODES = ['local_invert', 'scripted_invert', 'random_patch']
+POOL_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+POOL_CACHE_DIRNAME = '.pool_cache'
+
+
+def _pool_cache_key(entries, tile_size):
+    """由图像池文件列表（文件名、大小、修改时间）和图块尺寸计算缓存键"""
+    digest = hashlib.sha1(repr((tile_size, entries)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _decode_pool_tile(path, tile_size):
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    return cv2.resize(img, tile_size, interpolation=cv2.INTER_AREA)
+
+
+def load_pool_tiles(pool_folder, tile_size, cache_dir=None, threads=None):
     """
-    创建一个包含三种不同模式的图像过渡动画。
+    加载图像池并一次性缩放到图块尺寸 tile_size=(宽, 高)。
+    多线程解码；结果以 (N, h, w, 3) 数组缓存到磁盘，文件夹内容和图块尺寸不变时直接读取缓存。
+    返回按文件名排序的图块列表。
+    """
+    names = sorted(f for f in os.listdir(pool_folder) if f.lower().endswith(POOL_EXTENSIONS))
+    entries = []
+    for name in names:
+        stat = os.stat(os.path.join(pool_folder, name))
+        entries.append((name, stat.st_size, stat.st_mtime_ns))
+
+    tile_size = (int(tile_size[0]), int(tile_size[1]))
+    cache_dir = cache_dir or os.path.join(pool_folder, POOL_CACHE_DIRNAME)
+    cache_path = os.path.join(cache_dir, _pool_cache_key(entries, tile_size) + '.npy')
+    if os.path.exists(cache_path):
+        try:
+            return list(np.load(cache_path))
+        except (OSError, ValueError):
+            pass  # 缓存损坏则重新生成
+
+    paths = [os.path.join(pool_folder, name) for name in names]
+    with ThreadPoolExecutor(max_workers=threads or min(8, os.cpu_count() or 1)) as executor:
+        tiles = [tile for tile in executor.map(lambda p: _decode_pool_tile(p, tile_size), paths)
+                 if tile is not None]
+
+    if tiles:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp_path = cache_path + '.tmp.npy'
+            np.save(tmp_path, np.stack(tiles))
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass  # 缓存目录不可写时不影响生成
+    return tiles
+
+
+def load_animation_inputs(animation_mode, original_path, final_path=None, pool_folder=None,
+                          target_resolution=None, grid_size=None):
+    """
+    验证参数并加载原始图、最终图和图像池，统一缩放到目标分辨率。
+    给出 grid_size 时图像池直接以网格图块尺寸加载（带磁盘缓存）。
+    返回 (original, final_image, pool_images)。
     """
     # --- 1. 参数验证 ---
-    MODES = ['local_invert', 'scripted_invert', 'random_patch']
-    if animation_mode not in MODES:
-        raise ValueError(f"无效的动画模式: {animation_mode}. 可选模式: {MODES}")
+    if animation_mode not in ANIMATION_MODES:
+        raise ValueError(f"无效的动画模式: {animation_mode}. 可选模式: {ANIMATION_MODES}")
 
     if not os.path.exists(original_path):
         raise FileNotFoundError(f"原始图像不存在: {original_path}")
@@ -95,126 +437,438 @@ def create_animation(
     if final_image is not None:
         final_image = cv2.resize(final_image, (target_w, target_h), interpolation=cv2.INTER_AREA)
 
-    h, w = original.shape[:2]
-    canvas = original.copy()
-
-    # --- 3. 加载图像池 ---
+    # --- 3. 加载图像池（按文件名排序，保证同一种子在不同进程中选到同一张图） ---
     pool_images = []
     if pool_folder:
-        for f in os.listdir(pool_folder):
-            if f.lower().endswith(('.jpg', '.jpeg', '.png')):
-                img_path = os.path.join(pool_folder, f)
-                img = cv2.imread(img_path)
-                if img is not None:
-                    pool_images.append(img)
+        if grid_size:
+            tile_size = (target_w // grid_size[1], target_h // grid_size[0])
+            pool_images = load_pool_tiles(pool_folder, tile_size)
+        else:
+            for f in sorted(os.listdir(pool_folder)):
+                if f.lower().endswith(POOL_EXTENSIONS):
+                    img = cv2.imread(os.path.join(pool_folder, f))
+                    if img is not None:
+                        pool_images.append(img)
         if not pool_images:
             raise ValueError("图像池为空或所有图像无法读取")
 
-    # --- 4. 视频和网格设置 ---
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    video_out = cv2.VideoWriter(output_video, fourcc, frame_rate, (w, h))
+    return original, final_image, pool_images
+
 
+def plan_animation(animation_mode, size, grid_size, total_steps, pool_count, rng):
+    """
+    生成动画步骤计划：[(rect, 图像池索引或None), ...]。
+    随机数的消耗顺序与逐帧渲染完全一致，同一种子总是得到同一计划。
+    """
+    w, h = size
     grid_h = h // grid_size[0]
     grid_w = w // grid_size[1]
     
     grid_positions = [(j * grid_w, i * grid_h, grid_w, grid_h) for i in range(grid_size[0]) for j in range(grid_size[1])]
-    random.shuffle(grid_positions)
+    rng.shuffle(grid_positions)
 
     if total_steps is None:
         total_steps = len(grid_positions)
     else:
         total_steps = min(total_steps, len(grid_positions))
 
-    # --- 5. 主循环和动画逻辑 ---
-    for step in range(total_steps):
+    plan = []
+    for rect in grid_positions[:total_steps]:
+        pool_index = None
+        if animation_mode in ['scripted_invert', 'random_patch']:
+            pool_index = rng.randrange(pool_count)
+        plan.append((rect, pool_index))
+    return plan
+
+
+def step_targets(animation_mode, rect, pool_index, final_image, pool_images):
+    """某一步中该格子依次要过渡到的目标图块列表"""
+    x, y, width, height = rect
+    targets = []
+    if pool_index is not None:
+        replacement = pool_images[pool_index]
+        if replacement.shape[:2] != (height, width):
+            replacement = cv2.resize(replacement, (width, height), interpolation=cv2.INTER_AREA)
+        targets.append(replacement)
+    if animation_mode in ['local_invert', 'scripted_invert']:
+        targets.append(final_image[y:y+height, x:x+width])
+    return targets
+
+
+def iter_plan_frames(animation_mode, canvas, plan, final_image, pool_images, blend_frames,
+                     progress_callback=None, step_offset=0, total_steps=None, timings=None):
+    """按计划逐步渲染，逐帧产出画布本身（下一帧会覆盖它）"""
+    total_steps = total_steps if total_steps is not None else len(plan)
+    for index, (rect, pool_index) in enumerate(plan):
         if progress_callback:
-            progress_callback(step, total_steps)
-        
-        x, y, width, height = grid_positions[step]
-
-        # -- 模式: local_invert --
-        if animation_mode == 'local_invert':
-            current_region = canvas[y:y+height, x:x+width].copy()
-            final_region = final_image[y:y+height, x:x+width].copy()
-            for i in range(1, blend_frames + 1):
-                alpha = i / blend_frames
-                blended = alpha_blend(current_region, final_region, alpha)
-                canvas[y:y+height, x:x+width] = blended
-                video_out.write(canvas.copy())
-                if frame_callback:
-                    frame_callback(canvas.copy())
-        
-        # -- 模式: scripted_invert --
-        elif animation_mode == 'scripted_invert':
-            # 阶段一: 原始 -> 随机图
-            old_region = canvas[y:y+height, x:x+width].copy()
-            replacement = random.choice(pool_images)
-            resized = cv2.resize(replacement, (width, height), interpolation=cv2.INTER_AREA)
-            for i in range(1, blend_frames + 1):
-                alpha = i / blend_frames
-                blended = alpha_blend(old_region, resized, alpha)
-                canvas[y:y+height, x:x+width] = blended
-                video_out.write(canvas.copy())
-                if frame_callback:
-                    frame_callback(canvas.copy())
-            
-            # 阶段二: 随机图 -> 最终图
-            current_region = canvas[y:y+height, x:x+width].copy()
-            final_region = final_image[y:y+height, x:x+width].copy()
-            for i in range(1, blend_frames + 1):
-                alpha = i / blend_frames
-                blended = alpha_blend(current_region, final_region, alpha)
-                canvas[y:y+height, x:x+width] = blended
-                video_out.write(canvas.copy())
-                if frame_callback:
-                    frame_callback(canvas.copy())
-
-        # -- 模式: random_patch --
-        elif animation_mode == 'random_patch':
-            old_region = canvas[y:y+height, x:x+width].copy()
-            replacement = random.choice(pool_images)
-            resized = cv2.resize(replacement, (width, height), interpolation=cv2.INTER_AREA)
-            for i in range(1, blend_frames + 1):
-                alpha = i / blend_frames
-                blended = alpha_blend(old_region, resized, alpha)
-                canvas[y:y+height, x:x+width] = blended
-                video_out.write(canvas.copy())
-                if frame_callback:
-                    frame_callback(canvas.copy())
-
-    # --- 6. 结尾和清理 ---
-    end_image = final_image if final_image is not None else original
+            progress_callback(step_offset + index, total_steps)
+        # local_invert: 原始 -> 最终图；scripted_invert: 原始 -> 随机图 -> 最终图；random_patch: 原始 -> 随机图
+        for target in step_targets(animation_mode, rect, pool_index, final_image, pool_images):
+            yield from iter_transition(canvas, rect, target, blend_frames, timings)
+
+
+def iter_wave_frames(animation_mode, canvas, plan, final_image, pool_images, blend_frames,
+                     concurrent_tiles, progress_callback=None, timings=None, total_frames=None):
+    """
+    波浪模式：格子按计划顺序错开起始时间，最多 concurrent_tiles 个同时过渡。
+    给出 total_frames 时改为固定总帧数：起始时间在 [0, total_frames - 单格帧数] 内均匀分布，
+    视频长度与网格大小无关，同时过渡的格子数随之变化（不少于单格帧数）。
+    每帧把所有活动格子作为一个 (K, th, tw, 3) 批次做一次向量化混合，再一次性散射回画布。
+    """
+    n = len(plan)
+    if n == 0:
+        return
+    _, _, tile_w, tile_h = plan[0][0]
+    rows, cols = canvas.shape[0] // tile_h, canvas.shape[1] // tile_w
+    # (rows, cols, th, tw, 3) 的画布视图，按格子坐标直接读写
+    tiles = canvas[:rows * tile_h, :cols * tile_w].reshape(rows, tile_h, cols, tile_w, 3).swapaxes(1, 2)
+    tile_rows = np.array([rect[1] // tile_h for rect, _ in plan])
+    tile_cols = np.array([rect[0] // tile_w for rect, _ in plan])
+
+    # 每个格子的关键帧: 当前画布 -> (随机图) -> (最终图)，按阶段堆叠为 (阶段, n, th, tw, 3)
+    keyframes = np.stack([
+        np.stack([tiles[r, c].copy()] + step_targets(animation_mode, rect, pool_index, final_image, pool_images))
+        for (rect, pool_index), r, c in zip(plan, tile_rows, tile_cols)
+    ], axis=1)
+    base = keyframes[:-1]
+    diff = keyframes[1:].astype(np.int16) - base
+    phases = base.shape[0]
+
+    tile_frames = phases * blend_frames
+    if total_frames is None:
+        stagger = max(1, -(-tile_frames // concurrent_tiles))
+        starts = np.arange(n) * stagger
+    else:
+        span = max(0, total_frames - tile_frames)
+        starts = (np.arange(n) * span) // max(1, n - 1)
+    total_frames = int(starts[-1]) + tile_frames
+    started = 0
+    for f in range(total_frames):
+        # 起始时间单调不减，活动格子是 start <= f < start + tile_frames 的连续区间
+        first = int(np.searchsorted(starts, f - tile_frames, side='right'))
+        last = int(np.searchsorted(starts, f, side='right')) - 1
+        if progress_callback and last >= started:
+            started = last + 1
+            progress_callback(last, n)
+        active = np.arange(first, last + 1)
+        local = f - starts[active]
+        phase = local // blend_frames
+        alpha = (local % blend_frames + 1).astype(np.float32) / blend_frames
+        start = time.perf_counter()
+        blended = base[phase, active].astype(np.float32) + diff[phase, active] * alpha[:, None, None, None]
+        blended = np.rint(blended).astype(np.uint8)
+        copy_start = time.perf_counter()
+        tiles[tile_rows[active], tile_cols[active]] = blended
+        if timings is not None:
+            timings.blend += copy_start - start
+            timings.copy += time.perf_counter() - copy_start
+        yield canvas
+
+
+def wave_frames_for(wave_duration, frame_rate):
+    """波浪时长（秒）换算为帧数，未设置时返回 None"""
+    return max(1, round(wave_duration * frame_rate)) if wave_duration else None
+
+
+def iter_frames(animation_mode, canvas, plan, final_image, pool_images, blend_frames,
+                concurrent_tiles=1, progress_callback=None, timings=None, wave_frames=None):
+    """按 concurrent_tiles / wave_frames 选择逐格或波浪渲染"""
+    if concurrent_tiles > 1 or wave_frames:
+        return iter_wave_frames(animation_mode, canvas, plan, final_image, pool_images, blend_frames,
+                                concurrent_tiles, progress_callback, timings, wave_frames)
+    return iter_plan_frames(animation_mode, canvas, plan, final_image, pool_images, blend_frames,
+                            progress_callback, timings=timings)
+
+
+def end_image_for(final_image, original):
+    return final_image if final_image is not None else original
+
+
+def prepare_animation(animation_mode, original_path, final_path=None, pool_folder=None,
+                      grid_size=(4, 4), total_steps=None, target_resolution=None, seed=None):
+    """加载输入并生成步骤计划，返回 (original, final_image, pool_images, plan)"""
+    original, final_image, pool_images = load_animation_inputs(
+        animation_mode, original_path, final_path, pool_folder, target_resolution, grid_size)
+    h, w = original.shape[:2]
+    rng = random.Random(seed) if seed is not None else random
+    plan = plan_animation(animation_mode, (w, h), grid_size, total_steps, len(pool_images), rng)
+    return original, final_image, pool_images, plan
+
+
+def iter_animation(
+    animation_mode: str,
+    original_path: str,
+    final_path: str = None,
+    pool_folder: str = None,
+    frame_rate: int = 20,
+    grid_size: tuple = (4, 4),
+    total_steps: int = None,
+    blend_frames: int = 10,
+    target_resolution: tuple = None,
+    seed: int = None,
+    progress_callback=None,
+    concurrent_tiles: int = 1,
+    wave_duration: float = None
+):
+    """
+    内存帧生成器，供其他工具嵌入使用，参数与 create_animation 相同。
+    产出的是同一块画布（不复制），下一次迭代时会被覆盖；需要保留请自行 copy()。
+    """
+    original, final_image, pool_images, plan = prepare_animation(
+        animation_mode, original_path, final_path, pool_folder, grid_size, total_steps,
+        target_resolution, seed)
+    yield from iter_frames(animation_mode, original.copy(), plan, final_image, pool_images,
+                           blend_frames, concurrent_tiles, progress_callback,
+                           wave_frames=wave_frames_for(wave_duration, frame_rate))
+    end_image = end_image_for(final_image, original)
     for _ in range(frame_rate):
-        video_out.write(end_image)
+        yield end_image
+    if progress_callback:
+        progress_callback(len(plan), len(plan))
+
+
+def _render_segment(task):
+    """
+    进程池任务：从确定的画布快照开始渲染一段连续步骤并编码为独立的视频文件。
+    快照 = 原始图 + 之前各步格子的最终状态（格子互不重叠，且每格只出现一次）。
+    """
+    original, final_image, pool_images = load_animation_inputs(
+        task['animation_mode'], task['original_path'], task['final_path'],
+        task['pool_folder'], task['target_resolution'], task['grid_size'])
+    plan = task['plan']
+    start, end = task['start'], task['end']
+
+    canvas = original.copy()
+    for rect, pool_index in plan[:start]:
+        x, y, width, height = rect
+        canvas[y:y+height, x:x+width] = step_targets(
+            task['animation_mode'], rect, pool_index, final_image, pool_images)[-1]
+
+    h, w = canvas.shape[:2]
+    sink = VideoWriterSink(task['segment_path'], task['codec'])
+    sink.open((w, h), task['frame_rate'])
+    output = FrameOutput(sink)
+    try:
+        for frame in iter_plan_frames(task['animation_mode'], canvas, plan[start:end], final_image,
+                                      pool_images, task['blend_frames']):
+            output.write(frame)
+        if task['write_ending']:
+            end_image = end_image_for(final_image, original)
+            for _ in range(task['frame_rate']):
+                output.write(end_image)
+    finally:
+        sink.close()
+    return task['segment_path'], output.frames_written
+
+
+# 无损编码：片段解码后重新编码拼接也与串行输出逐帧相同
+LOSSLESS_CODECS = ('FFV1', 'HFYU', 'LAGS')
+
+
+def parallel_supported(codec):
+    """并行片段模式需要无损编码或 ffmpeg（直接复制码流拼接，不再二次编码）"""
+    return codec.upper() in LOSSLESS_CODECS or shutil.which('ffmpeg') is not None
+
+
+def concat_segments(segment_paths, output_video, codec, frame_rate, size):
+    """
+    拼接视频片段。有 ffmpeg 时用 concat 分离器直接复制码流（无损、无需重新编码）；
+    否则退化为解码后重新编码。返回是否为无损拼接。
+    """
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg:
+        list_path = output_video + '.segments.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        try:
+            subprocess.run([ffmpeg, '-y', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                            '-i', list_path, '-c', 'copy', output_video], check=True)
+        finally:
+            os.remove(list_path)
+        return True
+
+    # 只在无损编码时到达这里（见 parallel_supported），重新编码不改变帧内容
+    print("⚠️ 未找到 ffmpeg，片段将解码后重新编码拼接")
+    sink = VideoWriterSink(output_video, codec)
+    sink.open(size, frame_rate)
+    try:
+        for path in segment_paths:
+            cap = cv2.VideoCapture(path)
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                sink.write(frame)
+            cap.release()
+    finally:
+        sink.close()
+    return False
 
-    video_out.release()
+
+def create_animation(
+    animation_mode: str,
+    original_path: str,
+    final_path: str = None,
+    pool_folder: str = None,
+    output_video: str = "animation_output.mp4",
+    frame_rate: int = 20,
+    grid_size: tuple = (4, 4),
+    total_steps: int = None,
+    blend_frames: int = 10,
+    target_resolution: tuple = None,
+    progress_callback=None,
+    frame_callback=None,
+    preview_fps: float = 10,
+    seed: int = None,
+    workers: int = 1,
+    codec: str = 'mp4v',
+    sink=None,
+    concurrent_tiles: int = 1,
+    wave_duration: float = None,
+    timings=None
+):
+    """
+    创建一个包含三种不同模式的图像过渡动画。
+    frame_callback 最多每秒调用 preview_fps 次，收到的画布会被后续帧覆盖。
+    seed 固定随机顺序；workers > 1 时把步骤分成连续片段交给多个进程渲染编码后拼接，
+    渲染出的帧与串行路径（同一 seed）完全相同，但不提供逐帧预览。
+    并行模式要求无损编码（LOSSLESS_CODECS，输出与串行逐帧一致）或可用的 ffmpeg
+    （复制码流拼接，不二次编码；有损编码在片段边界处重新开始GOP，解码结果与串行不保证逐位相同）。
+    sink 为输出后端（VideoWriterSink/FFmpegPipeSink/ImageSequenceSink 等），
+    默认以 codec 编码写入 output_video。
+    concurrent_tiles > 1 时启用波浪模式，多个格子错开同时过渡，视频长度约缩短为 1/K；
+    wave_duration（秒）给出时波浪部分固定为该时长，与网格大小无关（不短于单个格子的过渡时间）。
+    timings 为 RenderTimings 时累计串行路径的混合/写回/编码耗时。
+    """
+    if workers > 1 and seed is None:
+        seed = random.randrange(2 ** 32)
+    original, final_image, pool_images, plan = prepare_animation(
+        animation_mode, original_path, final_path, pool_folder, grid_size, total_steps,
+        target_resolution, seed)
+    h, w = original.shape[:2]
+    total_steps = len(plan)
+
+    workers = max(1, min(workers, total_steps))
+    if workers > 1:
+        if sink is not None:
+            raise ValueError("并行片段模式只支持默认的视频文件输出")
+        if concurrent_tiles > 1 or wave_duration:
+            raise ValueError("并行片段模式不支持波浪模式")
+        if not parallel_supported(codec):
+            raise ValueError(f"未找到 ffmpeg 时并行片段模式只支持无损编码 {', '.join(LOSSLESS_CODECS)}，"
+                             f"当前为 {codec}（重新编码拼接会产生二次损失）")
+        _create_animation_parallel(
+            animation_mode, original_path, final_path, pool_folder, output_video, frame_rate,
+            (w, h), grid_size, plan, blend_frames, workers, codec, progress_callback)
+    else:
+        sink = sink if sink is not None else VideoWriterSink(output_video, codec)
+        render_plan(animation_mode, original, final_image, pool_images, plan, sink, frame_rate,
+                    blend_frames, frame_callback, preview_fps, concurrent_tiles,
+                    wave_frames_for(wave_duration, frame_rate), progress_callback, timings)
 
     if progress_callback:
         progress_callback(total_steps, total_steps)
 
 
+def render_plan(animation_mode, original, final_image, pool_images, plan, sink, frame_rate,
+                blend_frames, frame_callback=None, preview_fps=10, concurrent_tiles=1,
+                wave_frames=None, progress_callback=None, timings=None):
+    """串行渲染已加载好的输入和计划，写入 sink（打开并在结束时关闭）"""
+    h, w = original.shape[:2]
+    sink.open((w, h), frame_rate)
+    output = FrameOutput(sink, frame_callback, preview_fps, timings)
+    try:
+        for frame in iter_frames(animation_mode, original.copy(), plan, final_image,
+                                 pool_images, blend_frames, concurrent_tiles, progress_callback,
+                                 timings, wave_frames):
+            output.write(frame)
+
+        # --- 结尾和清理 ---
+        end_image = end_image_for(final_image, original)
+        for _ in range(frame_rate):
+            output.write(end_image)
+    finally:
+        sink.close()
+
+
+def _create_animation_parallel(animation_mode, original_path, final_path, pool_folder, output_video,
+                               frame_rate, size, grid_size, plan, blend_frames, workers, codec,
+                               progress_callback):
+    """把计划切成 workers 个连续片段并行渲染编码，最后按顺序拼接"""
+    total_steps = len(plan)
+    bounds = [round(k * total_steps / workers) for k in range(workers + 1)]
+    stem, ext = os.path.splitext(output_video)
+    tasks = []
+    for k in range(workers):
+        tasks.append({
+            'animation_mode': animation_mode,
+            'original_path': original_path,
+            'final_path': final_path,
+            'pool_folder': pool_folder,
+            'target_resolution': size,
+            'grid_size': grid_size,
+            'plan': plan,
+            'start': bounds[k],
+            'end': bounds[k + 1],
+            'segment_path': f"{stem}.part{k:03d}{ext}",
+            'codec': codec,
+            'frame_rate': frame_rate,
+            'blend_frames': blend_frames,
+            'write_ending': k == workers - 1,
+        })
+
+    segment_paths = [task['segment_path'] for task in tasks]
+    try:
+        # spawn 避免在带 Qt 线程的进程里 fork
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+            futures = {executor.submit(_render_segment, task): task for task in tasks}
+            done_steps = 0
+            for future in as_completed(futures):
+                future.result()
+                task = futures[future]
+                done_steps += task['end'] - task['start']
+                if progress_callback:
+                    progress_callback(done_steps, total_steps)
+        concat_segments(segment_paths, output_video, codec, frame_rate, size)
+    finally:
+        for path in segment_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+
 # ==================== 演示文件创建功能 ====================
 
-def create_demo_files():
-    """创建演示文件"""
+def create_demo_files(output_dir=".", size=None):
+    """创建演示文件；size=(宽, 高) 时把原始图和最终图缩放到该分辨率"""
     print("正在创建演示文件...")
+
+    def save(name, image):
+        if size:
+            image = cv2.resize(image, tuple(size), interpolation=cv2.INTER_LINEAR)
+        cv2.imwrite(os.path.join(output_dir, name), image)
+    
+    os.makedirs(output_dir, exist_ok=True)
     
     # 创建原始图像 - 蓝色背景
     original = np.zeros((400, 600, 3), dtype=np.uint8)
     original[:, :] = [200, 150, 100]  # 浅棕色
     cv2.rectangle(original, (150, 100), (450, 300), (100, 200, 255), -1)  # 浅橙色矩形
     cv2.putText(original, "Original Image", (200, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-    cv2.imwrite("demo_original.png", original)
+    save("demo_original.png", original)
     
     # 创建最终图像 - 绿色背景
     final = np.zeros((400, 600, 3), dtype=np.uint8)
     final[:, :] = [150, 200, 150]  # 浅绿色
     cv2.circle(final, (300, 200), 80, (100, 255, 200), -1)  # 浅青色圆形
     cv2.putText(final, "Final Image", (220, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-    cv2.imwrite("demo_final.png", final)
+    save("demo_final.png", final)
     
     # 创建图像池文件夹
-    os.makedirs("demo_image_pool", exist_ok=True)
+    pool_dir = os.path.join(output_dir, "demo_image_pool")
+    os.makedirs(pool_dir, exist_ok=True)
     
     # 创建多个池图像
     colors = [
@@ -229,12 +883,139 @@ def create_demo_files():
         pool_img = np.zeros((200, 300, 3), dtype=np.uint8)
         pool_img[:, :] = color
         cv2.putText(pool_img, name, (80, 110), cv2.FONT_HERSHEY_SIMPLEX, 1, (100, 100, 100), 2)
-        cv2.imwrite(f"demo_image_pool/pool_{i+1}_{name.lower()}.png", pool_img)
+        cv2.imwrite(os.path.join(pool_dir, f"pool_{i+1}_{name.lower()}.png"), pool_img)
     
     print("✓ 演示文件创建完成")
     return True
 
 
+# ==================== 性能基准测试 ====================
+
+BENCH_RESOLUTIONS = [(640, 360), (1280, 720), (1920, 1080)]
+BENCH_GRIDS = [(4, 4), (8, 8)]
+
+
+BENCH_WAVE_TILES = 4  # 波浪模式基准的同时过渡格子数
+
+
+def _bench_cases(work_dir, mode, size, grid, encoders):
+    """基准用例：串行和波浪模式按各输出后端运行，并行片段模式用无损编码写文件"""
+    w, h = size
+    stem = os.path.join(work_dir, f"{mode}_{w}x{h}_{grid[0]}x{grid[1]}")
+    for variant, options in (('serial', {}), ('wave', {'concurrent_tiles': BENCH_WAVE_TILES})):
+        for encoder in encoders:
+            if encoder == 'null':
+                make_sink = NullSink
+            else:
+                make_sink = lambda encoder=encoder, variant=variant: VideoWriterSink(
+                    f"{stem}_{variant}_{encoder}.avi", encoder)
+            yield variant, encoder, make_sink, options
+    if parallel_supported('FFV1'):
+        workers = max(2, min(4, os.cpu_count() or 1))
+        yield 'parallel', 'FFV1', None, {'workers': workers, 'output_video': f"{stem}_parallel.avi"}
+
+
+def run_benchmarks(resolutions=None, grids=None, modes=None, encoders=('null', 'mp4v'),
+                   blend_frames=10, frame_rate=20, work_dir=None, json_path=None):
+    """
+    用演示文件在不同分辨率、网格和模式下运行串行、波浪和并行片段渲染，
+    encoders 中 'null' 表示丢弃输出，其余视为 VideoWriter 的 fourcc。
+    计时只包含渲染（输入在计时前加载）；峰值内存在单独一遍 tracemalloc 运行中测量，不影响计时。
+    并行片段模式的耗时包含各进程自行加载输入，峰值内存只统计主进程。
+    结果可写入 JSON 以便跨版本对比。
+    """
+    resolutions = resolutions or BENCH_RESOLUTIONS
+    grids = grids or BENCH_GRIDS
+    modes = modes or ANIMATION_MODES
+    work_dir = work_dir or tempfile.mkdtemp(prefix='animation_bench_')
+
+    results = []
+    for w, h in resolutions:
+        demo_dir = os.path.join(work_dir, f"demo_{w}x{h}")
+        create_demo_files(demo_dir, size=(w, h))
+        paths = {
+            'original_path': os.path.join(demo_dir, "demo_original.png"),
+            'final_path': os.path.join(demo_dir, "demo_final.png"),
+            'pool_folder': os.path.join(demo_dir, "demo_image_pool"),
+        }
+        for grid in grids:
+            for mode in modes:
+                inputs = prepare_animation(mode, paths['original_path'], paths['final_path'],
+                                           paths['pool_folder'], grid, None, (w, h), 0)
+                for variant, encoder, make_sink, options in _bench_cases(work_dir, mode, (w, h), grid, encoders):
+                    if variant == 'parallel':
+                        def run(timings):
+                            create_animation(mode, **paths, frame_rate=frame_rate, grid_size=grid,
+                                             blend_frames=blend_frames, target_resolution=(w, h),
+                                             seed=0, codec=encoder, **options)
+                    else:
+                        def run(timings):
+                            render_plan(mode, *inputs, make_sink(), frame_rate, blend_frames,
+                                        concurrent_tiles=options.get('concurrent_tiles', 1),
+                                        timings=timings)
+
+                    timings = RenderTimings()
+                    start = time.perf_counter()
+                    run(timings)
+                    elapsed = time.perf_counter() - start
+
+                    # 内存单独测一遍，tracemalloc 的开销不计入上面的耗时
+                    tracemalloc.start()
+                    try:
+                        run(RenderTimings())
+                        _, peak = tracemalloc.get_traced_memory()
+                    finally:
+                        tracemalloc.stop()
+
+                    if variant == 'parallel':
+                        # 并行模式没有分阶段计时，帧数从输出文件读取
+                        cap = cv2.VideoCapture(options['output_video'])
+                        timings.frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+                        cap.release()
+                    entry = {
+                        'mode': mode,
+                        'variant': variant,
+                        'resolution': f"{w}x{h}",
+                        'grid': f"{grid[0]}x{grid[1]}",
+                        'encoder': encoder,
+                        'seconds': elapsed,
+                        'fps': timings.frames / elapsed if elapsed else 0.0,
+                        'other_s': max(0.0, elapsed - timings.blend - timings.copy - timings.encode),
+                        'peak_mb': peak / 1024 / 1024,
+                    }
+                    entry.update(timings.as_dict())
+                    if variant == 'parallel':
+                        entry['workers'] = options['workers']
+                    results.append(entry)
+                    print(f"{mode:<16} {variant:<8} {entry['resolution']:<10} 网格 {entry['grid']:<6} {encoder:<5} "
+                          f"{entry['fps']:8.1f} 帧/秒 | 混合 {timings.blend:6.2f}s 写回 {timings.copy:6.2f}s "
+                          f"编码 {timings.encode:6.2f}s 其他 {entry['other_s']:5.2f}s | 峰值 {entry['peak_mb']:.1f} MB")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'settings': {'blend_frames': blend_frames, 'frame_rate': frame_rate, 'work_dir': work_dir,
+                     'wave_tiles': BENCH_WAVE_TILES},
+        'results': results,
+    }
+    if json_path:
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基准结果已写入: {json_path}")
+    return report
+
+
+def _parse_sizes(text):
+    """解析 '640x360,1280x720' 形式的尺寸列表"""
+    return [tuple(int(v) for v in item.lower().split('x')) for item in text.split(',') if item.strip()]
+
+
 # ==================== GUI界面部分 ====================
 
 class WorkerSignals(QObject):
@@ -246,11 +1027,29 @@ class WorkerSignals(QObject):
 
 
 class AnimationWorker(QThread):
-    """动画生成工作线程"""
-    def __init__(self, params):
+    """
+    动画生成工作线程。预览帧限频（preview_fps）、在本线程内缩放到预览标签尺寸并转为RGB；
+    同一时间只有一张预览在途，标签还没画上一张时新帧直接丢弃，编码不会等待界面。
+    """
+    def __init__(self, params, preview_size=(400, 300), preview_fps=10):
         super().__init__()
         self.params = params
         self.signals = WorkerSignals()
+        self.preview_fps = preview_fps
+        self.dropped_previews = 0
+        self._preview_size = preview_size
+        self._preview_slot = threading.Event()  # 置位表示可以发送下一张预览
+        self._preview_slot.set()
+
+    def preview_shown(self, label_size):
+        """预览标签画完一帧后调用：记下标签当前尺寸，并放行下一张预览"""
+        self._preview_size = (max(1, label_size.width()), max(1, label_size.height()))
+        self._preview_slot.set()
+
+    def _render_preview(self, canvas):
+        """预览标签开启了 scaledContents，直接缩放到标签尺寸，省去界面线程的缩放"""
+        preview = cv2.resize(canvas, self._preview_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(preview, cv2.COLOR_BGR2RGB)
 
     def run(self):
         try:
@@ -258,10 +1057,16 @@ class AnimationWorker(QThread):
                 self.signals.progress.emit(step, total)
 
             def frame_callback(frame_data):
-                self.signals.frame_update.emit(frame_data)
+                if not self._preview_slot.is_set():
+                    self.dropped_previews += 1
+                    return
+                self._preview_slot.clear()
+                # 发出的是新数组，不会引用仍在变化的画布
+                self.signals.frame_update.emit(self._render_preview(frame_data))
 
             self.params['progress_callback'] = progress_callback
             self.params['frame_callback'] = frame_callback
+            self.params['preview_fps'] = self.preview_fps
             create_animation(**self.params)
             self.signals.finished.emit(self.params['output_video'])
         except Exception as e:
@@ -422,6 +1227,34 @@ class StandaloneAnimationStudio(QMainWindow):
         self.blend_spin.setValue(12)
         param_layout.addWidget(self.blend_spin, 1, 3)
 
+        # 预览帧率
+        param_layout.addWidget(QLabel("预览帧率:"), 2, 0)
+        self.preview_fps_spin = QSpinBox()
+        self.preview_fps_spin.setRange(1, 30)
+        self.preview_fps_spin.setValue(10)
+        self.preview_fps_spin.setSuffix(" fps")
+        self.preview_fps_spin.setToolTip("生成时预览刷新的最高帧率，不影响输出视频")
+        param_layout.addWidget(self.preview_fps_spin, 2, 1)
+
+        # 同时过渡的格子数（波浪模式）
+        param_layout.addWidget(QLabel("同时过渡:"), 2, 2)
+        self.concurrent_spin = QSpinBox()
+        self.concurrent_spin.setRange(1, 64)
+        self.concurrent_spin.setValue(1)
+        self.concurrent_spin.setSuffix(" 格")
+        self.concurrent_spin.setToolTip("大于1时多个格子错开同时过渡，大网格也能生成较短的视频")
+        param_layout.addWidget(self.concurrent_spin, 2, 3)
+
+        # 波浪模式固定时长
+        param_layout.addWidget(QLabel("波浪时长:"), 3, 0)
+        self.wave_duration_spin = QSpinBox()
+        self.wave_duration_spin.setRange(0, 600)
+        self.wave_duration_spin.setValue(0)
+        self.wave_duration_spin.setSuffix(" 秒")
+        self.wave_duration_spin.setSpecialValueText("不固定")
+        self.wave_duration_spin.setToolTip("大于0时所有格子在该时长内错开过渡完毕，视频长度与网格大小无关")
+        param_layout.addWidget(self.wave_duration_spin, 3, 1)
+
         layout.addWidget(param_group)
 
         # 操作按钮
@@ -713,7 +1546,11 @@ class StandaloneAnimationStudio(QMainWindow):
             self.log("🚀 开始生成动画...")
 
             # 启动工作线程
-            self.worker = AnimationWorker(params)
+            self.worker = AnimationWorker(
+                params,
+                preview_size=(self.preview_label.width(), self.preview_label.height()),
+                preview_fps=self.preview_fps_spin.value()
+            )
             self.worker.signals.progress.connect(self.on_progress)
             self.worker.signals.finished.connect(self.on_finished)
             self.worker.signals.error.connect(self.on_error)
@@ -788,7 +1625,9 @@ class StandaloneAnimationStudio(QMainWindow):
             'frame_rate': self.fps_spin.value(),
             'grid_size': (self.grid_rows.value(), self.grid_cols.value()),
             'total_steps': self.steps_spin.value(),
-            'blend_frames': self.blend_spin.value()
+            'blend_frames': self.blend_spin.value(),
+            'concurrent_tiles': self.concurrent_spin.value(),
+            'wave_duration': self.wave_duration_spin.value() or None
         }
 
         # 根据模式添加额外参数
@@ -808,33 +1647,19 @@ class StandaloneAnimationStudio(QMainWindow):
         self.log(f"📊 处理步骤 {step}/{total}")
 
     def on_frame_update(self, frame_data):
-        """更新预览帧"""
+        """更新预览帧（工作线程已缩放到预览尺寸并转为RGB）"""
         try:
-            # 将OpenCV图像转换为Qt图像
             if frame_data is not None and len(frame_data.shape) == 3:
                 height, width = frame_data.shape[:2]
                 bytes_per_line = 3 * width
-
-                # 转换BGR到RGB
-                rgb_image = cv2.cvtColor(frame_data, cv2.COLOR_BGR2RGB)
-
-                # 创建QImage
-                qt_image = QImage(rgb_image.data, width, height, bytes_per_line, QImage.Format_RGB888)
-
-                # 转换为QPixmap并缩放到预览窗口大小
-                pixmap = QPixmap.fromImage(qt_image)
-                scaled_pixmap = pixmap.scaled(
-                    self.preview_label.size(),
-                    Qt.KeepAspectRatio,
-                    Qt.SmoothTransformation
-                )
-
-                # 更新预览标签
-                self.preview_label.setPixmap(scaled_pixmap)
-
+                qt_image = QImage(frame_data.data, width, height, bytes_per_line, QImage.Format_RGB888)
+                self.preview_label.setPixmap(QPixmap.fromImage(qt_image))
         except Exception:
             # 如果更新失败，不影响主要功能
             pass
+        finally:
+            if self.worker is not None:
+                self.worker.preview_shown(self.preview_label.size())
 
     def on_finished(self, output_path):
         """生成完成"""
@@ -927,8 +1752,66 @@ class StandaloneAnimationStudio(QMainWindow):
         msg_box.exec()
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="图像动画生成器")
+    parser.add_argument("--benchmark-sinks", action="store_true",
+                        help="测试各输出后端的吞吐量（不启动界面）")
+    parser.add_argument("--bench-size", default="1920x1080", help="测试分辨率，如 1920x1080")
+    parser.add_argument("--bench-frames", type=int, default=120, help="测试帧数")
+    parser.add_argument("--bench-dir", default=None, help="测试输出目录，默认为临时目录")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="运行动画生成基准测试（不启动界面）")
+    parser.add_argument("--bench-resolutions", default=None,
+                        help="基准分辨率列表，如 640x360,1280x720,1920x1080")
+    parser.add_argument("--bench-grids", default=None, help="基准网格列表，如 4x4,8x8")
+    parser.add_argument("--bench-blend-frames", type=int, default=10, help="基准过渡帧数")
+    parser.add_argument("--bench-json", default="animation_benchmark.json", help="基准结果JSON文件")
+    parser.add_argument("--render", action="store_true", help="直接生成动画视频（不启动界面）")
+    parser.add_argument("--mode", default="local_invert", choices=ANIMATION_MODES, help="动画模式")
+    parser.add_argument("--original", help="原始图片路径")
+    parser.add_argument("--final", default=None, help="最终图片路径")
+    parser.add_argument("--pool", default=None, help="随机图片池文件夹")
+    parser.add_argument("--output", default="animation_output.mp4", help="输出视频路径")
+    parser.add_argument("--fps", type=int, default=20, help="视频帧率")
+    parser.add_argument("--grid", default="4x4", help="网格大小，如 4x4（行x列）")
+    parser.add_argument("--steps", type=int, default=None, help="动画步数，默认为全部格子")
+    parser.add_argument("--blend-frames", type=int, default=10, help="每步过渡帧数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，固定后结果可复现")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="并行渲染进程数（需要无损编码或 ffmpeg）")
+    parser.add_argument("--codec", default="mp4v", help="视频编码 FourCC，如 mp4v、MJPG、FFV1")
+    parser.add_argument("--concurrent-tiles", type=int, default=1, help="波浪模式同时过渡的格子数")
+    parser.add_argument("--wave-duration", type=float, default=None, help="波浪模式固定时长（秒）")
+    return parser.parse_known_args()[0]
+
+
 def main():
     """主程序入口"""
+    args = parse_args()
+    if args.benchmark_sinks:
+        bench_w, bench_h = (int(v) for v in args.bench_size.lower().split('x'))
+        run_sink_benchmark((bench_w, bench_h), args.bench_frames, args.bench_dir)
+        return
+    if args.benchmark:
+        run_benchmarks(
+            resolutions=_parse_sizes(args.bench_resolutions) if args.bench_resolutions else None,
+            grids=_parse_sizes(args.bench_grids) if args.bench_grids else None,
+            blend_frames=args.bench_blend_frames, work_dir=args.bench_dir, json_path=args.bench_json)
+        return
+    if args.render:
+        if not args.original:
+            raise SystemExit("--render 需要 --original")
+        start = time.perf_counter()
+        create_animation(
+            args.mode, args.original, final_path=args.final, pool_folder=args.pool,
+            output_video=args.output, frame_rate=args.fps, grid_size=_parse_sizes(args.grid)[0],
+            total_steps=args.steps, blend_frames=args.blend_frames, seed=args.seed,
+            workers=args.workers, codec=args.codec, concurrent_tiles=args.concurrent_tiles,
+            wave_duration=args.wave_duration,
+            progress_callback=lambda step, total: print(f"\r进度: {step}/{total}", end="", flush=True))
+        print(f"\n✓ 已生成 {args.output}，耗时 {time.perf_counter() - start:.1f} 秒")
+        return
+
     app = QApplication(sys.argv)
 
     # 设置应用程序信息
@@ -1,14 +1,593 @@
 import sys
+import io
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QPushButton, 
                               QVBoxLayout, QHBoxLayout, QLabel, QFileDialog, 
                               QListWidget, QSlider, QCheckBox, QFrame, 
                               QScrollArea, QMessageBox, QSplitter, QStyle, QSizePolicy,
-                              QListWidgetItem, QDialog)
+                              QListWidgetItem, QDialog, QProgressBar, QSpinBox)
 from PySide6.QtGui import QImage, QPixmap, QColor, QPainter, QPalette, QFont, QBrush
-from PySide6.QtCore import Qt, QSize, Signal, QPoint, QRect
+from PySide6.QtCore import Qt, QSize, Signal, QPoint, QPointF, QRectF, QThread
 import numpy as np
 from PIL import Image
 import os
+import zlib
+from collections import deque, OrderedDict
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+
+# ==================== 颜色匹配 ====================
+
+# 加权差异的整数权重（原 0.299/0.587/0.114 放大1000倍），阈值相应为 容差 * 500
+LUMA_WEIGHTS = np.array([299, 587, 114], dtype=np.int32)
+
+
+def channel_absdiff(colors, target):
+    """逐通道绝对差，结果为uint8且不会溢出（colors 最后一维为通道）"""
+    colors = np.ascontiguousarray(colors[..., :3], dtype=np.uint8)
+    if CV2_AVAILABLE:
+        flat = colors.reshape(-1, 1, 3)
+        reference = np.empty_like(flat)
+        reference[...] = np.asarray(target[:3], dtype=np.uint8)
+        return cv2.absdiff(flat, reference).reshape(colors.shape)
+    return np.abs(colors.astype(np.int16) - np.asarray(target[:3], dtype=np.int16)).astype(np.uint8)
+
+
+def _advanced_match(diff, tolerance):
+    """欧氏距离平方 <= 容差² 或 加权差异 <= 容差/2（权重放大1000倍后按整数比较）"""
+    if CV2_AVAILABLE:
+        # 整数值在 float32 中精确表示（最大 3*255² 与 255*1000），比较结果与整数运算一致
+        wide = diff.reshape(-1, 1, 3).astype(np.float32)
+        squared = cv2.transform(cv2.multiply(wide, wide), np.ones((1, 3), np.float32))
+        weighted = cv2.transform(wide, LUMA_WEIGHTS[None, :].astype(np.float32))
+    else:
+        wide = diff.astype(np.int32)
+        d0, d1, d2 = wide[..., 0], wide[..., 1], wide[..., 2]
+        squared = d0 * d0 + d1 * d1 + d2 * d2
+        weighted = d0 * LUMA_WEIGHTS[0] + d1 * LUMA_WEIGHTS[1] + d2 * LUMA_WEIGHTS[2]
+    mask = (squared <= tolerance * tolerance) | (weighted <= tolerance * 500)
+    return mask.reshape(diff.shape[:-1])
+
+
+def _simple_match(colors, target, tolerance):
+    """每个通道的差都不超过容差（饱和的上下界，等价于 absdiff <= 容差）"""
+    if CV2_AVAILABLE:
+        flat = np.ascontiguousarray(colors[..., :3], dtype=np.uint8).reshape(-1, 1, 3)
+        lower = np.array([max(0, int(v) - tolerance) for v in target[:3]], dtype=np.uint8)
+        upper = np.array([min(255, int(v) + tolerance) for v in target[:3]], dtype=np.uint8)
+        return cv2.inRange(flat, lower, upper).reshape(colors.shape[:-1]).astype(bool)
+    diff = channel_absdiff(colors, target)
+    return (diff[..., 0] <= tolerance) & (diff[..., 1] <= tolerance) & (diff[..., 2] <= tolerance)
+
+
+def color_match_mask(colors, targets, tolerance, advanced=True):
+    """
+    一次计算多个目标颜色的匹配掩码，任一目标命中即为 True。
+    advanced=False: 每个通道的差都不超过容差；
+    advanced=True: 欧氏距离平方 <= 容差² 或 加权差异 <= 容差/2，两种距离由同一份差值在一遍中算出。
+    全部为无溢出的整数比较，不开方。
+    """
+    mask = np.zeros(colors.shape[:-1], dtype=bool)
+    tolerance = int(tolerance)
+    for target in targets:
+        if advanced:
+            mask |= _advanced_match(channel_absdiff(colors, target), tolerance)
+        else:
+            mask |= _simple_match(colors, target, tolerance)
+    return mask
+
+
+def match_radius(tolerance, advanced=True):
+    """匹配方式下可能命中的最大单通道差值，用于颜色索引剪枝"""
+    if advanced:
+        # 加权差异只看单个通道时，蓝色权重最小，允许的差值最大
+        return max(tolerance, (tolerance * 500) // int(LUMA_WEIGHTS.min()))
+    return tolerance
+
+
+# ==================== 连续区域填充 ====================
+
+def _scanline_fill(mask, seeds):
+    """
+    扫描线填充（无 OpenCV 时使用）：先一次性求出所有行的连续像素段，
+    相邻行中重叠的段在按 (行, 位置) 排序的数组里是一个连续区间，可用二分查找整体算出；
+    然后以段为单位做深度优先填充，栈里只有段编号，总开销与像素数和段数成正比。
+    """
+    height, width = mask.shape
+    # 每行首尾补 False，差分后的非零位置依次为各段的起点和终点（不含）
+    padded = np.zeros((height, width + 2), dtype=np.int8)
+    padded[:, 1:-1] = mask
+    edges = np.flatnonzero(np.diff(padded.ravel()))
+    run_starts, run_ends = edges[0::2], edges[1::2]
+    # 差分位置 y*(width+2)+x 即行 y 第 x 列，段为 [起点, 终点)，相邻两行相差 stride
+    stride = width + 2
+
+    # 每段在上一行/下一行中重叠的段区间 [first, last)
+    def overlaps(offset):
+        first = np.searchsorted(run_ends, run_starts + offset * stride, side='right')
+        last = np.searchsorted(run_starts, run_ends + offset * stride, side='left')
+        return first, last
+    up_first, up_last = overlaps(-1)
+    down_first, down_last = overlaps(1)
+
+    visited = np.zeros(len(run_starts), dtype=bool)
+    stack = []
+    for x, y in seeds:
+        if mask[y, x]:
+            position = y * stride + x
+            stack.append(int(np.searchsorted(run_starts, position, side='right')) - 1)
+    up_first, up_last = up_first.tolist(), up_last.tolist()
+    down_first, down_last = down_first.tolist(), down_last.tolist()
+    while stack:
+        run = stack.pop()
+        if visited[run]:
+            continue
+        visited[run] = True
+        stack.extend(range(up_first[run], up_last[run]))
+        stack.extend(range(down_first[run], down_last[run]))
+
+    # 用差分一次性铺出所有已访问的段
+    marks = np.zeros(height * stride + 1, dtype=np.int32)
+    np.add.at(marks, run_starts[visited], 1)
+    np.add.at(marks, run_ends[visited], -1)
+    filled = np.cumsum(marks[:-1]).reshape(height, stride)[:, :width] > 0
+    return filled
+
+
+def contiguous_mask(mask, seeds):
+    """
+    只保留容差掩码中与任一种子点（x, y）四连通的区域。
+    有 OpenCV 时一次连通域标记即可处理所有种子，否则使用扫描线填充。
+    """
+    height, width = mask.shape
+    seeds = [(int(x), int(y)) for x, y in seeds if 0 <= x < width and 0 <= y < height]
+    if not seeds:
+        return np.zeros_like(mask)
+    if not CV2_AVAILABLE:
+        return _scanline_fill(mask, seeds)
+
+    count, labels = cv2.connectedComponents(mask.view(np.uint8), connectivity=4, ltype=cv2.CV_32S)
+    keep = np.zeros(count, dtype=bool)
+    for x, y in seeds:
+        keep[labels[y, x]] = True
+    keep[0] = False  # 0 为掩码外的背景
+    return keep[labels]
+
+
+# ==================== 颜色索引 ====================
+
+class ColorIndex:
+    """
+    图片颜色索引，加载图片时构建一次。
+    unique_colors 为图中出现的所有RGB颜色，labels 把每个像素映射到颜色ID，counts 为各颜色的像素数；
+    另按 HIST_BITS 位量化为三维直方图，容差查询先按量化格剪枝，只检查可能命中的颜色，不再遍历像素。
+    """
+    HIST_BITS = 5  # 每通道 32 个量化格
+
+    def __init__(self, rgb):
+        height, width = rgb.shape[:2]
+        codes = rgb[..., 0].astype(np.uint32)
+        codes <<= 16
+        codes |= rgb[..., 1].astype(np.uint32) << 8
+        codes |= rgb[..., 2]
+
+        # 24位颜色空间直接计数，比 np.unique 排序快得多
+        color_counts = np.bincount(codes.ravel(), minlength=1 << 24)
+        unique_codes = np.flatnonzero(color_counts)
+        lookup = np.zeros(1 << 24, dtype=np.int32)
+        lookup[unique_codes] = np.arange(len(unique_codes), dtype=np.int32)
+        self.labels = lookup[codes]
+        del codes, lookup
+
+        self.counts = color_counts[unique_codes]
+        self.unique_colors = np.stack(
+            [(unique_codes >> 16) & 255, (unique_codes >> 8) & 255, unique_codes & 255], axis=1
+        ).astype(np.uint8)
+        self.total_pixels = height * width
+
+        # 量化三维直方图：颜色按格子排序，bin_starts 给出每个格子在 order 中的区间
+        bits = self.HIST_BITS
+        quantized = (self.unique_colors >> (8 - bits)).astype(np.int32)
+        bins = (quantized[:, 0] << (2 * bits)) | (quantized[:, 1] << bits) | quantized[:, 2]
+        n_bins = 1 << (3 * bits)
+        self.order = np.argsort(bins, kind='stable')
+        self.bin_starts = np.concatenate([[0], np.cumsum(np.bincount(bins, minlength=n_bins))])
+        self.histogram = np.bincount(bins, weights=self.counts, minlength=n_bins).astype(np.int64).reshape(
+            (1 << bits,) * 3)
+
+    def candidates(self, target, radius):
+        """各通道与 target 相差不超过 radius 的量化格中的全部颜色ID"""
+        shift = 8 - self.HIST_BITS
+        target = np.asarray(target[:3], dtype=np.int32)
+        lo = np.clip(target - radius, 0, 255) >> shift
+        hi = np.clip(target + radius, 0, 255) >> shift
+        r, g, b = (np.arange(lo[i], hi[i] + 1) for i in range(3))
+        bits = self.HIST_BITS
+        bin_ids = ((r[:, None, None] << (2 * bits)) | (g[None, :, None] << bits) | b[None, None, :]).ravel()
+
+        starts = self.bin_starts[bin_ids]
+        lengths = self.bin_starts[bin_ids + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+        offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        return self.order[offsets + np.arange(total)]
+
+    def match(self, targets, tolerance, advanced=True):
+        """
+        返回各颜色是否命中的布尔查找表（任一目标命中即为 True），
+        每个目标只在其剪枝后的候选颜色上计算距离。
+        """
+        matched = np.zeros(len(self.unique_colors), dtype=bool)
+        radius = match_radius(tolerance, advanced)
+        for target in targets:
+            ids = self.candidates(target, radius)
+            if len(ids):
+                matched[ids[color_match_mask(self.unique_colors[ids], [target], tolerance, advanced)]] = True
+        return matched
+
+    def pixel_mask(self, matched):
+        """把颜色命中结果展开为像素掩码"""
+        return matched[self.labels]
+
+    def matched_pixels(self, matched):
+        return int(self.counts[matched].sum())
+
+
+# ==================== 主色调提取 ====================
+
+PALETTE_SAMPLE_SIZE = 200_000  # 随机抽样的像素数，与图片大小无关
+PALETTE_KMEANS_ITERATIONS = 8
+
+
+def _median_cut(samples, n_colors):
+    """中位切分：反复沿跨度最大的通道在中位数处切开（像素数×跨度）最大的颜色盒，返回各盒的均值"""
+    boxes = [samples]
+    while len(boxes) < n_colors:
+        spans = [np.ptp(box, axis=0) if len(box) > 1 else np.zeros(3) for box in boxes]
+        scores = [len(box) * span.max() for box, span in zip(boxes, spans)]
+        index = int(np.argmax(scores))
+        if scores[index] == 0:
+            break  # 剩下的盒都是单一颜色，无法再分
+        box = boxes.pop(index)
+        order = np.argsort(box[:, int(np.argmax(spans[index]))], kind='stable')
+        half = len(box) // 2
+        boxes += [box[order[:half]], box[order[half:]]]
+    return np.array([box.mean(axis=0) for box in boxes], dtype=np.float32)
+
+
+def extract_palette(rgb, alpha=None, n_colors=8, tolerance=None, advanced=True,
+                    sample_size=PALETTE_SAMPLE_SIZE, iterations=PALETTE_KMEANS_ITERATIONS,
+                    seed=0, progress_callback=None):
+    """
+    提取图片的主色调：随机抽样像素，中位切分得到初始中心，再做几轮k-means。
+    alpha 为0的像素不参与统计。返回按覆盖率从高到低排序的最多 n_colors 项，
+    每项含 rgb（离聚类中心最近的实际像素颜色）、pos（该像素位置）和 coverage（0~1）。
+    给出 tolerance 时先聚成 2*n_colors 类，再把按 color_match_mask 相互匹配的类合并，
+    避免带噪声的大片背景占满调色板。
+    progress_callback(step, total) 在每轮迭代后调用。
+    """
+    height, width = rgb.shape[:2]
+    rng = np.random.default_rng(seed)
+    flat = rng.integers(0, height * width, size=min(sample_size, height * width))
+    ys, xs = np.divmod(flat, width)
+    if alpha is not None:
+        visible = alpha[ys, xs] > 0
+        ys, xs = ys[visible], xs[visible]
+    if len(ys) == 0:
+        return []
+    samples = rgb[ys, xs].astype(np.float32)
+    
+    centers = _median_cut(samples, n_colors * 2 if tolerance is not None else n_colors)
+    for step in range(iterations):
+        # 平方距离 = |x|² - 2x·c + |c|²，|x|²对所有中心相同可省略
+        distances = (centers ** 2).sum(axis=1) - 2 * samples @ centers.T
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=len(centers))
+        for channel in range(3):
+            sums = np.bincount(labels, weights=samples[:, channel], minlength=len(centers))
+            centers[:, channel] = np.where(counts > 0, sums / np.maximum(counts, 1), centers[:, channel])
+        if progress_callback:
+            progress_callback(step + 1, iterations)
+    
+    distances = (centers ** 2).sum(axis=1) - 2 * samples @ centers.T
+    labels = distances.argmin(axis=1)
+    counts = np.bincount(labels, minlength=len(centers))
+    # 按覆盖率从高到低分组：与已有组的代表色匹配的类并入该组
+    groups = []
+    for cluster in np.argsort(-counts, kind='stable'):
+        if counts[cluster] == 0:
+            continue
+        members = np.flatnonzero(labels == cluster)
+        nearest = members[np.argmin(((samples[members] - centers[cluster]) ** 2).sum(axis=1))]
+        color = samples[nearest].astype(np.uint8)
+        if tolerance is not None:
+            merged = next((group for group in groups
+                           if color_match_mask(color[None, :], [group['color']], tolerance, advanced)[0]), None)
+            if merged is not None:
+                merged['clusters'].append(cluster)
+                continue
+        groups.append({'clusters': [cluster], 'color': color})
+    
+    palette = []
+    for group in groups:
+        clusters = np.array(group['clusters'])
+        # 合并后的中心为各类中心按样本数加权的平均，再取离它最近的实际像素
+        weights = counts[clusters]
+        center = (centers[clusters] * weights[:, None]).sum(axis=0) / weights.sum()
+        members = np.flatnonzero(np.isin(labels, clusters))
+        nearest = members[np.argmin(((samples[members] - center) ** 2).sum(axis=1))]
+        palette.append({
+            'rgb': tuple(int(v) for v in samples[nearest]),
+            'pos': (int(xs[nearest]), int(ys[nearest])),
+            'count': int(weights.sum()),
+        })
+    
+    palette.sort(key=lambda entry: entry['count'], reverse=True)
+    palette = palette[:n_colors]
+    for entry in palette:
+        entry['coverage'] = entry.pop('count') / len(samples)
+    return palette
+
+
+# ==================== 批量去背景 ====================
+
+BATCH_IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.bmp')
+BATCH_MANIFEST_FILE = '.bg_removal_manifest.tsv'  # 每行: 相对路径 \t 源文件哈希 \t 参数哈希（每个文件只保留最后一次写出）
+
+
+def parse_color(text):
+    """解析 '#ffffff'、'ffffff' 或 '255,255,255' 形式的颜色"""
+    text = text.strip()
+    if ',' in text:
+        values = tuple(int(v) for v in text.split(','))
+    else:
+        text = text.lstrip('#')
+        values = tuple(int(text[i:i + 2], 16) for i in (0, 2, 4))
+    if len(values) != 3 or not all(0 <= v <= 255 for v in values):
+        raise ValueError(f"无效的颜色: {text}")
+    return values
+
+
+def remove_background(rgba, targets, tolerance, advanced=True):
+    """把与任一目标颜色匹配的像素alpha设为0（原地修改），返回被匹配的像素数"""
+    mask = color_match_mask(rgba, targets, tolerance, advanced)
+    rgba[mask, 3] = 0
+    return int(np.count_nonzero(mask))
+
+
+def _batch_settings_hash(targets, tolerance, advanced):
+    settings = repr((sorted(tuple(t) for t in targets), int(tolerance), bool(advanced)))
+    return hashlib.sha1(settings.encode('utf-8')).hexdigest()
+
+
+def _read_batch_manifest(manifest_path):
+    """读取清单，返回 {相对路径: (源文件哈希, 参数哈希)}，同一文件以最后一行为准"""
+    entries = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                parts = line.rstrip('\n').split('\t')
+                if len(parts) == 3:
+                    entries[parts[0]] = (parts[1], parts[2])
+    return entries
+
+
+def _write_batch_manifest(manifest_path, entries):
+    """整理清单：每个文件一行，先写临时文件再替换"""
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for rel_path in sorted(entries):
+            source_hash, settings_hash = entries[rel_path]
+            f.write(f"{rel_path}\t{source_hash}\t{settings_hash}\n")
+    os.replace(tmp_path, manifest_path)
+
+
+def _process_batch_chunk(chunk, targets, tolerance, advanced, settings_hash):
+    """
+    进程池任务：处理一组图片。读入源文件后先算内容哈希，输出文件上次写出时的
+    源文件哈希和参数哈希都与本次一致且输出存在则跳过；
+    否则解码、去背景并写出PNG（先写临时文件再替换，中断不会留下半个文件）。
+    """
+    results = []
+    for src_path, dst_path, rel_path, known in chunk:
+        try:
+            with open(src_path, 'rb') as f:
+                data = f.read()
+            source_hash = hashlib.sha1(data).hexdigest()
+            if known == (source_hash, settings_hash) and os.path.exists(dst_path):
+                results.append((rel_path, source_hash, 'skipped', 0))
+                continue
+
+            rgba = np.array(Image.open(io.BytesIO(data)).convert('RGBA'))
+            matched = remove_background(rgba, targets, tolerance, advanced)
+
+            os.makedirs(os.path.dirname(dst_path) or '.', exist_ok=True)
+            tmp_path = dst_path + '.tmp'
+            Image.fromarray(rgba, 'RGBA').save(tmp_path, 'PNG', compress_level=1)
+            os.replace(tmp_path, dst_path)
+            results.append((rel_path, source_hash, 'done', matched))
+        except Exception as e:
+            results.append((rel_path, None, f"失败: {e}", 0))
+    return results
+
+
+def run_batch(input_dir, output_dir, targets, tolerance=15, advanced=True, workers=None,
+              chunk_size=8, force=False):
+    """
+    对目录树中的所有图片去除指定颜色的背景，输出为相同目录结构的PNG。
+    输出文件最近一次由相同源文件内容和相同参数写出时跳过（记录在输出目录的清单文件中）。
+    返回统计字典。
+    """
+    if not os.path.isdir(input_dir):
+        raise FileNotFoundError(f"输入文件夹不存在: {input_dir}")
+    os.makedirs(output_dir, exist_ok=True)
+
+    settings_hash = _batch_settings_hash(targets, tolerance, advanced)
+    manifest_path = os.path.join(output_dir, BATCH_MANIFEST_FILE)
+    entries = _read_batch_manifest(manifest_path)
+
+    output_abs = os.path.abspath(output_dir)
+    tasks = []
+    for root, dirs, files in os.walk(input_dir):
+        dirs[:] = sorted(d for d in dirs if os.path.abspath(os.path.join(root, d)) != output_abs)
+        for filename in sorted(files):
+            if not filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                continue
+            src_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(src_path, input_dir).replace(os.sep, '/')
+            dst_path = os.path.join(output_dir, os.path.splitext(rel_path)[0] + '.png')
+            tasks.append((src_path, dst_path, rel_path, None if force else entries.get(rel_path)))
+
+    print(f"共 {len(tasks)} 张图片，目标颜色 {len(targets)} 个，容差 {tolerance}")
+
+    stats = {'processed': 0, 'skipped': 0, 'failed': [], 'matched_pixels': 0}
+    start = time.perf_counter()
+    if tasks:
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        # 运行中逐行追加，中断时已完成的文件也有记录；结束后整理为每个文件一行
+        with ProcessPoolExecutor(max_workers=workers) as executor, \
+                open(manifest_path, 'a', encoding='utf-8') as manifest:
+            futures = [executor.submit(_process_batch_chunk, chunk, targets, tolerance, advanced, settings_hash)
+                       for chunk in chunks]
+            for future in as_completed(futures):
+                for rel_path, source_hash, status, matched in future.result():
+                    if status == 'done':
+                        stats['processed'] += 1
+                        stats['matched_pixels'] += matched
+                        manifest.write(f"{rel_path}\t{source_hash}\t{settings_hash}\n")
+                        entries[rel_path] = (source_hash, settings_hash)
+                    elif status == 'skipped':
+                        stats['skipped'] += 1
+                    else:
+                        stats['failed'].append((rel_path, status))
+                manifest.flush()
+
+                done = stats['processed'] + stats['skipped'] + len(stats['failed'])
+                elapsed = time.perf_counter() - start
+                print(f"进度: {done}/{len(tasks)} | {stats['processed'] / elapsed:.1f} 张/秒")
+        _write_batch_manifest(manifest_path, entries)
+
+    stats['elapsed'] = time.perf_counter() - start
+    stats['images_per_sec'] = stats['processed'] / stats['elapsed'] if stats['elapsed'] > 0 else 0.0
+    return stats
+
+
+def print_batch_report(stats):
+    """打印批量处理结果和吞吐量"""
+    print(f"完成: {stats['processed']} 张 | 未变化跳过: {stats['skipped']} 张 | 失败: {len(stats['failed'])} 张")
+    print(f"总耗时: {stats['elapsed']:.2f} 秒 | 吞吐量: {stats['images_per_sec']:.1f} 张/秒 | "
+          f"透明化像素: {stats['matched_pixels']:,}")
+    for rel_path, reason in stats['failed']:
+        print(f"  {rel_path}: {reason}")
+
+
+# ==================== 编辑历史 ====================
+
+UNDO_MEMORY_BUDGET = 64 * 1024 * 1024  # 撤销历史默认内存上限（字节）
+
+
+def _pack_values(values):
+    """全部相同的alpha值只存一个数，否则压缩存储"""
+    if len(values) and np.all(values == values[0]):
+        return int(values[0])
+    return zlib.compress(np.ascontiguousarray(values, dtype=np.uint8).tobytes(), 1)
+
+
+def _unpack_values(packed):
+    if isinstance(packed, int):
+        return packed
+    return np.frombuffer(zlib.decompress(packed), dtype=np.uint8)
+
+
+class AlphaEdit:
+    """
+    一次alpha通道编辑：被改动像素的位掩码（packbits 后再 zlib 压缩，大片连续区域压缩率很高）
+    以及这些像素改动前后的alpha值，不保存整张图片。
+    """
+    def __init__(self, changed_mask, previous_alpha, new_alpha):
+        self.shape = changed_mask.shape
+        self.count = int(np.count_nonzero(changed_mask))
+        self.mask_bits = zlib.compress(np.packbits(changed_mask.ravel()).tobytes(), 1)
+        self.previous = _pack_values(previous_alpha)
+        self.new = _pack_values(new_alpha)
+
+    @property
+    def nbytes(self):
+        size = len(self.mask_bits)
+        for packed in (self.previous, self.new):
+            size += 8 if isinstance(packed, int) else len(packed)
+        return size
+
+    def mask(self):
+        bits = np.frombuffer(zlib.decompress(self.mask_bits), dtype=np.uint8)
+        count = self.shape[0] * self.shape[1]
+        return np.unpackbits(bits, count=count).view(bool).reshape(self.shape)
+
+    def undo(self, alpha):
+        alpha[self.mask()] = _unpack_values(self.previous)
+
+    def redo(self, alpha):
+        alpha[self.mask()] = _unpack_values(self.new)
+
+
+class EditHistory:
+    """撤销/重做栈，总内存超过 memory_budget 时淘汰最早的记录"""
+    def __init__(self, memory_budget=UNDO_MEMORY_BUDGET):
+        self.memory_budget = memory_budget
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+
+    def record(self, alpha, changed_mask, new_alpha):
+        """记录并应用一次编辑：alpha[changed_mask] = new_alpha"""
+        previous = alpha[changed_mask]
+        alpha[changed_mask] = new_alpha
+        edit = AlphaEdit(changed_mask, previous, alpha[changed_mask])
+        self.redo_stack.clear()
+        self.undo_stack.append(edit)
+        self.nbytes = sum(e.nbytes for e in self.undo_stack)
+        while self.nbytes > self.memory_budget and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.popleft().nbytes
+        return edit
+
+    def undo(self, alpha):
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        edit.undo(alpha)
+        self.nbytes -= edit.nbytes
+        self.redo_stack.append(edit)
+        return edit
+
+    def redo(self, alpha):
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        edit.redo(alpha)
+        self.undo_stack.append(edit)
+        self.nbytes += edit.nbytes
+        return edit
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+
 
 class ColorDisplay(QFrame):
     """自定义颜色显示组件"""
@@ -33,119 +612,221 @@ class ColorDisplay(QFrame):
     def paintEvent(self, event):
         super().paintEvent(event)
         
-class ImageViewer(QLabel):
-    """自定义图片显示组件，支持点击事件"""
+def _downsample2(block):
+    """长宽各缩小一半（2x2平均），奇数边先复制最后一行/列，保证分块重算与整体计算结果一致"""
+    height, width = block.shape[:2]
+    if height % 2 or width % 2:
+        block = np.pad(block, ((0, height % 2), (0, width % 2), (0, 0)), mode='edge')
+    summed = block[0::2, 0::2].astype(np.uint16) + block[1::2, 0::2] + block[0::2, 1::2] + block[1::2, 1::2]
+    return ((summed + 2) >> 2).astype(np.uint8)
+
+
+class TilePyramid:
+    """
+    多分辨率瓦片金字塔：第0级直接引用编辑缓冲区（不复制），之后每级长宽减半。
+    瓦片 QPixmap 只在可见时生成并做LRU缓存；编辑后只重算和丢弃被改动掩码触及的瓦片。
+    """
+    TILE_SIZE = 256
+    MAX_CACHED_TILES = 512
+
+    def __init__(self, rgba, min_size=256):
+        self.levels = [rgba]
+        while max(self.levels[-1].shape[:2]) > min_size:
+            self.levels.append(_downsample2(self.levels[-1]))
+        self.cache = OrderedDict()
+
+    def tile_count(self, level):
+        height, width = self.levels[level].shape[:2]
+        return -(-width // self.TILE_SIZE), -(-height // self.TILE_SIZE)
+
+    def tile_pixmap(self, level, tx, ty):
+        key = (level, tx, ty)
+        pixmap = self.cache.get(key)
+        if pixmap is not None:
+            self.cache.move_to_end(key)
+            return pixmap
+        size = self.TILE_SIZE
+        tile = np.ascontiguousarray(self.levels[level][ty * size:(ty + 1) * size, tx * size:(tx + 1) * size])
+        height, width = tile.shape[:2]
+        qimg = QImage(tile.data, width, height, 4 * width, QImage.Format_RGBA8888)
+        pixmap = QPixmap.fromImage(qimg)
+        self.cache[key] = pixmap
+        if len(self.cache) > self.MAX_CACHED_TILES:
+            self.cache.popitem(last=False)
+        return pixmap
+
+    def invalidate(self, mask):
+        """第0级中 mask 为 True 的像素已改变：重算各级受影响的瓦片并丢弃其缓存"""
+        size = self.TILE_SIZE
+        height, width = mask.shape
+        rows = np.logical_or.reduceat(mask, np.arange(0, height, size), axis=0)
+        tiles = np.logical_or.reduceat(rows, np.arange(0, width, size), axis=1)
+        dirty = np.argwhere(tiles)  # (ty, tx)
+        for level in range(len(self.levels)):
+            if level > 0:
+                dirty = np.unique(dirty // 2, axis=0)
+                parent, target = self.levels[level - 1], self.levels[level]
+                for ty, tx in dirty:
+                    y0, x0 = ty * size, tx * size
+                    block = _downsample2(parent[2 * y0:2 * (y0 + size), 2 * x0:2 * (x0 + size)])
+                    target[y0:y0 + block.shape[0], x0:x0 + block.shape[1]] = block
+            for ty, tx in dirty:
+                self.cache.pop((level, int(tx), int(ty)), None)
+
+
+class ImageViewer(QWidget):
+    """
+    图片显示组件：按当前缩放级别只绘制可见瓦片。
+    滚轮缩放、拖动平移、双击恢复适应窗口，单击（未拖动）发出 pixel_clicked。
+    """
     pixel_clicked = Signal(QPoint, QColor)
+    MAX_ZOOM = 32.0
+    DRAG_THRESHOLD = 4
     
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.setAlignment(Qt.AlignCenter)
         self.setMinimumSize(500, 400)  # 增大最小尺寸
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)  # 设置尺寸策略为扩展
-        self.setStyleSheet("background-color: #f8f9fa; border-radius: 12px;")
-        self.setText("点击'加载图片'开始")
-        self.pixmap = None
-        self.scale_factor = 1.0
-        self.original_pixmap = None
-        
-    def set_image(self, pixmap):
-        """设置图片并自动调整大小"""
-        self.original_pixmap = pixmap
-        self.adjust_pixmap()
-        
-    def adjust_pixmap(self):
-        """根据控件大小调整图片"""
-        if not self.original_pixmap:
+        self.image = None
+        self.pyramid = None
+        self.zoom = 1.0
+        self.offset = QPointF(0, 0)  # 控件左上角对应的图像坐标
+        self.fit_mode = True
+        self._press_pos = None
+        self._dragging = False
+        
+    @property
+    def scale_factor(self):
+        return self.zoom
+        
+    def set_image(self, rgba):
+        """设置图片（RGBA数组，直接引用，不复制）并适应窗口"""
+        self.image = rgba
+        self.pyramid = TilePyramid(rgba)
+        self.fit_mode = True
+        self.fit_to_window()
+        
+    def invalidate(self, mask):
+        """图片中 mask 覆盖的像素已被修改，只刷新受影响的瓦片"""
+        if self.pyramid is not None:
+            self.pyramid.invalidate(mask)
+            self.update()
+        
+    def fit_to_window(self):
+        """缩放到完整显示图片（小图不放大）并居中"""
+        if self.image is None:
             return
-            
-        # 获取控件大小
-        view_width = self.width()
-        view_height = self.height()
-        
-        if view_width <= 1 or view_height <= 1:
-            return
-            
-        # 获取图片原始大小
-        img_width = self.original_pixmap.width()
-        img_height = self.original_pixmap.height()
-        
-        # 计算缩放比例
-        scale_x = view_width / img_width if img_width > 0 else 1
-        scale_y = view_height / img_height if img_height > 0 else 1
-        self.scale_factor = min(scale_x, scale_y)
-        
-        # 如果图片小于控件，不放大
-        if img_width < view_width and img_height < view_height:
-            self.scale_factor = 1.0
-            
-        # 缩放图片
-        if self.scale_factor != 1.0:
-            scaled_width = int(img_width * self.scale_factor)
-            scaled_height = int(img_height * self.scale_factor)
-            self.pixmap = self.original_pixmap.scaled(
-                scaled_width, scaled_height, 
-                Qt.KeepAspectRatio, Qt.SmoothTransformation
-            )
-        else:
-            self.pixmap = self.original_pixmap
-            
-        # 设置图片
-        self.setPixmap(self.pixmap)
+        img_height, img_width = self.image.shape[:2]
+        view_width, view_height = max(1, self.width()), max(1, self.height())
+        self.zoom = min(view_width / img_width, view_height / img_height, 1.0)
+        self.offset = QPointF((img_width - view_width / self.zoom) / 2,
+                              (img_height - view_height / self.zoom) / 2)
+        self.update()
         
     def resizeEvent(self, event):
-        """窗口大小改变时重新调整图片"""
+        """窗口大小改变时，适应窗口模式下重新适应"""
         super().resizeEvent(event)
-        self.adjust_pixmap()
+        if self.fit_mode:
+            self.fit_to_window()
+            
+    def wheelEvent(self, event):
+        if self.image is None:
+            return
+        # 以鼠标所在的图像点为中心缩放
+        pos = event.position()
+        anchor = self.offset + pos / self.zoom
+        img_height, img_width = self.image.shape[:2]
+        min_zoom = min(self.width() / img_width, self.height() / img_height, 1.0) / 2
+        factor = 1.25 ** (event.angleDelta().y() / 120)
+        self.zoom = max(min_zoom, min(self.MAX_ZOOM, self.zoom * factor))
+        self.offset = anchor - pos / self.zoom
+        self.fit_mode = False
+        self.update()
         
     def mousePressEvent(self, event):
-        if self.pixmap and event.button() == Qt.LeftButton:
+        self._press_pos = event.position()
+        self._dragging = False
+        super().mousePressEvent(event)
+        
+    def mouseMoveEvent(self, event):
+        if self._press_pos is not None and self.image is not None:
+            delta = event.position() - self._press_pos
+            if self._dragging or abs(delta.x()) + abs(delta.y()) > self.DRAG_THRESHOLD:
+                self._dragging = True
+                self.offset -= delta / self.zoom
+                self._press_pos = event.position()
+                self.fit_mode = False
+                self.update()
+        super().mouseMoveEvent(event)
+        
+    def mouseReleaseEvent(self, event):
+        if self.image is not None and event.button() == Qt.LeftButton and not self._dragging:
             # 计算实际图像中的位置
             pos = self.get_image_position(event.position().toPoint())
             if pos:
-                color = self.get_pixel_color(pos)
-                self.pixel_clicked.emit(pos, color)
-        super().mousePressEvent(event)
+                self.pixel_clicked.emit(pos, self.get_pixel_color(pos))
+        self._press_pos = None
+        self._dragging = False
+        super().mouseReleaseEvent(event)
+        
+    def mouseDoubleClickEvent(self, event):
+        self.fit_mode = True
+        self.fit_to_window()
         
     def get_image_position(self, pos):
         """转换鼠标位置到图像坐标"""
-        if not self.pixmap or not self.original_pixmap:
-            return None
-            
-        # 获取图像在标签中的位置
-        img_rect = self.get_image_rect()
-        if not img_rect.contains(pos):
+        if self.image is None:
             return None
-            
-        # 计算相对位置并应用缩放
-        x = int((pos.x() - img_rect.left()) / self.scale_factor)
-        y = int((pos.y() - img_rect.top()) / self.scale_factor)
+        x = int(np.floor(self.offset.x() + pos.x() / self.zoom))
+        y = int(np.floor(self.offset.y() + pos.y() / self.zoom))
         
         # 确保在图像范围内
-        if 0 <= x < self.original_pixmap.width() and 0 <= y < self.original_pixmap.height():
+        if 0 <= x < self.image.shape[1] and 0 <= y < self.image.shape[0]:
             return QPoint(x, y)
         return None
         
-    def get_image_rect(self):
-        """获取图像在标签中的实际矩形区域"""
-        if not self.pixmap:
-            return QRect()
-            
-        # 计算居中位置
-        pos = QPoint(
-            (self.width() - self.pixmap.width()) // 2,
-            (self.height() - self.pixmap.height()) // 2
-        )
-        
-        return QRect(pos, self.pixmap.size())
-        
     def get_pixel_color(self, pos):
         """获取指定位置的像素颜色"""
-        if not self.original_pixmap:
+        if self.image is None:
             return QColor()
-            
-        # 创建一个临时图像来获取像素颜色
-        img = self.original_pixmap.toImage()
-        return QColor(img.pixel(pos))
+        r, g, b, a = (int(v) for v in self.image[pos.y(), pos.x()])
+        return QColor(r, g, b, a)
+        
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor("#f8f9fa"))
+        if self.pyramid is None:
+            painter.setPen(QColor("#4a5568"))
+            painter.drawText(self.rect(), Qt.AlignCenter, "点击'加载图片'开始")
+            return
+        
+        # 选择分辨率不低于屏幕显示的最粗级别
+        level = 0
+        while level + 1 < len(self.pyramid.levels) and 2 ** (level + 1) * self.zoom <= 1.0:
+            level += 1
+        level_scale = 2 ** level
+        size = TilePyramid.TILE_SIZE
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, self.zoom * level_scale < 1.0)
+        
+        # 可见区域（该级别的像素坐标）对应的瓦片范围
+        tiles_x, tiles_y = self.pyramid.tile_count(level)
+        left = self.offset.x() / level_scale
+        top = self.offset.y() / level_scale
+        right = left + self.width() / (self.zoom * level_scale)
+        bottom = top + self.height() / (self.zoom * level_scale)
+        tx0, tx1 = max(0, int(left // size)), min(tiles_x - 1, int(right // size))
+        ty0, ty1 = max(0, int(top // size)), min(tiles_y - 1, int(bottom // size))
+        
+        for ty in range(ty0, ty1 + 1):
+            for tx in range(tx0, tx1 + 1):
+                pixmap = self.pyramid.tile_pixmap(level, tx, ty)
+                target = QRectF(
+                    (tx * size * level_scale - self.offset.x()) * self.zoom,
+                    (ty * size * level_scale - self.offset.y()) * self.zoom,
+                    pixmap.width() * level_scale * self.zoom,
+                    pixmap.height() * level_scale * self.zoom)
+                painter.drawPixmap(target, pixmap, QRectF(pixmap.rect()))
+
 
 class ColorListItem(QWidget):
     """自定义颜色列表项，包含颜色预览和文本"""
@@ -166,14 +847,41 @@ class ColorListItem(QWidget):
         color_preview.setStyleSheet(f"background-color: {hex_color}; border-radius: 3px; border: 1px solid #e0e0e0;")
         layout.addWidget(color_preview)
         
-        # 创建文本标签
+        # 创建文本标签（主色调条目附带覆盖率）
         text = f"RGB({r},{g},{b}) Alpha:{a}"
+        if 'coverage' in color_info:
+            text += f"  {color_info['coverage']:.1%}"
         label = QLabel(text)
         layout.addWidget(label)
         
         # 存储颜色信息
         self.color_info = color_info
 
+class PaletteWorker(QThread):
+    """后台提取主色调，避免大图阻塞界面"""
+    progress = Signal(int, int)
+    palette_ready = Signal(object, object)  # (缓存键, 调色板)
+    failed = Signal(str)
+    
+    def __init__(self, key, rgb, original_image, n_colors, tolerance, advanced):
+        super().__init__()
+        self.key = key
+        self.rgb = rgb  # 透明化只改alpha，RGB在编辑过程中不变，可直接共享
+        self.original_image = original_image
+        self.n_colors = n_colors
+        self.tolerance = tolerance
+        self.advanced = advanced
+        
+    def run(self):
+        try:
+            # 按原图alpha统计，结果不随透明化编辑变化，可按图片缓存
+            alpha = np.asarray(self.original_image.getchannel('A'))
+            palette = extract_palette(self.rgb, alpha, self.n_colors, self.tolerance, self.advanced,
+                                      progress_callback=self.progress.emit)
+            self.palette_ready.emit(self.key, palette)
+        except Exception as e:
+            self.failed.emit(str(e))
+
 class PixelColorTool(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -182,10 +890,16 @@ class PixelColorTool(QMainWindow):
         
         # 初始化变量
         self.original_image = None
-        self.current_image = None
+        self.current_array = None  # 当前图片的RGBA编辑缓冲区，所有编辑原地进行
         self.clicked_colors = []  # 存储点击的颜色
+        self.color_index = None  # 当前图片的颜色索引
+        self.history = EditHistory()  # 撤销/重做历史，只保存改动的alpha掩码
         self.tolerance = 15
         self.use_advanced_matching = True
+        self.contiguous_mode = False  # 只透明化与点击位置相连的区域
+        self.image_key = None  # 当前图片的缓存键（路径和修改时间）
+        self.palette_cache = {}  # (图片键, 颜色数, 容差, 高级匹配) -> 主色调
+        self.palette_worker = None
         
         # 设置应用样式
         self.setup_style()
@@ -291,6 +1005,20 @@ class PixelColorTool(QMainWindow):
         self.reset_btn.clicked.connect(self.reset_image)
         button_layout.addWidget(self.reset_btn)
         
+        # 撤销/重做按钮
+        self.undo_btn = QPushButton("撤销")
+        self.undo_btn.setIcon(self.style().standardIcon(QStyle.SP_ArrowBack))
+        self.undo_btn.setShortcut("Ctrl+Z")
+        self.undo_btn.clicked.connect(self.undo_edit)
+        button_layout.addWidget(self.undo_btn)
+        
+        self.redo_btn = QPushButton("重做")
+        self.redo_btn.setIcon(self.style().standardIcon(QStyle.SP_ArrowForward))
+        self.redo_btn.setShortcut("Ctrl+Y")
+        self.redo_btn.clicked.connect(self.redo_edit)
+        button_layout.addWidget(self.redo_btn)
+        self.update_history_buttons()
+        
         button_layout.addStretch()
         main_layout.addLayout(button_layout)
         
@@ -335,6 +1063,7 @@ class PixelColorTool(QMainWindow):
         # 颜色列表
         self.color_list = QListWidget()
         self.color_list.setAlternatingRowColors(True)
+        self.color_list.setSelectionMode(QListWidget.ExtendedSelection)  # 可多选，透明化时一次处理
         self.color_list.setMaximumHeight(150)  # 限制列表高度
         control_layout.addWidget(self.color_list)
         
@@ -365,6 +1094,13 @@ class PixelColorTool(QMainWindow):
         self.advanced_checkbox.stateChanged.connect(self.toggle_advanced_matching)
         control_layout.addWidget(self.advanced_checkbox)
         
+        # 连续区域模式
+        self.contiguous_checkbox = QCheckBox("仅透明化点击处的连续区域")
+        self.contiguous_checkbox.setToolTip("从点击过的位置开始填充，只处理与之相连的相似颜色")
+        self.contiguous_checkbox.setChecked(self.contiguous_mode)
+        self.contiguous_checkbox.toggled.connect(self.toggle_contiguous_mode)
+        control_layout.addWidget(self.contiguous_checkbox)
+        
         # 分析按钮
         self.analyze_btn = QPushButton("分析相似颜色")
         self.analyze_btn.clicked.connect(self.analyze_similar_colors)
@@ -375,6 +1111,33 @@ class PixelColorTool(QMainWindow):
         self.batch_btn.clicked.connect(self.batch_make_transparent)
         control_layout.addWidget(self.batch_btn)
         
+        # 主色调提取
+        palette_label = QLabel("主色调:")
+        palette_label.setStyleSheet("font-weight: bold; margin-top: 10px;")
+        control_layout.addWidget(palette_label)
+        
+        palette_layout = QHBoxLayout()
+        self.palette_btn = QPushButton("提取主色调")
+        self.palette_btn.clicked.connect(self.extract_palette_colors)
+        palette_layout.addWidget(self.palette_btn)
+        
+        self.palette_count_spin = QSpinBox()
+        self.palette_count_spin.setRange(2, 16)
+        self.palette_count_spin.setValue(8)
+        self.palette_count_spin.setToolTip("提取的颜色数")
+        palette_layout.addWidget(self.palette_count_spin)
+        control_layout.addLayout(palette_layout)
+        
+        self.palette_progress = QProgressBar()
+        self.palette_progress.setVisible(False)
+        control_layout.addWidget(self.palette_progress)
+        
+        self.palette_list = QListWidget()
+        self.palette_list.setToolTip("单击颜色添加到已保存的颜色")
+        self.palette_list.setMaximumHeight(150)
+        self.palette_list.itemClicked.connect(self.add_palette_color)
+        control_layout.addWidget(self.palette_list)
+        
         # 添加伸缩空间
         control_layout.addStretch()
         
@@ -407,7 +1170,13 @@ class PixelColorTool(QMainWindow):
                 
             # 保存原始图片和当前图片
             self.original_image = pil_image
-            self.current_image = pil_image.copy()
+            self.image_key = (os.path.abspath(file_path), os.path.getmtime(file_path))
+            self.current_array = np.array(pil_image)
+            
+            # 构建颜色索引（透明化只改alpha，RGB不变，索引在编辑过程中一直有效）
+            self.color_index = ColorIndex(self.current_array[..., :3])
+            self.history.clear()
+            self.update_history_buttons()
             
             # 显示图片
             self.display_image()
@@ -415,38 +1184,30 @@ class PixelColorTool(QMainWindow):
             # 清空之前的颜色记录
             self.clicked_colors.clear()
             self.color_list.clear()
+            self.palette_list.clear()
             
             self.status_label.setText("状态: 图片已加载，点击像素查看颜色")
             
         except Exception as e:
             QMessageBox.critical(self, "错误", f"无法加载图片: {str(e)}")
             
-    def display_image(self):
-        """显示当前图片"""
-        if self.current_image is None:
-            return
-            
-        # 将PIL图像转换为QPixmap
-        img_data = self.current_image.tobytes("raw", "RGBA")
-        qimg = QImage(img_data, self.current_image.width, self.current_image.height, 
-                     QImage.Format_RGBA8888)
-        pixmap = QPixmap.fromImage(qimg)
-        
-        # 计算缩放比例
-        viewer_width = self.image_viewer.width()
-        viewer_height = self.image_viewer.height()
+    @property
+    def current_image(self):
+        """当前图片（编辑缓冲区的PIL视图）"""
+        if self.current_array is None:
+            return None
+        return Image.fromarray(self.current_array, 'RGBA')
         
-        if viewer_width <= 1 or viewer_height <= 1:
-            # 如果尺寸还未初始化，延迟显示
-            QApplication.processEvents()
-            self.display_image()
+    def display_image(self):
+        """显示当前图片（查看器直接引用编辑缓冲区并建立瓦片金字塔）"""
+        if self.current_array is None:
             return
             
-        # 设置图像
-        self.image_viewer.set_image(pixmap)
+        self.image_viewer.set_image(self.current_array)
         
         # 更新状态
-        self.status_label.setText(f"状态: 图片已加载 ({self.current_image.width}x{self.current_image.height})")
+        height, width = self.current_array.shape[:2]
+        self.status_label.setText(f"状态: 图片已加载 ({width}x{height})，滚轮缩放，拖动平移，双击适应窗口")
         
     def on_image_click(self, pos, color):
         """处理图片点击事件"""
@@ -465,11 +1226,22 @@ class PixelColorTool(QMainWindow):
         color_info = {
             'rgb': (r, g, b, a),
             'hex': hex_color,
-            'pos': (pos.x(), pos.y())
+            'pos': (pos.x(), pos.y()),
+            'seeds': [(pos.x(), pos.y())]  # 该颜色所有点击位置，连续区域模式的填充起点
         }
         
-        # 检查是否已存在该颜色
-        if not any(c['hex'] == hex_color for c in self.clicked_colors):
+        self.add_color(color_info)
+        
+    def add_color(self, color_info):
+        """添加颜色到已保存列表，已存在的颜色只追加点击位置"""
+        hex_color = color_info['hex']
+        existing = next((c for c in self.clicked_colors if c['hex'] == hex_color), None)
+        if existing is not None:
+            for seed in color_info['seeds']:
+                if seed not in existing['seeds']:
+                    existing['seeds'].append(seed)
+            self.status_label.setText(f"状态: 颜色 {hex_color} 已有 {len(existing['seeds'])} 个点击位置")
+        else:
             self.clicked_colors.append(color_info)
             
             # 创建自定义列表项
@@ -482,6 +1254,84 @@ class PixelColorTool(QMainWindow):
             
             self.status_label.setText(f"状态: 添加颜色 {hex_color}")
             
+    def extract_palette_colors(self):
+        """在后台线程提取主色调，结果按图片和参数缓存"""
+        if self.current_array is None:
+            QMessageBox.warning(self, "警告", "请先加载图片")
+            return
+        if self.palette_worker is not None:
+            return
+            
+        key = (self.image_key, self.palette_count_spin.value(), self.tolerance, self.use_advanced_matching)
+        if key in self.palette_cache:
+            self.show_palette(key, self.palette_cache[key])
+            return
+            
+        self.palette_btn.setEnabled(False)
+        self.palette_progress.setValue(0)
+        self.palette_progress.setVisible(True)
+        self.status_label.setText("状态: 正在提取主色调...")
+        
+        self.palette_worker = PaletteWorker(key, self.current_array[..., :3], self.original_image,
+                                            key[1], self.tolerance, self.use_advanced_matching)
+        self.palette_worker.progress.connect(self.update_palette_progress)
+        self.palette_worker.palette_ready.connect(self.on_palette_ready)
+        self.palette_worker.failed.connect(self.on_palette_failed)
+        self.palette_worker.finished.connect(self.on_palette_worker_finished)
+        self.palette_worker.start()
+        
+    def update_palette_progress(self, step, total):
+        self.palette_progress.setMaximum(total)
+        self.palette_progress.setValue(step)
+        
+    def on_palette_ready(self, key, palette):
+        self.palette_cache[key] = palette
+        # 提取期间加载了其他图片时只缓存，不显示
+        if key[0] == self.image_key:
+            self.show_palette(key, palette)
+            
+    def on_palette_failed(self, message):
+        QMessageBox.critical(self, "错误", f"主色调提取失败: {message}")
+        
+    def on_palette_worker_finished(self):
+        self.palette_worker = None
+        self.palette_btn.setEnabled(True)
+        self.palette_progress.setVisible(False)
+        
+    def show_palette(self, key, palette):
+        """显示主色调列表"""
+        self.palette_list.clear()
+        for entry in palette:
+            r, g, b = entry['rgb']
+            color_info = {
+                'rgb': (r, g, b, 255),
+                'hex': f"#{r:02x}{g:02x}{b:02x}",
+                'pos': entry['pos'],
+                'seeds': [entry['pos']],
+                'coverage': entry['coverage'],
+            }
+            item = QListWidgetItem()
+            custom_widget = ColorListItem(color_info)
+            item.setSizeHint(custom_widget.sizeHint())
+            self.palette_list.addItem(item)
+            self.palette_list.setItemWidget(item, custom_widget)
+        self.status_label.setText(f"状态: 已提取 {len(palette)} 个主色调，单击添加")
+        
+    def add_palette_color(self, item):
+        """单击主色调条目，添加到已保存的颜色"""
+        color_info = self.palette_list.itemWidget(item).color_info
+        r, g, b, a = color_info['rgb']
+        self.current_color_display.set_color(QColor(r, g, b, a),
+                                             f"RGB: ({r}, {g}, {b})\nAlpha: {a}\n覆盖率: {color_info['coverage']:.1%}")
+        # 复制一份，已保存列表中的点击位置不与调色板共享
+        self.add_color({**color_info, 'seeds': list(color_info['seeds'])})
+        
+    def closeEvent(self, event):
+        """关闭窗口前等待主色调线程结束"""
+        if self.palette_worker is not None:
+            self.palette_worker.wait()
+        super().closeEvent(event)
+            
     def update_tolerance(self, value):
         """更新容差值"""
         self.tolerance = value
@@ -491,42 +1341,27 @@ class PixelColorTool(QMainWindow):
         """切换高级匹配模式"""
         self.use_advanced_matching = (state == Qt.Checked)
         
-    def color_distance(self, color1, color2):
-        """计算两个颜色之间的距离（欧几里得距离）"""
-        r1, g1, b1 = color1[:3]
-        r2, g2, b2 = color2[:3]
-        return np.sqrt((r1 - r2) ** 2 + (g1 - g2) ** 2 + (b1 - b2) ** 2)
-        
-    def advanced_color_match(self, img_array, target_color, tolerance):
-        """高级颜色匹配算法"""
-        target_rgb = np.array(target_color[:3])
-        
-        # 方法1: 欧几里得距离
-        img_rgb = img_array[:, :, :3].astype(np.float32)
-        distances = np.sqrt(np.sum((img_rgb - target_rgb) ** 2, axis=2))
-        euclidean_mask = distances <= tolerance
-        
-        # 方法2: 加权颜色差异（人眼对绿色更敏感）
-        weights = np.array([0.299, 0.587, 0.114])  # RGB权重
-        weighted_diff = np.abs(img_rgb - target_rgb) * weights
-        weighted_distance = np.sum(weighted_diff, axis=2)
-        weighted_mask = weighted_distance <= tolerance * 0.5
-        
-        # 组合掩码
-        combined_mask = euclidean_mask | weighted_mask
-        
-        return combined_mask
-        
-    def simple_color_match(self, img_array, target_color, tolerance):
-        """简单颜色匹配（原始方法）"""
-        target_rgb = target_color[:3]
-        mask = (
-            (np.abs(img_array[:, :, 0] - target_rgb[0]) <= tolerance) &
-            (np.abs(img_array[:, :, 1] - target_rgb[1]) <= tolerance) &
-            (np.abs(img_array[:, :, 2] - target_rgb[2]) <= tolerance)
-        )
+    def toggle_contiguous_mode(self, checked):
+        """切换连续区域模式"""
+        self.contiguous_mode = checked
+        
+    def find_matching_colors(self, targets):
+        """在颜色索引中查找与任一目标颜色匹配的颜色，返回按颜色ID的布尔查找表"""
+        return self.color_index.match(targets, self.tolerance, self.use_advanced_matching)
+        
+    def transparency_mask(self, selected, matched):
+        """由颜色命中表得到要透明化的像素掩码；连续区域模式下只保留与点击位置相连的部分"""
+        mask = self.color_index.pixel_mask(matched)
+        if self.contiguous_mode:
+            seeds = [seed for c in selected for seed in c.get('seeds', [c['pos']])]
+            mask = contiguous_mask(mask, seeds)
         return mask
         
+    def selected_colors(self):
+        """当前在列表中选中的颜色信息（按列表顺序）"""
+        rows = sorted(self.color_list.row(item) for item in self.color_list.selectedItems())
+        return [self.clicked_colors[row] for row in rows]
+            
     def analyze_similar_colors(self):
         """分析图片中与选中颜色相似的所有颜色"""
         selected_items = self.color_list.selectedItems()
@@ -538,28 +1373,20 @@ class PixelColorTool(QMainWindow):
             QMessageBox.warning(self, "警告", "请先加载图片")
             return
             
-        selected_index = self.color_list.row(selected_items[0])
-        selected_color = self.clicked_colors[selected_index]
+        selected_color = self.selected_colors()[0]
         target_rgb = selected_color['rgb'][:3]
         
-        # 转换图片为numpy数组
-        img_array = np.array(self.current_image)
-        
-        # 获取匹配的像素
-        if self.use_advanced_matching:
-            mask = self.advanced_color_match(img_array, target_rgb, self.tolerance)
-        else:
-            mask = self.simple_color_match(img_array, target_rgb, self.tolerance)
+        # 只在颜色索引的候选颜色上匹配，不遍历像素
+        matched = self.find_matching_colors([target_rgb])
             
         # 统计匹配的像素数量
-        matched_pixels = np.sum(mask)
-        total_pixels = img_array.shape[0] * img_array.shape[1]
+        matched_pixels = self.color_index.matched_pixels(matched)
+        total_pixels = self.color_index.total_pixels
         percentage = (matched_pixels / total_pixels) * 100
         
         # 获取所有匹配颜色的统计信息
-        matched_colors = img_array[mask]
-        if len(matched_colors) > 0:
-            unique_colors = np.unique(matched_colors.reshape(-1, matched_colors.shape[-1]), axis=0)
+        if matched_pixels > 0:
+            unique_colors = self.color_index.unique_colors[matched]
             
             # 创建带颜色预览的分析结果对话框
             analysis_dialog = QDialog(self)
@@ -617,8 +1444,8 @@ class PixelColorTool(QMainWindow):
         
         dialog_layout = QVBoxLayout(confirm_dialog)
         
-        selected_index = self.color_list.row(selected_items[0])
-        selected_color = self.clicked_colors[selected_index]
+        selected = self.selected_colors()
+        selected_color = selected[0]
         
         # 添加颜色预览
         preview_frame = QFrame()
@@ -631,7 +1458,7 @@ class PixelColorTool(QMainWindow):
         dialog_layout.addLayout(preview_layout)
         
         # 添加确认文本
-        confirm_text = f"将使用容差 {self.tolerance} 批量透明化所有相似颜色。\n此操作可能影响大量像素，是否继续？"
+        confirm_text = f"将使用容差 {self.tolerance} 批量透明化与 {len(selected)} 个选中颜色相似的所有颜色。\n此操作可能影响大量像素，是否继续？"
         confirm_label = QLabel(confirm_text)
         confirm_label.setWordWrap(True)
         dialog_layout.addWidget(confirm_label)
@@ -655,37 +1482,21 @@ class PixelColorTool(QMainWindow):
         if result != QDialog.Accepted:
             return
             
-        target_rgb = selected_color['rgb'][:3]
-        
-        # 转换图片为numpy数组
-        img_array = np.array(self.current_image)
-        
-        # 获取匹配的像素
-        if self.use_advanced_matching:
-            mask = self.advanced_color_match(img_array, target_rgb, self.tolerance)
-        else:
-            mask = self.simple_color_match(img_array, target_rgb, self.tolerance)
-            
-        # 统计处理前的像素数量
-        matched_pixels = np.sum(mask)
+        # 通过颜色索引一次匹配所有选中的颜色
+        matched = self.find_matching_colors([c['rgb'][:3] for c in selected])
+        matched_pixels = self.color_index.matched_pixels(matched)
         
         if matched_pixels == 0:
             QMessageBox.information(self, "提示", "在当前容差下未找到匹配的颜色")
             return
             
-        # 将匹配的像素设为透明
-        img_array[mask, 3] = 0  # 设置alpha通道为0（透明）
-        
-        # 转换回PIL Image
-        self.current_image = Image.fromarray(img_array, 'RGBA')
-        
-        # 重新显示图片
-        self.display_image()
+        # 将匹配的像素设为透明（记录到撤销历史）
+        changed_pixels = self.apply_alpha_edit(self.transparency_mask(selected, matched), 0)
         
         hex_color = selected_color['hex']
-        self.status_label.setText(f"状态: 已透明化 {matched_pixels:,} 个相似像素")
+        self.status_label.setText(f"状态: 已透明化 {changed_pixels:,} 个相似像素")
         
-        QMessageBox.information(self, "完成", f"已将 {matched_pixels:,} 个相似颜色像素设为透明")
+        QMessageBox.information(self, "完成", f"已将 {changed_pixels:,} 个相似颜色像素设为透明")
         
     def make_color_transparent(self):
         """将选中的颜色设为透明"""
@@ -698,40 +1509,60 @@ class PixelColorTool(QMainWindow):
             QMessageBox.warning(self, "警告", "请先加载图片")
             return
             
-        # 获取选中的颜色
-        selected_index = self.color_list.row(selected_items[0])
-        selected_color = self.clicked_colors[selected_index]
-        target_rgb = selected_color['rgb'][:3]
-        
-        # 转换图片为numpy数组进行处理
-        img_array = np.array(self.current_image)
+        # 获取选中的颜色（可多选，一次处理）
+        selected = self.selected_colors()
         
-        # 根据用户选择使用不同的匹配算法
-        if self.use_advanced_matching:
-            mask = self.advanced_color_match(img_array, target_rgb, self.tolerance)
-        else:
-            mask = self.simple_color_match(img_array, target_rgb, self.tolerance)
+        # 根据用户选择的匹配算法在颜色索引中查找
+        matched = self.find_matching_colors([c['rgb'][:3] for c in selected])
             
         # 统计匹配的像素数量
-        matched_pixels = np.sum(mask)
+        matched_pixels = self.color_index.matched_pixels(matched)
         
         if matched_pixels == 0:
             QMessageBox.warning(self, "提示", f"在容差 {self.tolerance} 下未找到匹配的颜色，请尝试增加容差值")
             return
             
-        # 将匹配的像素设为透明
-        img_array[mask, 3] = 0  # 设置alpha通道为0（透明）
-        
-        # 转换回PIL Image
-        self.current_image = Image.fromarray(img_array, 'RGBA')
-        
-        # 重新显示图片
-        self.display_image()
-        
-        hex_color = selected_color['hex']
-        self.status_label.setText(f"状态: 颜色 {hex_color} 已设为透明 ({matched_pixels} 像素)")
+        # 将匹配的像素设为透明（记录到撤销历史）
+        changed_pixels = self.apply_alpha_edit(self.transparency_mask(selected, matched), 0)
+        
+        hex_color = ', '.join(c['hex'] for c in selected)
+        self.status_label.setText(f"状态: 颜色 {hex_color} 已设为透明 ({changed_pixels} 像素)")
+        
+        QMessageBox.information(self, "完成", f"颜色 {hex_color} 已设为透明\n处理了 {changed_pixels} 个像素")
+        
+    def apply_alpha_edit(self, mask, new_alpha):
+        """把 mask 内像素的alpha设为 new_alpha，只记录真正改变的像素以便撤销"""
+        alpha = self.current_array[..., 3]
+        changed = mask & (alpha != new_alpha)
+        if np.any(changed):
+            self.history.record(alpha, changed, new_alpha)
+            # 只刷新被改动的瓦片
+            self.image_viewer.invalidate(changed)
+        self.update_history_buttons()
+        return int(np.count_nonzero(changed))
+        
+    def undo_edit(self):
+        """撤销上一次透明化"""
+        self._step_history(self.history.undo, "撤销")
+        
+    def redo_edit(self):
+        """重做被撤销的操作"""
+        self._step_history(self.history.redo, "重做")
+        
+    def _step_history(self, step, action):
+        if self.current_image is None:
+            return
+        edit = step(self.current_array[..., 3])
+        if edit is None:
+            return
+        self.image_viewer.invalidate(edit.mask())
+        self.update_history_buttons()
+        self.status_label.setText(
+            f"状态: 已{action} ({edit.count:,} 像素)，历史占用 {self.history.nbytes / 1024:.1f} KB")
         
-        QMessageBox.information(self, "完成", f"颜色 {hex_color} 已设为透明\n处理了 {matched_pixels} 个像素")
+    def update_history_buttons(self):
+        self.undo_btn.setEnabled(self.history.can_undo())
+        self.redo_btn.setEnabled(self.history.can_redo())
         
     def save_image(self):
         """保存当前图片"""
@@ -757,18 +1588,41 @@ class PixelColorTool(QMainWindow):
             QMessageBox.warning(self, "警告", "没有原始图片可重置")
             return
             
-        self.current_image = self.original_image.copy()
-        self.display_image()
+        # 重置也记录为一次可撤销的alpha编辑（RGB从未改变，只需恢复alpha）
+        original_alpha = np.asarray(self.original_image)[..., 3]
+        alpha = self.current_array[..., 3]
+        changed = alpha != original_alpha
+        if np.any(changed):
+            self.history.record(alpha, changed, original_alpha[changed])
+            self.image_viewer.invalidate(changed)
+        self.update_history_buttons()
         self.status_label.setText("状态: 图片已重置到原始状态")
-        
-    def resizeEvent(self, event):
-        """窗口大小改变时重新显示图片"""
-        super().resizeEvent(event)
-        if self.current_image:
-            self.display_image()
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="图片像素颜色选择器")
+    parser.add_argument("--batch", nargs=2, metavar=("INPUT_DIR", "OUTPUT_DIR"),
+                        help="批量去除目录树中所有图片的背景色（不启动界面）")
+    parser.add_argument("--colors", default="#ffffff",
+                        help="目标颜色列表，用分号分隔，如 '#ffffff;0,255,0'")
+    parser.add_argument("--tolerance", type=int, default=15, help="颜色容差")
+    parser.add_argument("--simple", action="store_true", help="使用简单匹配（各通道差都不超过容差）")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认为CPU核数")
+    parser.add_argument("--force", action="store_true", help="忽略清单，重新处理所有文件")
+    return parser.parse_known_args()[0]
 
 
 def main():
+    args = parse_args()
+    if args.batch:
+        input_dir, output_dir = args.batch
+        targets = [parse_color(c) for c in args.colors.split(';') if c.strip()]
+        stats = run_batch(input_dir, output_dir, targets, tolerance=args.tolerance,
+                          advanced=not args.simple, workers=args.workers, force=args.force)
+        print_batch_report(stats)
+        return
+    
     app = QApplication(sys.argv)
     
     # 设置应用样式